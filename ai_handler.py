@@ -4,6 +4,8 @@ from openai import OpenAI
 
 
 from config import OPENROUTER_API_KEYS, AI_MODEL
+import metrics
+from tracing import traced
 
 
 class AIHandler:
@@ -15,6 +17,7 @@ class AIHandler:
         self.model = AI_MODEL
         self.call_count_today = 0 # Varnostna varovalka
 
+    @traced("ai", detail=lambda self, raw_snippets: f"{len(raw_snippets)} oglasov")
     def extract_ads_batch(self, raw_snippets):
         """
         Glavna funkcija: Sprejme seznam oglasov (tekst) in vrne seznam JSON objektov.
@@ -62,6 +65,7 @@ class AIHandler:
         {combined_text}
         """
 
+        started = time.perf_counter()
         try:
             # Klic na OpenRouter (Plačljiv model, zato nima limitov)
             response = self.client.chat.completions.create(
@@ -75,9 +79,15 @@ class AIHandler:
             )
             
             self.call_count_today += 1
+            metrics.AI_SECONDS.observe(time.perf_counter() - started)
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                metrics.AI_TOKENS.inc(usage.prompt_tokens or 0, kind="prompt")
+                metrics.AI_TOKENS.inc(usage.completion_tokens or 0, kind="completion")
             content = response.choices[0].message.content
             
             data = json.loads(content)
+            metrics.AI_REQUESTS.inc(result="ok")
             
             # Normalizacija odgovora (da vedno dobimo seznam)
             if isinstance(data, dict):
@@ -90,6 +100,7 @@ class AIHandler:
 
         except Exception as e:
             print(f"❌ [AI ERROR] Napaka: {e}")
+            metrics.AI_REQUESTS.inc(result="error")
             return None
 
 
@@ -0,0 +1,94 @@
+"""
+Async fasada nad Database za Telegram handlerje.
+
+Vsak klic Database metode se izvede na namenskem DB executorju (thread pool),
+zato SQLite poizvedba (ali čakanje na write lock, ko scraper piše) ne ustavi
+event loopa python-telegram-bot in ostali uporabniki dobijo odgovor takoj.
+
+Enaka "površina" metod kot Database, le da jih awaitamo:
+
+    adb = AsyncDatabase(Database(DB_PATH))
+    urls = await adb.get_user_urls_with_status(user_id)
+
+Generatorji (npr. DataManager.check_new_offers) gredo preko `adb.stream(...)`.
+
+Nekritični zapisi (log_user_activity) gredo preko `adb.fire(...)`: tečejo na
+ločenem background threadu, handler jih ne čaka in med scrape ciklom (ko
+scraper drži write lock) ne zasedejo workerjev, ki strežejo branja.
+"""
+import asyncio
+import functools
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from utils import config_value
+
+
+class AsyncDatabase:
+    def __init__(self, db, max_workers=None):
+        self.db = db
+        if max_workers is None:
+            max_workers = int(config_value("DB_EXECUTOR_WORKERS", 4))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+        self._background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-bg")
+        metrics.watch_executor("db_executor", self._executor)
+
+    def __getattr__(self, name):
+        attr = getattr(self.db, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def call(*args, **kwargs):
+            return await self.run(attr, *args, **kwargs)
+
+        return call
+
+    async def run(self, fn, *args, **kwargs):
+        """Poljubna sinhrona funkcija na DB executorju (npr. sklop več klicev naenkrat)."""
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+
+        def call():
+            metrics.DB_EXECUTOR_WAIT.observe(time.perf_counter() - submitted)
+            try:
+                return fn(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                metrics.count_sqlite_error(e)
+                raise
+
+        return await loop.run_in_executor(self._executor, call)
+
+    def fire(self, method, *args, **kwargs):
+        """Fire-and-forget klic Database metode (npr. adb.fire("log_user_activity", uid, "/list"))."""
+        fn = getattr(self.db, method)
+        future = self._background.submit(fn, *args, **kwargs)
+
+        def _report(f):
+            if f.exception() is not None:
+                print(f"❌ [DB] Background {method} ni uspel: {f.exception()}")
+
+        future.add_done_callback(_report)
+        return future
+
+    async def stream(self, gen_fn, *args, **kwargs):
+        """
+        Async iterator nad sinhronim generatorjem; vsak next() teče na executorju.
+        Generator mora uporabljati povezavo s check_same_thread=False (Database.get_connection).
+        """
+        gen = await self.run(gen_fn, *args, **kwargs)
+        sentinel = object()
+        try:
+            while True:
+                item = await self.run(next, gen, sentinel)
+                if item is sentinel:
+                    break
+                yield item
+        finally:
+            await self.run(gen.close)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+        self._background.shutdown(wait=wait)
@@ -24,17 +24,11 @@ def backup_complete_database():
             print(f"⚠️ Could not remove {TARGET_DB}: {e}")
             print("   Attempting to overwrite...")
     
-    # Connect to source
-    source_conn = sqlite3.connect(SOURCE_DB)
-    
-    # Use SQLite backup API
-    target_conn = sqlite3.connect(TARGET_DB)
+    # Use SQLite backup API in steps (bot can keep running - see backup_manager.py)
+    from backup_manager import online_backup
     
     print(f"\n📦 Backing up entire database...")
-    source_conn.backup(target_conn)
-    
-    source_conn.close()
-    target_conn.close()
+    online_backup(SOURCE_DB, TARGET_DB)
     
     print("✅ Backup complete!")
     
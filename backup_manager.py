@@ -0,0 +1,203 @@
+"""
+Online backup baze, ki ne ustavi bota.
+
+- Backup API po korakih (`pages` strani na korak, `sleep` med koraki) -> pisalci
+  (scraper, Telegram handlerji) med kopiranjem normalno delajo naprej.
+- Izvorna povezava drži odprto BRALNO transakcijo (WAL snapshot). Brez tega
+  SQLite ob vsakem tujem zapisu backup začne znova in pri zasedeni bazi se
+  nikoli ne konča. S pripetim snapshotom je kopija konsistentna na trenutek začetka.
+- Vsak zagon naredi POLNO kopijo in jo celo prebere za sha256. Inkrementalnih
+  (delta/WAL) kopij ni: backup API ne zna kopirati samo spremenjenih strani,
+  kopiranje WAL okvirjev pa bi bilo odvisno od trenutka checkpointa (bot ga
+  dela sam) in bi za obnovo potrebovalo verigo kopij. "Inkrementalno" tu
+  pomeni samo kopiranje po korakih nad pripetim WAL snapshotom, ki ne blokira
+  pisalcev. Če je nova kopija po vsebini (sha256) enaka zadnji, se zavrže -
+  velikost/mtime nista uporabna, ker ju WAL checkpoint spremeni tudi brez
+  novih podatkov.
+- Preverjanje: PRAGMA quick_check na kopiji + sha256 v .json sidecar datoteki
+  (brez ponovnega štetja vrstic v produkcijski bazi).
+- Rotacija: obdrži zadnjih BACKUP_KEEP kopij.
+
+Uporaba:
+    python backup_manager.py                 # backup DB_PATH v backups/
+    python backup_manager.py bot.db /mnt/bk  # poljubna baza/mapa
+    python backup_manager.py --verify /mnt/bk/bot_20260101_030000.db
+"""
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from utils import config_value
+
+
+def _sha256(path, chunk_size=1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def online_backup(source_path, target_path, pages=1024, sleep=0.05, progress=None):
+    """
+    Konsistentna kopija `source_path` -> `target_path` po korakih.
+    Vrne število kopiranih strani.
+    """
+    src = sqlite3.connect(source_path, isolation_level=None)
+    dst = sqlite3.connect(target_path)
+    copied = {"pages": 0}
+
+    def _progress(status, remaining, total):
+        copied["pages"] = total
+        if progress:
+            progress(total - remaining, total)
+
+    try:
+        # Pripni snapshot: backup_step uporabi to bralno transakcijo in se ne restarta
+        src.execute("BEGIN")
+        src.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        src.backup(dst, pages=pages, progress=_progress, sleep=sleep)
+        src.execute("COMMIT")
+        # Kopija podeduje WAL iz glave - samostojna datoteka brez -wal/-shm je bolj praktična
+        dst.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        dst.close()
+        src.close()
+    return copied["pages"]
+
+
+def verify_backup(path, expected_sha256=None):
+    """quick_check + (opcijsko) sha256. Vrne (ok, sporočilo)."""
+    if expected_sha256 and _sha256(path) != expected_sha256:
+        return False, "sha256 se ne ujema"
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        result = conn.execute("PRAGMA quick_check").fetchone()[0]
+    finally:
+        conn.close()
+    if result != "ok":
+        return False, f"quick_check: {result}"
+    return True, "ok"
+
+
+class BackupManager:
+    def __init__(self, db_path, backup_dir=None, keep=None, pages=None, sleep=None):
+        self.db_path = db_path
+        if backup_dir is None:
+            backup_dir = config_value("BACKUP_DIR", None)
+        if backup_dir is None:
+            backup_dir = os.path.join(os.path.dirname(os.path.abspath(db_path)), "backups")
+        self.backup_dir = backup_dir
+        self.keep = int(keep if keep is not None else config_value("BACKUP_KEEP", 7))
+        self.pages = int(pages if pages is not None else config_value("BACKUP_PAGES_PER_STEP", 1024))
+        self.sleep = float(sleep if sleep is not None else config_value("BACKUP_STEP_SLEEP", 0.05))
+        self.prefix = os.path.splitext(os.path.basename(db_path))[0]
+
+    def list_backups(self):
+        """Seznam (pot, meta) od najnovejše do najstarejše kopije."""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        result = []
+        for name in os.listdir(self.backup_dir):
+            if name.startswith(self.prefix + "_") and name.endswith(".db"):
+                path = os.path.join(self.backup_dir, name)
+                meta = {}
+                try:
+                    with open(path + ".json", encoding="utf-8") as f:
+                        meta = json.load(f)
+                except (OSError, ValueError):
+                    pass
+                result.append((path, meta))
+        result.sort(key=lambda item: item[0], reverse=True)
+        return result
+
+    def run(self, force=False):
+        """
+        Naredi backup, ga preveri in zarotira stare.
+        Vrne dict s povzetkom; status: 'ok', 'skipped' (enaka vsebina kot zadnja kopija) ali 'failed'.
+        """
+        os.makedirs(self.backup_dir, exist_ok=True)
+
+        # Checkpoint PRED kopijo: manjši WAL
+        try:
+            conn = sqlite3.connect(self.db_path)
+            conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        target = os.path.join(self.backup_dir, f"{self.prefix}_{stamp}.db")
+        partial = target + ".part"
+
+        start = time.time()
+        try:
+            pages = online_backup(self.db_path, partial, pages=self.pages, sleep=self.sleep)
+            ok, msg = verify_backup(partial)
+            if not ok:
+                raise RuntimeError(f"Preverjanje kopije ni uspelo: {msg}")
+            digest = _sha256(partial)
+            backups = self.list_backups()
+            # Kopija iste vsebine je bajtno enaka (strani se kopirajo 1:1) - ne hranimo duplikata
+            if backups and not force and backups[0][1].get("sha256") == digest:
+                os.remove(partial)
+                print(f"💾 [BACKUP] Baza nespremenjena od {os.path.basename(backups[0][0])} - kopija zavržena.")
+                return {"status": "skipped", "path": backups[0][0]}
+            os.replace(partial, target)
+        except Exception as e:
+            if os.path.exists(partial):
+                os.remove(partial)
+            print(f"❌ [BACKUP] Napaka: {e}")
+            return {"status": "failed", "error": str(e)}
+
+        meta = {
+            "source": os.path.abspath(self.db_path),
+            "sha256": digest,
+            "pages": pages,
+            "bytes": os.path.getsize(target),
+            "duration_s": round(time.time() - start, 2),
+            "created_at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        with open(target + ".json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+
+        removed = self.rotate()
+
+        print(f"💾 [BACKUP] {os.path.basename(target)} | {meta['bytes'] / (1024 * 1024):.1f} MB | "
+              f"{meta['duration_s']}s | quick_check ok | rotacija: -{removed}")
+        return {"status": "ok", "path": target, **meta}
+
+    def rotate(self):
+        """Izbriše vse razen zadnjih `keep` kopij. Vrne število izbrisanih."""
+        removed = 0
+        for path, _ in self.list_backups()[self.keep:]:
+            for p in (path, path + ".json"):
+                if os.path.exists(p):
+                    os.remove(p)
+            removed += 1
+        return removed
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args and args[0] == "--verify":
+        path = args[1]
+        expected = None
+        if os.path.exists(path + ".json"):
+            with open(path + ".json", encoding="utf-8") as f:
+                expected = json.load(f).get("sha256")
+        ok, msg = verify_backup(path, expected)
+        print(("✅" if ok else "❌") + f" {path}: {msg}")
+        sys.exit(0 if ok else 1)
+
+    db_path = args[0] if args else os.getenv("DB_PATH") or config_value("DB_PATH", "bot.db")
+    backup_dir = args[1] if len(args) > 1 else None
+    result = BackupManager(db_path, backup_dir).run(force=True)
+    sys.exit(0 if result["status"] == "ok" else 1)
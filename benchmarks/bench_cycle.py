@@ -0,0 +1,537 @@
+"""
+Benchmark: celoten cikel check_for_new_ads na sintetični bazi poljubne velikosti.
+
+seed_test_data vstavi par vrstic, produkcija pa ima tisoče uporabnikov, deset
+tisoče sledenih URL-jev in milijon vrstic v SentAds. Ta benchmark:
+
+- zgradi sintetično bazo (--users, --urls, --tracking, --sentads): vsak sledeni
+  par (uporabnik, URL) ima v SentAds že vse oglase s trenutne prve strani,
+  preostanek do --sentads so stari oglasi (velikost tabele in indeksa),
+- zažene fixture_server.py (avto.net, bolha) in fake_telegram.py v istem procesu,
+- pred vsakim ciklom doda --new-ads novih oglasov na vir in označi --due delež
+  URL-jev kot zapadle (zadnji ScraperLogs zapis star 2 uri),
+- požene PRAVI main.check_for_new_ads in nato DeliveryWorker do prazne vrste.
+
+Čas po fazah meri ovoj okoli obstoječih funkcij (ekskluzivno - gnezdeni klici se
+odštejejo, vsota po vseh threadih, zato je lahko večja od časa cikla):
+    due      get_pending_urls
+    fetch    get_latest_offers (avtonet, bolha)
+    parse    Scraper.run / run_with_pagination / stage_ads (brez fetch in baze)
+    dedup    is_ad_new, is_first_scan, MarketData lookup, check_new_offers, plan_*
+    persist  zapisi (MarketData, SentAds, ScraperLogs, Outbox)
+    render   render_offer / render_digest
+    send     DeliveryWorker.drain do prazne vrste
+Poleg tega: čakanje na write lock (sonda BEGIN IMMEDIATE vsakih --probe-interval s),
+največji RSS procesa in štetje (zapadle vrstice get_pending_urls, staged, obvestila, poslano).
+
+Rezultat (--out) je JSON; --compare primerja mediane faz s prejšnjim zagonom.
+
+Uporaba:
+    python benchmarks/bench_cycle.py
+    python benchmarks/bench_cycle.py --scale large --cycles 3 --out cycle_large.json
+    python benchmarks/bench_cycle.py --scale large --out new.json --compare cycle_large.json
+"""
+import argparse
+import asyncio
+import contextlib
+import functools
+import hashlib
+import json
+import os
+import random
+import resource
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_telegram import build_application, pct
+from fake_telegram import FakeTelegram
+from fixture_server import FixtureSite, start_in_thread
+from page_factory import PAGE_SIZE
+
+STAGES = ("due", "fetch", "parse", "dedup", "persist", "render", "send")
+
+# users, urls, tracking, sentads
+SCALES = {
+    "small": (200, 500, 600, 50_000),
+    "medium": (1_000, 5_000, 6_000, 250_000),
+    "large": (5_000, 20_000, 24_000, 1_000_000),
+}
+
+PACKAGES = ["TRIAL"] * 5 + ["BASIC"] * 3 + ["PRO"] * 3 + ["ULTRA", "VIP"]
+
+
+# --- merjenje faz ---
+
+class StageClock:
+    """Ekskluziven čas po fazah: gnezden klic (npr. fetch v Scraper.run) se odšteje zunanjemu."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.seconds = dict.fromkeys(STAGES, 0.0)
+            self.calls = dict.fromkeys(STAGES, 0)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        stack = self._local.__dict__.setdefault("stack", [])
+        frame = [time.perf_counter(), 0.0]   # začetek, čas gnezdenih klicev
+        stack.append(frame)
+        try:
+            yield
+        finally:
+            stack.pop()
+            elapsed = time.perf_counter() - frame[0]
+            if stack:
+                stack[-1][1] += elapsed
+            with self._lock:
+                self.seconds[name] += elapsed - frame[1]
+                self.calls[name] += 1
+
+    def wrap(self, owner, attr, name):
+        original = getattr(owner, attr)
+        clock = self
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            with clock.stage(name):
+                return original(*args, **kwargs)
+
+        setattr(owner, attr, timed)
+
+    def wrap_generator(self, owner, attr, name):
+        """check_new_offers je generator - merimo vsak next(), ne samo ustvarjanje."""
+        original = getattr(owner, attr)
+        clock = self
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            iterator = original(*args, **kwargs)
+            while True:
+                with clock.stage(name):
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        return
+                yield item
+
+        setattr(owner, attr, timed)
+
+
+def instrument(clock):
+    import delivery
+    from data_manager import DataManager
+    from database import Database
+    from scraper.avtonet.scraper import Scraper as AvtonetScraper
+    from scraper.bolha.scraper import Scraper as BolhaScraper
+
+    clock.wrap(Database, "get_pending_urls", "due")
+    clock.wrap(Database, "get_newly_failed_urls", "due")
+    for scraper in (AvtonetScraper, BolhaScraper):
+        clock.wrap(scraper, "get_latest_offers", "fetch")
+    clock.wrap(AvtonetScraper, "run", "parse")
+    clock.wrap(BolhaScraper, "run_with_pagination", "parse")
+    clock.wrap(BolhaScraper, "stage_ads", "parse")
+    for attr in ("is_ad_new", "is_first_scan", "get_market_data_by_id", "get_subscription_types"):
+        clock.wrap(Database, attr, "dedup")
+    clock.wrap_generator(DataManager, "check_new_offers", "dedup")
+    # main uvozi plan_* šele ob klicu, zato zadošča zamenjava v modulu
+    clock.wrap(delivery, "plan_deliveries", "dedup")
+    clock.wrap(delivery, "plan_digests", "dedup")
+    for attr in ("insert_market_data", "bulk_add_sent_ads", "log_scraper_run", "update_url_fail_count",
+                 "reset_url_fail_count", "add_sent_ads", "enqueue_notifications"):
+        clock.wrap(Database, attr, "persist")
+    clock.wrap(DataManager, "render_offer", "render")
+    clock.wrap(DataManager, "render_digest", "render")
+
+
+class LockProbe(threading.Thread):
+    """Periodično BEGIN IMMEDIATE na lastni povezavi: koliko bi čakal katerikoli drug zapis (npr. handler)."""
+
+    def __init__(self, db_path, interval=0.05):
+        super().__init__(name="lock-probe", daemon=True)
+        self.db_path = db_path
+        self.interval = interval
+        self.samples = []
+        self.stop = threading.Event()
+
+    def run(self):
+        conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=120)
+        while not self.stop.is_set():
+            start = time.perf_counter()
+            conn.execute("BEGIN IMMEDIATE")
+            self.samples.append(time.perf_counter() - start)
+            conn.execute("ROLLBACK")
+            self.stop.wait(self.interval)
+        conn.close()
+
+    def take(self):
+        samples, self.samples = self.samples, []
+        ms = [s * 1000 for s in samples]
+        return {
+            "probes": len(ms), "total_s": round(sum(samples), 3),
+            "p50_ms": round(statistics.median(ms), 2) if ms else None,
+            "p95_ms": round(pct(ms, 0.95), 2) if ms else None,
+            "max_ms": round(max(ms), 2) if ms else None,
+        }
+
+
+def rss_mb():
+    """Trenutni RSS iz /proc (Linux), sicer None."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+# --- sintetična baza ---
+
+def build_database(db, site, args):
+    """Bulk vpis (ena transakcija na tabelo). Vrne {tabela: vrstic}."""
+    rng = random.Random(args.seed)
+    conn = sqlite3.connect(db.db_name, isolation_level=None)
+    conn.execute("PRAGMA synchronous=OFF")
+
+    user_ids = [10_000_000 + i for i in range(args.users)]
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO Users (telegram_id, telegram_name, subscription_type, max_urls, scan_interval, is_active) "
+        "VALUES (?, ?, ?, 50, 15, 1)",
+        ((uid, f"bench_{uid}", rng.choice(PACKAGES)) for uid in user_ids)
+    )
+
+    sources = {}
+    url_rows = []
+    for url_id in range(1, args.urls + 1):
+        if rng.random() < args.avtonet_share:
+            url = f"https://www.avto.net/Ads/results.asp?znamka=Bench{url_id}&cenaMax=999999&stran="
+            sources[url_id] = "avtonet"
+        else:
+            url = f"https://www.bolha.com/search/?keywords=bench+{url_id}&sort=new"
+            sources[url_id] = "bolha"
+        binary = url.encode("latin-1")
+        url_rows.append((url_id, url, binary, hashlib.md5(binary).hexdigest()))
+    conn.executemany("INSERT INTO Urls (url_id, url, url_bin, url_hash) VALUES (?, ?, ?, ?)", url_rows)
+
+    # Vsak URL ima vsaj enega sledilca, ostalo so prekrivanja (isti URL več uporabnikom)
+    tracking = {(user_ids[(url_id - 1) % len(user_ids)], url_id) for url_id in sources}
+    while len(tracking) < max(args.tracking, len(sources)):
+        tracking.add((rng.choice(user_ids), rng.randint(1, args.urls)))
+    conn.executemany("INSERT INTO Tracking (telegram_id, url_id) VALUES (?, ?)", sorted(tracking))
+
+    # En uspešen sken na URL (ni "prvi sken"); zapadlost nastavi mark_due pred ciklom
+    conn.executemany(
+        "INSERT INTO ScraperLogs (url_id, status_code, found_count, duration, bytes_used, error_msg, timestamp) "
+        "VALUES (?, 200, 0, 0.5, 20000, 'Seed', strftime('%d.%m.%Y %H:%M:%S', 'now', 'localtime'))",
+        ((url_id,) for url_id in sources)
+    )
+    conn.execute("COMMIT")
+
+    # Trenutna prva stran vsakega vira je "že poslana" vsem sledilcem
+    prefix = {"avtonet": "an_", "bolha": "bo_"}
+    page_ids = {
+        source: [f"{prefix[source]}{ad['id']}" for ad in
+                 site.inventories[source].page(1, PAGE_SIZE[source]) + site.inventories[source].top_ads()]
+        for source in prefix
+    }
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT OR IGNORE INTO SentAds (telegram_id, content_id) VALUES (?, ?)",
+        ((uid, cid) for uid, url_id in tracking for cid in page_ids[sources[url_id]])
+    )
+    current = conn.execute("SELECT COUNT(*) FROM SentAds").fetchone()[0]
+    conn.executemany(
+        "INSERT OR IGNORE INTO SentAds (telegram_id, content_id, sent_at) VALUES (?, ?, ?)",
+        ((rng.choice(user_ids), f"an_old{n}", f"{rng.randint(1, 28):02d}.0{rng.randint(1, 9)}.2026 12:00:00")
+         for n in range(max(0, args.sentads - current)))
+    )
+    conn.execute("COMMIT")
+    conn.execute("ANALYZE")
+
+    counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+              for table in ("Users", "Urls", "Tracking", "SentAds", "ScraperLogs")}
+    conn.close()
+    return counts
+
+
+def mark_due(db_path, fraction, rng):
+    """Zadnji ScraperLogs zapis vsakega URL-ja: naključni delež star 2 uri (zapadel), ostali sveži."""
+    conn = sqlite3.connect(db_path, isolation_level=None, timeout=60)
+    url_ids = [r[0] for r in conn.execute("SELECT url_id FROM Urls")]
+    due = rng.sample(url_ids, int(len(url_ids) * fraction))
+    conn.execute("BEGIN")
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS BenchDue (url_id INTEGER PRIMARY KEY)")
+    conn.execute("DELETE FROM BenchDue")
+    conn.executemany("INSERT INTO BenchDue (url_id) VALUES (?)", ((u,) for u in due))
+    conn.execute("""
+        UPDATE ScraperLogs
+        SET timestamp_utc = CASE WHEN url_id IN (SELECT url_id FROM BenchDue)
+                                 THEN datetime('now', '-2 hours') ELSE datetime('now') END
+        WHERE id IN (SELECT MAX(id) FROM ScraperLogs GROUP BY url_id)
+    """)
+    conn.execute("COMMIT")
+    conn.close()
+    return len(due)
+
+
+# --- cikel ---
+
+def _queued(outbox_stats):
+    """Vse vrstice v Outbox (brez oldest_pending_s iz get_outbox_stats)."""
+    return sum(count for status, count in outbox_stats.items() if status != "oldest_pending_s")
+
+
+async def run_cycle(main, worker, context, db, clock, probe, site, rng, args):
+    from data_manager import DataManager
+    from database import Database
+
+    for source in ("avtonet", "bolha"):
+        site.inventories[source].add_ads(args.new_ads)
+    mark_due(db.db_name, args.due, rng)
+    outbox_before = db.get_outbox_stats()
+    fixture_before = site.snapshot()
+
+    # Štetje na vhodu v dedup in iz get_pending_urls (brez ponovnega poizvedovanja)
+    staged = []
+    original_check = DataManager.check_new_offers
+
+    def capture(self, staged_ads, *a, **kw):
+        staged.append(len(staged_ads))
+        return original_check(self, staged_ads, *a, **kw)
+
+    DataManager.check_new_offers = capture
+    pending = []
+    original_pending = Database.get_pending_urls
+
+    def count_pending(self):
+        rows = original_pending(self)
+        pending.append(len(rows))
+        return rows
+
+    Database.get_pending_urls = count_pending
+
+    clock.reset()
+    probe.take()
+    out = sys.stdout if args.verbose else open(os.devnull, "w")
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(out):
+            await main.check_for_new_ads(context)
+            cycle_s = time.perf_counter() - start
+            with clock.stage("send"):
+                while True:
+                    await worker.drain(context)
+                    stats = db.get_outbox_stats()
+                    if not stats.get("pending") and not stats.get("sending"):
+                        break
+                    await asyncio.sleep(0.2)
+    finally:
+        DataManager.check_new_offers = original_check
+        Database.get_pending_urls = original_pending
+        if out is not sys.stdout:
+            out.close()
+    total_s = time.perf_counter() - start
+
+    outbox = db.get_outbox_stats()
+    fixture = site.snapshot()
+    counts = {
+        "pending": pending[0] if pending else 0,
+        "requests": fixture["requests"] - fixture_before["requests"],
+        "staged": staged[0] if staged else 0,
+        "enqueued": _queued(outbox) - _queued(outbox_before),
+        "sent": outbox.get("sent", 0) - outbox_before.get("sent", 0),
+        "failed": outbox.get("failed", 0) - outbox_before.get("failed", 0),
+    }
+    # Prazen cikel bi izpisal zavajajoče čase (render/send = 0) - raje napaka
+    assert counts["staged"] > 0, f"cikel ni pripravil nobenega oglasa (staged 0): {counts}"
+    assert counts["sent"] > 0, f"cikel ni poslal nobenega obvestila (sent 0): {counts}"
+    return {
+        "cycle_s": round(cycle_s, 3),
+        "total_s": round(total_s, 3),
+        "stages_s": {name: round(seconds, 4) for name, seconds in clock.seconds.items()},
+        "calls": dict(clock.calls),
+        "counts": counts,
+        "lock_wait": probe.take(),
+        "rss_mb": round(rss_mb() or 0, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def summarize(cycles):
+    return {
+        "cycle_s": round(statistics.median(c["cycle_s"] for c in cycles), 3),
+        "stages_s": {name: round(statistics.median(c["stages_s"][name] for c in cycles), 4) for name in STAGES},
+        "lock_wait_total_s": round(statistics.median(c["lock_wait"]["total_s"] for c in cycles), 3),
+        "lock_wait_max_ms": max((c["lock_wait"]["max_ms"] or 0) for c in cycles),
+        "peak_rss_mb": max(c["peak_rss_mb"] for c in cycles),
+    }
+
+
+def print_report(result):
+    params = result["params"]
+    print(f"\n=== CIKEL ===  {params['users']} uporabnikov, {params['urls']} URL-jev, "
+          f"{result['database']['SentAds']} SentAds, due {params['due']:.0%}, {params['new_ads']} novih/vir/cikel")
+    print(f"Priprava baze: {result['seed_s']:.1f}s ({result['database']})")
+    header = f"{'cikel':<6}{'čas':>8}" + "".join(f"{name:>9}" for name in STAGES) + f"{'lock max':>10}{'RSS':>8}"
+    print(header)
+    for i, c in enumerate(result["cycles"], 1):
+        print(f"{i:<6}{c['cycle_s']:>7.2f}s" + "".join(f"{c['stages_s'][name]:>8.2f}s" for name in STAGES)
+              + f"{c['lock_wait']['max_ms'] or 0:>8.0f}ms{c['peak_rss_mb']:>6.0f}MB")
+        counts = c["counts"]
+        print(f"      pending {counts['pending']}, zahtev {counts['requests']}, staged {counts['staged']}, "
+              f"v vrsto {counts['enqueued']}, poslano {counts['sent']}, neuspelo {counts['failed']}")
+
+
+def print_compare(result, baseline):
+    new, old = result["summary"], baseline["summary"]
+    print(f"\n=== PRIMERJAVA ===  {baseline.get('git') or '?'} -> {result.get('git') or '?'} (mediane)")
+    rows = [("cycle", old["cycle_s"], new["cycle_s"])]
+    rows += [(name, old["stages_s"].get(name, 0), new["stages_s"][name]) for name in STAGES]
+    rows += [("lock wait", old["lock_wait_total_s"], new["lock_wait_total_s"])]
+    for name, before, after in rows:
+        change = f"{(after - before) / before * 100:+.0f}%" if before else "-"
+        print(f"{name:<10}{before:>9.3f}s -> {after:>9.3f}s  {change:>6}")
+    print(f"{'peak RSS':<10}{old['peak_rss_mb']:>8.0f}MB -> {new['peak_rss_mb']:>8.0f}MB")
+
+
+async def bench(args):
+    import config
+    # Vse zunanje odvisnosti gredo na lokalne nadomestke, brez zamikov med zahtevami
+    config.USE_AI = False
+    config.SCRAPER_FETCH_DELAY = (args.fetch_delay, args.fetch_delay)
+    config.SCRAPER_URL_DELAY = (0, 0)
+    config.SCRAPER_HTTP_ARCHIVE_MODE = None
+    config.MARKET_DB_PATH = None
+
+    site = FixtureSite(initial=args.inventory, seed=args.seed, latency=args.fetch_latency)
+    server, base_url = start_in_thread(site)
+    config.SCRAPER_HOST_OVERRIDE = base_url
+
+    import main
+    from database import Database
+    from delivery import DeliveryWorker
+    from rate_limiter import TelegramRateLimiter
+
+    workdir = tempfile.mkdtemp(prefix="bench_cycle_")
+    db = Database(os.path.join(workdir, "bench.db"))
+    db.init_db()
+    start = time.perf_counter()
+    counts = build_database(db, site, args)
+    seed_s = time.perf_counter() - start
+    print(f"Baza: {db.db_name} ({seed_s:.1f}s)")
+
+    main.DB_PATH = db.db_name
+    main.TEST_BOT = main.DEV_MODE = False
+
+    clock = StageClock()
+    instrument(clock)
+    probe = LockProbe(db.db_name, args.probe_interval)
+    probe.start()
+
+    fake = await FakeTelegram(latency=args.latency, jitter=args.jitter, enforce_limits=args.enforce_limits,
+                              seed=args.seed).start()
+    application = build_application(fake)
+    cycles = []
+    async with application:
+        worker = DeliveryWorker(db, limiter=TelegramRateLimiter(), base_delay=0.5, max_delay=5)
+        # Cikel ne sproži workerja (prazen bot_data) - dostavo merimo ločeno kot "send"
+        context = types.SimpleNamespace(bot=application.bot, application=types.SimpleNamespace(bot_data={}),
+                                        job_queue=None)
+        rng = random.Random(args.seed)
+        for i in range(args.cycles):
+            cycle = await run_cycle(main, worker, context, db, clock, probe, site, rng, args)
+            cycles.append(cycle)
+            print(f"Cikel {i + 1}/{args.cycles}: {cycle['cycle_s']:.2f}s (+ send {cycle['stages_s']['send']:.2f}s)")
+
+    probe.stop.set()
+    probe.join()
+    await fake.stop()
+    server.shutdown()
+
+    result = {
+        "benchmark": "cycle",
+        "git": git_revision(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "params": {name: value for name, value in vars(args).items() if name not in ("out", "compare")},
+        "database": counts,
+        "seed_s": round(seed_s, 2),
+        "cycles": cycles,
+        "summary": summarize(cycles),
+        "fixture": site.snapshot(),
+        "telegram": fake.stats(),
+    }
+    print_report(result)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, default=str)
+        print(f"\nRezultat: {args.out}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_compare(result, json.load(f))
+    if not args.keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark cikla check_for_new_ads")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small",
+                        help="privzete velikosti (users/urls/tracking/sentads)")
+    parser.add_argument("--users", type=int)
+    parser.add_argument("--urls", type=int)
+    parser.add_argument("--tracking", type=int, help="vrstic v Tracking (>= urls)")
+    parser.add_argument("--sentads", type=int)
+    parser.add_argument("--avtonet-share", type=float, default=0.7, help="delež avto.net URL-jev (ostalo bolha)")
+    parser.add_argument("--due", type=float, default=0.2, help="delež URL-jev, zapadlih v vsakem ciklu")
+    parser.add_argument("--new-ads", type=int, default=3, help="novih oglasov na vir pred vsakim ciklom")
+    parser.add_argument("--inventory", type=int, default=200, help="oglasov na vir ob zagonu fixture strežnika")
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--fetch-latency", type=float, default=0.0, help="zamik fixture strežnika (s)")
+    parser.add_argument("--fetch-delay", type=float, default=0.0, help="SCRAPER_FETCH_DELAY (s)")
+    parser.add_argument("--latency", type=float, default=0.02, help="RTT do Telegram API (s)")
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--enforce-limits", action="store_true")
+    parser.add_argument("--probe-interval", type=float, default=0.05, help="interval sonde write locka (s)")
+    parser.add_argument("--out", help="JSON z rezultati")
+    parser.add_argument("--compare", help="JSON prejšnjega zagona za primerjavo")
+    parser.add_argument("--keep", action="store_true", help="ne briši sintetične baze")
+    parser.add_argument("--verbose", action="store_true", help="izpis scraperjev in cikla")
+    args = parser.parse_args()
+
+    defaults = dict(zip(("users", "urls", "tracking", "sentads"), SCALES[args.scale]))
+    for name, value in defaults.items():
+        if getattr(args, name) is None:
+            setattr(args, name, value)
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Benchmark: FTS5 iskanje po MarketData (MarketDataFTS) vs. LIKE.
+
+Zgradi začasno bazo z N sintetičnimi oglasi (privzeto 1M), napolni jih preko
+običajnih INSERT-ov (triggerji vzdržujejo FTS indeks) in izmeri latenco
+Database.search_market_text za tipične uporabniške poizvedbe.
+
+Uporaba:
+    python benchmarks/bench_fts.py
+    python benchmarks/bench_fts.py --rows 200000 --db /tmp/bench_fts.db --keep
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+
+ZNAMKE = {
+    "Audi": ["A3 Sportback", "A4 Avant", "A6 Allroad", "Q5"],
+    "BMW": ["320d Touring", "520d", "X3 xDrive", "118i"],
+    "Škoda": ["Octavia Combi", "Fabia", "Superb", "Kodiaq"],
+    "Volkswagen": ["Golf Variant", "Passat", "Tiguan", "Polo"],
+    "Renault": ["Clio", "Mégane Grandtour", "Captur", "Kangoo"],
+    "Citroën": ["C3", "C4 Picasso", "Berlingo", "C5 Aircross"],
+}
+GORIVA = ["diesel motor", "bencinski motor", "hibridni pogon", "električni pogon"]
+KRAJI = ["Ljubljana", "Maribor", "Celje", "Kranj", "Novo mesto", "Črnomelj", "Murska Sobota", "Šiška"]
+OPISI = [
+    "Prodamo hišo z garažo in vrtom, zgr. l. {leto}",
+    "Stanovanje v mirni soseski, obnovljeno {leto}, balkon, klet",
+    "Poslovni prostor v pritličju, primeren za pisarno",
+    "Vikend na Dolenjskem, ob potoku, dostop z avtom",
+]
+
+QUERIES = [
+    "octavia combi",
+    "skoda",
+    "megane",
+    "a4 av",
+    "garaz vrt",
+    "crnomelj",
+    "siska balkon",
+    "citroen berlingo",
+]
+
+
+def generate_rows(n, seed=42):
+    rnd = random.Random(seed)
+    for i in range(n):
+        if rnd.random() < 0.8:
+            znamka = rnd.choice(list(ZNAMKE))
+            model = rnd.choice(ZNAMKE[znamka])
+            title = f"{znamka} {model} {rnd.choice(['1.6 TDI', '2.0 TDI', '1.0 TSI', '1.5 dCi', ''])}".strip()
+            snippet = {
+                "ime_avta": title,
+                "leto_1_reg": str(rnd.randint(2005, 2024)),
+                "prevozenih": f"{rnd.randint(5, 300)}.000 km",
+                "gorivo": rnd.choice(GORIVA),
+                "motor": f"{rnd.randint(999, 2999)} ccm, {rnd.randint(50, 200)} kW",
+                "lokacija": rnd.choice(KRAJI),
+            }
+            source, category = "avtonet", "car"
+        else:
+            title = rnd.choice(["Hiša", "Stanovanje", "Poslovni prostor", "Vikend"])
+            snippet = {
+                "description": rnd.choice(OPISI).format(leto=rnd.randint(1950, 2023)),
+                "location": rnd.choice(KRAJI),
+            }
+            source, category = "nepremicnine", "property"
+        yield (
+            f"an_{i}", source, category, title,
+            f"{rnd.randint(1, 90)}.{rnd.randint(100, 999)} €",
+            f"https://example.invalid/{i}",
+            json.dumps(snippet, ensure_ascii=False),
+        )
+
+
+def populate(db, n, batch=50_000):
+    conn = db.get_connection()
+    rows = generate_rows(n)
+    start = time.perf_counter()
+    inserted = 0
+    while inserted < n:
+        chunk = [row for _, row in zip(range(batch), rows)]
+        if not chunk:
+            break
+        conn.executemany(
+            "INSERT INTO MarketData (content_id, source, category, title, price, link, snippet_data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            chunk,
+        )
+        conn.commit()
+        inserted += len(chunk)
+        print(f"   ... {inserted:,} / {n:,}", end="\r")
+    conn.close()
+    elapsed = time.perf_counter() - start
+    print(f"✅ Vstavljenih {inserted:,} vrstic v {elapsed:.1f}s ({inserted / elapsed:,.0f} vrstic/s, s FTS triggerji)")
+
+
+def timed(fn, repeats):
+    samples = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return statistics.median(samples), p95, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FTS5 benchmark za MarketData")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--db", default=None, help="pot do baze (privzeto začasna datoteka)")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--keep", action="store_true", help="ne briši baze po koncu")
+    parser.add_argument("--skip-like", action="store_true", help="preskoči LIKE primerjavo")
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.gettempdir(), f"bench_fts_{args.rows}.db")
+    reuse = os.path.exists(db_path)
+    db = Database(db_path)
+    db.init_db()
+
+    if not reuse:
+        populate(db, args.rows)
+    else:
+        print(f"♻️ Uporabljam obstoječo bazo {db_path}")
+
+    size_mb = os.path.getsize(db_path) / (1024 * 1024)
+    print(f"📦 Velikost baze: {size_mb:.1f} MB\n")
+
+    print(f"{'poizvedba':<20} {'FTS p50':>9} {'FTS p95':>9} {'zadetki':>8} {'bm25 p50':>10} {'LIKE p50':>10}")
+    print("-" * 72)
+    for q in QUERIES:
+        p50, p95, res = timed(lambda: db.search_market_text(q, limit=10), args.repeats)
+        rank_p50, _, _ = timed(lambda: db.search_market_text(q, limit=10, order="rank"), 3)
+
+        like_p50 = "-"
+        if not args.skip_like:
+            conn = db.get_connection()
+            pattern = f"%{q.split()[0]}%"
+            like_ms, _, _ = timed(
+                lambda: conn.execute(
+                    "SELECT content_id FROM MarketData WHERE title LIKE ? OR snippet_data LIKE ? LIMIT 10",
+                    (pattern, pattern),
+                ).fetchall(),
+                3,
+            )
+            conn.close()
+            like_p50 = f"{like_ms:.1f}ms"
+
+        print(f"{q:<20} {p50:>7.1f}ms {p95:>7.1f}ms {len(res):>8} {rank_p50:>8.1f}ms {like_p50:>10}")
+
+    if not args.keep and not args.db:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+
+if __name__ == "__main__":
+    main()
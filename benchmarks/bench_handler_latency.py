@@ -0,0 +1,181 @@
+"""
+Benchmark: latenca Telegram handlerjev med scrape ciklom (sync Database vs AsyncDatabase).
+
+Simulira:
+- "scrape cikel" v ločenem threadu: periodično drži write lock (BEGIN IMMEDIATE,
+  vstavljanje v MarketData/ScraperLogs), kot ga drži scraper med shranjevanjem,
+- N sočasnih uporabnikov, ki kličejo tipičen handler (/list + /info: branje
+  Users/Tracking + zapis v UserActivity),
+- sondo event loopa, ki meri zamik (loop lag) - to je čas, ko bot NE more
+  odgovoriti nikomur.
+
+Pri sync načinu vsak zapis med scrape ciklom čaka na lock DIREKTNO v event loopu,
+zato zamrzne vse uporabnike. Pri async načinu branja tečejo na DB executorju,
+log_user_activity gre preko adb.fire (background), loop in handlerji tečejo naprej.
+
+Uporaba:
+    python benchmarks/bench_handler_latency.py
+    python benchmarks/bench_handler_latency.py --users 50 --duration 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from async_database import AsyncDatabase
+
+
+def seed(db, users):
+    conn = db.get_connection()
+    for i in range(users):
+        conn.execute(
+            "INSERT OR IGNORE INTO Users (telegram_id, telegram_name, subscription_type, is_active, max_urls) "
+            "VALUES (?, ?, 'PRO', 1, 5)",
+            (1000 + i, f"user{i}"),
+        )
+        for j in range(3):
+            cur = conn.execute("INSERT INTO Urls (url, url_bin) VALUES (?, ?)", (f"https://x/{i}/{j}", b""))
+            conn.execute("INSERT INTO Tracking (telegram_id, url_id) VALUES (?, ?)", (1000 + i, cur.lastrowid))
+    conn.commit()
+    conn.close()
+
+
+def scrape_cycle_writer(db_path, stop, lock_hold, pause, windows):
+    """Drži write lock `lock_hold` s, nato `pause` s premora - kot scraper pri shranjevanju."""
+    import sqlite3
+    conn = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+    n = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        while time.perf_counter() - start < lock_hold:
+            conn.execute(
+                "INSERT INTO MarketData (content_id, source, title, price, snippet_data) VALUES (?, 'avtonet', ?, ?, ?)",
+                (f"an_bench_{n}", f"Audi A4 {n}", "10.000 €", json.dumps({"leto_1_reg": "2018"})),
+            )
+            n += 1
+            time.sleep(0.002)
+        conn.execute("COMMIT")
+        windows.append((start, time.perf_counter()))
+        stop.wait(pause)
+    conn.close()
+
+
+def handler_sync(db, user_id):
+    """Enako kot /list + log_user_activity, klicano direktno (blokira loop)."""
+    db.get_user_urls_with_status(user_id)
+    db.get_user_subscription_info(user_id)
+    db.log_user_activity(user_id, "/list", "bench")
+
+
+async def handler_async(adb, user_id):
+    await adb.get_user_urls_with_status(user_id)
+    await adb.get_user_subscription_info(user_id)
+    adb.fire("log_user_activity", user_id, "/list", "bench")
+
+
+async def run_mode(mode, db, adb, args):
+    latencies = []
+    lags = []
+    stop_at = time.perf_counter() + args.duration
+
+    async def user(user_id):
+        await asyncio.sleep(random.random() * args.interval)
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            if mode == "sync":
+                handler_sync(db, user_id)
+            else:
+                await handler_async(adb, user_id)
+            latencies.append((start, (time.perf_counter() - start) * 1000))
+            await asyncio.sleep(args.interval)
+
+    async def lag_probe():
+        tick = 0.01
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            await asyncio.sleep(tick)
+            lags.append((start, (time.perf_counter() - start - tick) * 1000))
+
+    await asyncio.gather(lag_probe(), *(user(1000 + i) for i in range(args.users)))
+    return latencies, lags
+
+
+def split(samples, windows):
+    """Loči meritve na 'med scrape ciklom' in 'brez cikla'."""
+    during, idle = [], []
+    for ts, value in samples:
+        if any(a <= ts <= b for a, b in windows):
+            during.append(value)
+        else:
+            idle.append(value)
+    return during, idle
+
+
+def pct(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def report(mode, latencies, lags, windows):
+    lat_during, lat_idle = split(latencies, windows)
+    lag_during, lag_idle = split(lags, windows)
+    print(f"\n=== {mode.upper()} ===  ({len(latencies)} handler klicev)")
+    print(f"{'':<24} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for label, values in (
+        ("handler (brez cikla)", lat_idle),
+        ("handler (med ciklom)", lat_during),
+        ("loop lag (brez cikla)", lag_idle),
+        ("loop lag (med ciklom)", lag_during),
+    ):
+        if not values:
+            continue
+        print(f"{label:<24} {statistics.median(values):>7.1f}ms {pct(values, 0.95):>7.1f}ms "
+              f"{pct(values, 0.99):>7.1f}ms {max(values):>7.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Handler latency benchmark (sync vs AsyncDatabase)")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.2, help="premor med klici enega uporabnika (s)")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--lock-hold", type=float, default=0.5, help="koliko časa scraper drži write lock (s)")
+    parser.add_argument("--pause", type=float, default=1.0, help="premor med scrape zapisi (s)")
+    parser.add_argument("--modes", default="sync,async")
+    args = parser.parse_args()
+
+    for mode in args.modes.split(","):
+        db_path = os.path.join(tempfile.mkdtemp(prefix="bench_handlers_"), "bench.db")
+        db = Database(db_path)
+        db.init_db()
+        seed(db, args.users)
+        adb = AsyncDatabase(db)
+
+        stop = threading.Event()
+        windows = []
+        writer = threading.Thread(
+            target=scrape_cycle_writer, args=(db_path, stop, args.lock_hold, args.pause, windows), daemon=True
+        )
+        writer.start()
+        try:
+            latencies, lags = asyncio.run(run_mode(mode, db, adb, args))
+        finally:
+            stop.set()
+            writer.join()
+            adb.shutdown()
+        report(mode, latencies, lags, windows)
+
+
+if __name__ == "__main__":
+    main()
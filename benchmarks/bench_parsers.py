@@ -0,0 +1,417 @@
+"""
+Benchmark: parserji strani z rezultati (avto.net, bolha, nepremicnine) na fiksnem korpusu.
+
+Korpus je v gitu (benchmarks/corpus/):
+    <vir>/<ime>.html            shranjene strani (enaka struktura kot fixture_server
+                                --recordings in `http_archive.py export`)
+    expected/<vir>/<ime>.json   referenčni izhod parserjev (`golden`)
+    MANIFEST.json               verzija korpusa, sha256 in izvor vsake strani
+
+Za vsak parser poroča vrstice/s, latenco na vrstico (p50/p95/p99) in alokacije
+(tracemalloc: vrh med klicem na vrstico), nato izhod primerja z referenco.
+Hitrejši parser je varen za zamenjavo samo, če je diff prazen (izhodna koda 1 sicer).
+
+Parserji:
+    avtonet.rows          BeautifulSoup + find_all GO-Results-Row (na stran)
+    avtonet.is_top        Scraper._is_top_ponudba (na vrstico)
+    avtonet.clean_for_ai  Scraper._clean_row_for_ai
+    avtonet.manual_parse  Scraper._manual_parse_row
+    avtonet.extrahiraj    utils.extrahiraj_podatke
+    bolha.extract         BolhaScraper.extract_all_ads (na stran)
+    nepremicnine.extract  nepremicnine.Scraper.extract_all_ads (na stran)
+    nepremicnine.describe nepremicnine.Scraper._parse_description (na opis)
+
+Uporaba:
+    python benchmarks/bench_parsers.py build --force              # sintetični korpus (page_factory)
+    python benchmarks/bench_parsers.py build --force --from fixtures/   # + posnete strani (http_archive export)
+    python benchmarks/bench_parsers.py golden                     # zapiše expected/ s trenutnimi parserji
+    python benchmarks/bench_parsers.py run --repeat 20 --out parsers.json
+    python benchmarks/bench_parsers.py run --parsers avtonet --compare parsers.json
+"""
+import argparse
+import gc
+import hashlib
+import json
+import os
+import re
+import shutil
+import statistics
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+CORPUS_VERSION = 1
+EPOCH = 1767225600  # 1.1.2026 - fiksni časi objave v sintetičnih straneh
+SOURCES = ("avtonet", "bolha", "nepremicnine")
+
+
+def pct(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+# --- korpus ---
+
+def corpus_pages(corpus=CORPUS):
+    """[(vir, ime, pot)] v stabilnem vrstnem redu."""
+    pages = []
+    for source in SOURCES:
+        directory = os.path.join(corpus, source)
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".html"):
+                pages.append((source, name[:-5], os.path.join(directory, name)))
+    return pages
+
+
+def sha256(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def load_manifest(corpus=CORPUS):
+    path = os.path.join(corpus, "MANIFEST.json")
+    if not os.path.exists(path):
+        return {"version": CORPUS_VERSION, "pages": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_manifest(manifest, corpus=CORPUS):
+    with open(os.path.join(corpus, "MANIFEST.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def build_corpus(args):
+    from page_factory import PAGE_SIZE, Inventory, render_page
+
+    manifest = load_manifest(args.corpus)
+    if manifest["pages"] and not args.force:
+        print(f"Korpus {args.corpus} že obstaja - spremembe strani razveljavijo referenco (--force, nato golden)")
+        return
+    for source in SOURCES:
+        os.makedirs(os.path.join(args.corpus, source), exist_ok=True)
+        inventory = Inventory(source, initial=PAGE_SIZE[source] * args.pages, top=3, seed=args.seed, epoch=EPOCH)
+        for page in range(1, args.pages + 1):
+            path = os.path.join(args.corpus, source, f"{page}.html")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(render_page(source, inventory.page(page, PAGE_SIZE[source]), inventory.top_ads(), page))
+            manifest["pages"][f"{source}/{page}"] = {"origin": f"page_factory seed={args.seed}", "sha256": sha256(path)}
+
+    # Posnete strani: <dir>/<vir>/<stran>.html -> corpus/<vir>/rec_<stran>.html
+    if args.source_dir:
+        for source in SOURCES:
+            directory = os.path.join(args.source_dir, source)
+            if not os.path.isdir(directory):
+                continue
+            for name in sorted(os.listdir(directory)):
+                if not name.endswith(".html"):
+                    continue
+                target = os.path.join(args.corpus, source, f"rec_{name}")
+                shutil.copyfile(os.path.join(directory, name), target)
+                manifest["pages"][f"{source}/rec_{name[:-5]}"] = {"origin": f"recorded {args.source_dir}",
+                                                                  "sha256": sha256(target)}
+
+    manifest["version"] = CORPUS_VERSION
+    write_manifest(manifest, args.corpus)
+    print(f"Korpus v{CORPUS_VERSION}: {len(manifest['pages'])} strani v {args.corpus}")
+
+
+def check_manifest(corpus):
+    """Opozorila za strani, ki niso v MANIFEST ali so se spremenile (referenca ni več veljavna)."""
+    manifest = load_manifest(corpus)
+    warnings = []
+    for source, name, path in corpus_pages(corpus):
+        entry = manifest["pages"].get(f"{source}/{name}")
+        if entry is None:
+            warnings.append(f"{source}/{name}: ni v MANIFEST.json")
+        elif entry["sha256"] != sha256(path):
+            warnings.append(f"{source}/{name}: vsebina se razlikuje od MANIFEST.json (poženi golden)")
+    return manifest.get("version"), warnings
+
+
+# --- parserji ---
+
+def load_parsers():
+    """
+    {ime: (vir, prepare(html) -> [vhodi], fn(vhod) -> izhod, vrstic(izhod))}.
+    prepare ni merjen (npr. razčlenitev strani za parserje po vrsticah).
+    """
+    from bs4 import BeautifulSoup
+
+    import utils
+    from scraper.avtonet.scraper import Scraper as AvtonetScraper
+    from scraper.bolha.scraper import Scraper as BolhaScraper
+    from scraper.nepremicnine.scraper import Scraper as NepremicnineScraper
+
+    # Parserji ne uporabljajo baze ali AI - brez __init__ (ta ustvari AIHandler)
+    avtonet = AvtonetScraper.__new__(AvtonetScraper)
+    bolha = BolhaScraper.__new__(BolhaScraper)
+    nepremicnine = NepremicnineScraper(None)
+
+    def avtonet_rows(html):
+        return BeautifulSoup(html, "html.parser").find_all("div", class_="GO-Results-Row")
+
+    def avtonet_manual_inputs(html):
+        inputs = []
+        for row in avtonet_rows(html):
+            link_tag = row.find("a", class_="stretched-link")
+            match = re.search(r"id=(\d+)", link_tag.get("href", "")) if link_tag else None
+            if not match:
+                continue
+            img_tag = row.find("img")
+            img_url = img_tag.get("data-src") or img_tag.get("src") if img_tag else None
+            inputs.append((row, f"an_{match.group(1)}", "https://www.avto.net" + link_tag["href"].replace("..", ""),
+                           img_url))
+        return inputs
+
+    def descriptions(html):
+        soup = BeautifulSoup(html, "html.parser")
+        return [tag.get_text(strip=True) for tag in soup.find_all("p", class_="font-roboto")]
+
+    page = (lambda html: [html])
+    return {
+        "avtonet.rows": ("avtonet", page, avtonet_rows, len),
+        "avtonet.is_top": ("avtonet", avtonet_rows, avtonet._is_top_ponudba, None),
+        "avtonet.clean_for_ai": ("avtonet", avtonet_rows, avtonet._clean_row_for_ai, None),
+        "avtonet.manual_parse": ("avtonet", avtonet_manual_inputs, lambda args: avtonet._manual_parse_row(*args), None),
+        "avtonet.extrahiraj": ("avtonet", avtonet_rows, utils.extrahiraj_podatke, None),
+        "bolha.extract": ("bolha", page, bolha.extract_all_ads, len),
+        "nepremicnine.extract": ("nepremicnine", page, nepremicnine.extract_all_ads, len),
+        "nepremicnine.describe": ("nepremicnine", descriptions, nepremicnine._parse_description, None),
+    }
+
+
+def serializable(value):
+    """Izhod parserja v JSON obliki (primerjava z referenco)."""
+    if isinstance(value, list):
+        if value and hasattr(value[0], "name") and hasattr(value[0], "attrs"):
+            # avtonet.rows: bs4 vrstice -> ID oglasa in število znakov besedila
+            return [[(re.findall(r"id=(\d+)", str(row)) or [None])[0], len(row.get_text())] for row in value]
+        return [serializable(item) for item in value]
+    if isinstance(value, dict):
+        return {key: serializable(item) for key, item in value.items()}
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+def run_parser(name, parser, pages, repeat):
+    source, prepare, fn, count = parser
+    latencies, allocations, outputs = [], [], {}
+    rows_total, seconds_total = 0, 0.0
+
+    for page_source, page_name, path in pages:
+        if page_source != source:
+            continue
+        with open(path, encoding="utf-8") as f:
+            inputs = prepare(f.read())
+        results = []
+
+        # Alokacije: ločen prehod, tracemalloc bi popačil čase
+        tracemalloc.start()
+        for item in inputs:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            result = fn(item)
+            peak = tracemalloc.get_traced_memory()[1] - before
+            rows = count(result) if count else 1
+            allocations.append(peak / max(rows, 1))
+            results.append(result)
+        tracemalloc.stop()
+
+        gc.disable()
+        try:
+            for _ in range(repeat):
+                for item in inputs:
+                    start = time.perf_counter()
+                    result = fn(item)
+                    elapsed = time.perf_counter() - start
+                    rows = count(result) if count else 1
+                    latencies.append(elapsed / max(rows, 1) * 1e6)
+                    rows_total += rows
+                    seconds_total += elapsed
+        finally:
+            gc.enable()
+
+        outputs[page_name] = serializable(results[0] if count else results)
+
+    return {
+        "source": source,
+        "rows": rows_total // max(repeat, 1),
+        "rows_per_s": round(rows_total / seconds_total, 1) if seconds_total else None,
+        "us_per_row": {
+            "p50": round(statistics.median(latencies), 2) if latencies else None,
+            "p95": round(pct(latencies, 0.95), 2) if latencies else None,
+            "p99": round(pct(latencies, 0.99), 2) if latencies else None,
+        },
+        "alloc_kb_per_row": round(statistics.mean(allocations) / 1024, 2) if allocations else None,
+    }, outputs
+
+
+# --- referenca in diff ---
+
+def expected_path(corpus, source, page_name):
+    return os.path.join(corpus, "expected", source, f"{page_name}.json")
+
+
+def write_golden(corpus, source, page_name, name, output):
+    path = expected_path(corpus, source, page_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    golden = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            golden = json.load(f)
+    golden[name] = output
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(golden, f, indent=1, ensure_ascii=False, sort_keys=True)
+        f.write("\n")
+
+
+def diff_outputs(expected, actual, path="", limit=5):
+    """Seznam razlik (pot, pričakovano, dobljeno), največ `limit`."""
+    differences = []
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        for key in sorted(set(expected) | set(actual)):
+            differences += diff_outputs(expected.get(key), actual.get(key), f"{path}.{key}", limit - len(differences))
+            if len(differences) >= limit:
+                break
+    elif isinstance(expected, list) and isinstance(actual, list):
+        if len(expected) != len(actual):
+            differences.append((f"{path}.len", len(expected), len(actual)))
+        for i, (left, right) in enumerate(zip(expected, actual)):
+            if len(differences) >= limit:
+                break
+            differences += diff_outputs(left, right, f"{path}[{i}]", limit - len(differences))
+    elif expected != actual:
+        differences.append((path or ".", expected, actual))
+    return differences[:max(limit, 0)]
+
+
+def check_outputs(corpus, name, source, outputs):
+    """(status, razlike): ok / diff / missing."""
+    differences, missing = [], 0
+    for page_name, output in outputs.items():
+        path = expected_path(corpus, source, page_name)
+        if not os.path.exists(path):
+            missing += 1
+            continue
+        with open(path, encoding="utf-8") as f:
+            golden = json.load(f)
+        if name not in golden:
+            missing += 1
+            continue
+        differences += [(page_name,) + d for d in diff_outputs(golden[name], output)]
+    if differences:
+        return "diff", differences
+    return ("missing" if missing else "ok"), []
+
+
+# --- ukazi ---
+
+def selected(args):
+    parsers = load_parsers()
+    if args.parsers:
+        wanted = args.parsers.split(",")
+        parsers = {name: p for name, p in parsers.items() if any(name.startswith(w) for w in wanted)}
+    return parsers
+
+
+def golden(args):
+    pages = corpus_pages(args.corpus)
+    for name, parser in selected(args).items():
+        _, outputs = run_parser(name, parser, pages, repeat=0)
+        for page_name, output in outputs.items():
+            write_golden(args.corpus, parser[0], page_name, name, output)
+        print(f"{name:<24} referenca za {len(outputs)} strani")
+
+
+def run(args):
+    version, warnings = check_manifest(args.corpus)
+    for warning in warnings:
+        print(f"⚠️ {warning}")
+    pages = corpus_pages(args.corpus)
+    if not pages:
+        print(f"Korpus {args.corpus} je prazen - najprej `bench_parsers.py build`")
+        return 1
+
+    print(f"\n=== PARSERJI ===  korpus v{version}, {len(pages)} strani, {args.repeat} ponovitev")
+    print(f"{'parser':<24}{'vrstic':>7}{'vrstic/s':>11}{'p50 µs':>9}{'p95 µs':>9}{'p99 µs':>9}{'KB/vrst':>9}  referenca")
+    results, failed = {}, False
+    for name, parser in selected(args).items():
+        result, outputs = run_parser(name, parser, pages, args.repeat)
+        status, differences = check_outputs(args.corpus, name, parser[0], outputs)
+        result["correctness"] = status
+        result["differences"] = [list(map(str, d)) for d in differences]
+        results[name] = result
+        failed = failed or status == "diff"
+        latency = result["us_per_row"]
+        print(f"{name:<24}{result['rows']:>7}{result['rows_per_s'] or 0:>11.0f}{latency['p50'] or 0:>9.1f}"
+              f"{latency['p95'] or 0:>9.1f}{latency['p99'] or 0:>9.1f}{result['alloc_kb_per_row'] or 0:>9.1f}  {status}")
+        for page_name, where, expected, actual in differences:
+            print(f"    {page_name}{where}: {expected!r} -> {actual!r}")
+
+    output = {
+        "benchmark": "parsers",
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "corpus_version": version,
+        "repeat": args.repeat,
+        "parsers": results,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2, ensure_ascii=False)
+        print(f"\nRezultat: {args.out}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["parsers"]
+        print(f"\n=== PRIMERJAVA ===  vrstice/s ({args.compare} -> zdaj)")
+        for name, result in results.items():
+            before = (baseline.get(name) or {}).get("rows_per_s")
+            after = result["rows_per_s"]
+            change = f"{(after - before) / before * 100:+.0f}%" if before and after else "-"
+            print(f"{name:<24}{before or 0:>11.0f} -> {after or 0:>11.0f}  {change:>6}")
+    if failed:
+        print("\n❌ Izhod se razlikuje od reference - parser ni zamenljiv (ali poženi golden, če je sprememba namerna)")
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parserjev na korpusu shranjenih strani")
+    parser.add_argument("--corpus", default=CORPUS)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("build", help="sintetični korpus iz page_factory (+ posnete strani)")
+    p.add_argument("--pages", type=int, default=3, help="strani na vir")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--from", dest="source_dir", help="mapa <vir>/<stran>.html (http_archive export)")
+    p.add_argument("--force", action="store_true", help="prepiši obstoječi korpus")
+
+    for name in ("golden", "run"):
+        p = sub.add_parser(name)
+        p.add_argument("--parsers", help="predpone, ločene z vejico (npr. avtonet,bolha.extract)")
+    p = sub.choices["run"]
+    p.add_argument("--repeat", type=int, default=10)
+    p.add_argument("--out", help="JSON z rezultati")
+    p.add_argument("--compare", help="JSON prejšnjega zagona")
+
+    args = parser.parse_args()
+    if args.command == "build":
+        build_corpus(args)
+    elif args.command == "golden":
+        golden(args)
+    else:
+        sys.exit(run(args))
+
+
+if __name__ == "__main__":
+    main()
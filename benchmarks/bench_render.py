@@ -0,0 +1,86 @@
+"""
+Benchmark: oblikovanje obvestil (DataManager.render_offer) z in brez render cache-a.
+
+Simulira razpošiljanje cikla: N novih oglasov, vsak gre `--fanout` uporabnikom
+(prekrivajoča se iskanja). Brez cache-a se za vsak par (oglas, uporabnik)
+znova razčleni snippet_data in sestavi HTML; s cache-om samo enkrat na oglas.
+
+Uporaba:
+    python benchmarks/bench_render.py
+    python benchmarks/bench_render.py --ads 2000 --fanout 20
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_manager
+from data_manager import DataManager
+
+
+def generate_ads(n, seed=42):
+    rnd = random.Random(seed)
+    ads = []
+    for i in range(n):
+        source = rnd.choice(["avtonet", "avtonet", "bolha", "nepremicnine"])
+        snippet = {
+            "leto_1_reg": str(rnd.randint(2005, 2024)),
+            "prevozenih": f"{rnd.randint(5, 300)}.000 km",
+            "gorivo": rnd.choice(["diesel motor", "bencinski motor", "hibridni pogon"]),
+            "menjalnik": rnd.choice(["ročni menjalnik", "avtomatski menjalnik"]),
+            "motor": f"{rnd.randint(999, 2999)} ccm, {rnd.randint(50, 200)} kW",
+            "lokacija": rnd.choice(["Ljubljana", "Maribor", "Celje & okolica", "Šiška <center>"]),
+            "published_date": f"2026-0{rnd.randint(1, 9)}-1{rnd.randint(0, 9)}T10:00:00Z",
+            "source": source,
+        }
+        if source == "bolha":
+            snippet["image_url"] = f"https://img.example.invalid/{i}.jpg"
+        ads.append({
+            "content_id": f"{'bo' if source == 'bolha' else 'an'}_{i}",
+            "ime_avta": f"Škoda Octavia Combi 2.0 TDI <{i}>",
+            "cena": f"{rnd.randint(1, 60)}.{rnd.randint(100, 999)}",
+            "link": f"https://www.avto.net/Ads/details.asp?id={i}",
+            "slika_url": None if source == "bolha" else f"https://images.avto.net/{i}.jpg",
+            "snippet_data": json.dumps(snippet, ensure_ascii=False),
+        })
+    return ads
+
+
+def run(manager, ads, fanout, cached):
+    data_manager._RENDER_CACHE.clear()
+    if not cached:
+        data_manager.RENDER_CACHE_SIZE = 0
+    start = time.perf_counter()
+    for oglas in ads:
+        for user in range(fanout):
+            # Kot v check_new_offers: vsak par je svoj dict
+            manager.render_offer(dict(oglas, target_user_id=user))
+    elapsed = time.perf_counter() - start
+    data_manager.RENDER_CACHE_SIZE = 2000
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render throughput benchmark")
+    parser.add_argument("--ads", type=int, default=1000)
+    parser.add_argument("--fanout", type=int, default=10, help="uporabnikov na oglas")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    manager = DataManager(None)
+    ads = generate_ads(args.ads)
+    messages = args.ads * args.fanout
+
+    print(f"{args.ads} oglasov x {args.fanout} uporabnikov = {messages:,} sporočil\n")
+    print(f"{'način':<14} {'čas':>9} {'sporočil/s':>12} {'µs/sporočilo':>14}")
+    for label, cached in (("brez cache", False), ("render cache", True)):
+        best = min(run(manager, ads, args.fanout, cached) for _ in range(args.repeats))
+        print(f"{label:<14} {best * 1000:>7.1f}ms {messages / best:>12,.0f} {best / messages * 1e6:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
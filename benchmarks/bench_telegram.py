@@ -0,0 +1,343 @@
+"""
+Benchmark: pošiljanje in odzivnost bota proti lokalnemu Telegram API (fake_telegram.py).
+
+Scenariji (pravi python-telegram-bot Application, base_url -> FakeTelegram):
+
+- delivery: N obvestil v Outbox začasne baze, DeliveryWorker jih pošlje
+  (rate_limiter, PhotoCache, retry/backoff). Poroča propustnost, latenco
+  API klicev, 429 odgovore in ponovno uporabo file_id.
+- commands: U uporabnikov pošilja ukaze (/ping), handler simulira delo
+  (--handler-delay) in odgovori. Meri čas od posodobitve do odgovora
+  (p50/p95/p99) za polling (zaporedna obdelava, kot doslej), polling-concurrent
+  (polling z enakim --concurrent kot webhook) in webhook
+  (webhook.TelegramWebhookApp + uvicorn). Razlika polling -> polling-concurrent
+  je učinek CONCURRENT_UPDATES, polling-concurrent -> webhook pa samega
+  webhook načina.
+- broadcast: /broadcast job za U uporabnikov; DeliveryWorker se prekine sredi
+  batcha (kot crash/SIGTERM), sledi "restart" (reset_outbox_inflight) in
+  dokončanje. Preveri, da nihče, čigar vrstica je bila že 'sent', sporočila
+  ne dobi še enkrat, in da ga dobijo vsi.
+
+Uporaba:
+    python benchmarks/bench_telegram.py delivery --messages 2000 --chats 300 --latency 0.05
+    python benchmarks/bench_telegram.py delivery --rate-429 0.02 --enforce-limits
+    python benchmarks/bench_telegram.py commands --users 50 --commands 10 --handler-delay 0.2
+    python benchmarks/bench_telegram.py broadcast --users 600 --interrupt-after 150
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import socket
+import statistics
+import sys
+import tempfile
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import telegram.ext
+
+from fake_telegram import FakeTelegram
+
+TOKEN = "123456:FAKE-BENCH-TOKEN"
+
+
+def pct(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def print_percentiles(label, values, unit="ms"):
+    if not values:
+        print(f"{label:<28} (ni meritev)")
+        return
+    print(f"{label:<28} n={len(values):<6} p50={statistics.median(values):>8.1f}{unit} "
+          f"p95={pct(values, 0.95):>8.1f}{unit} p99={pct(values, 0.99):>8.1f}{unit} max={max(values):>8.1f}{unit}")
+
+
+def build_application(fake, concurrent_updates=None, pool_size=64):
+    builder = (
+        telegram.ext.Application.builder()
+        .token(TOKEN)
+        .base_url(fake.base_url)
+        .base_file_url(fake.base_file_url)
+        .connection_pool_size(pool_size)
+    )
+    if concurrent_updates:
+        builder = builder.concurrent_updates(concurrent_updates)
+    return builder.build()
+
+
+# --- delivery ---
+
+async def bench_delivery(args):
+    from database import Database
+    from delivery import DeliveryWorker
+    from rate_limiter import TelegramRateLimiter
+
+    fake = await FakeTelegram(
+        latency=args.latency, jitter=args.jitter, rate_429=args.rate_429,
+        enforce_limits=args.enforce_limits, seed=1,
+    ).start()
+    db = Database(os.path.join(tempfile.mkdtemp(prefix="bench_tg_"), "bench.db"))
+    db.init_db()
+
+    # Oglasi s slikami (tako kot večina obvestil); isti oglas gre več uporabnikom
+    rng = random.Random(1)
+    ads = max(1, args.messages // max(1, args.fanout))
+    rows, seen = [], set()
+    while len(rows) < args.messages:
+        ad, chat = rng.randrange(ads), 1000 + rng.randrange(args.chats)
+        if (chat, ad) in seen:
+            continue
+        seen.add((chat, ad))
+        rows.append({
+            'telegram_id': chat, 'content_id': f"bench_{ad}",
+            'text': f"<b>Oglas {ad}</b>", 'photo_url': f"https://img.example/{ad}.jpg",
+        })
+    db.enqueue_notifications(rows)
+
+    application = build_application(fake)
+    async with application:
+        worker = DeliveryWorker(db, limiter=TelegramRateLimiter(), base_delay=0.5, max_delay=5)
+        context = types.SimpleNamespace(bot=application.bot)
+        fake.calls.clear()
+        start = time.perf_counter()
+        while True:
+            await worker.drain(context)
+            stats = db.get_outbox_stats()
+            if not stats.get('pending') and not stats.get('sending'):
+                break
+            await asyncio.sleep(0.2)
+        elapsed = time.perf_counter() - start
+
+    await fake.stop()
+    stats = db.get_outbox_stats()
+    sends = [c for c in fake.calls if c["method"].startswith("send")]
+    print(f"\n=== DELIVERY ===  {args.messages} obvestil, {args.chats} chatov, {ads} oglasov")
+    print(f"Čas: {elapsed:.1f}s | propustnost: {stats.get('sent', 0) / elapsed:.1f} obvestil/s "
+          f"| poslano {stats.get('sent', 0)}, neuspelo {stats.get('failed', 0)}")
+    print(f"API klici: {len(sends)} | 429: {sum(1 for c in sends if c['status'] == 429)} "
+          f"| limiter čakanje: {worker.limiter.stats['waited_s']:.1f}s")
+    print(f"Slike: {worker.photos.stats}")
+    print_percentiles("API latenca (send*)", [c["ms"] for c in sends if c["status"] == 200])
+
+
+# --- broadcast (prekinitev + nadaljevanje) ---
+
+def broadcast_status(db, job_id):
+    conn = db.get_connection()
+    try:
+        return dict(conn.execute(
+            "SELECT telegram_id, status FROM Outbox WHERE content_id = ?", (f"broadcast:{job_id}",)
+        ).fetchall())
+    finally:
+        conn.close()
+
+
+async def bench_broadcast(args):
+    from broadcast import BroadcastManager
+    from database import Database
+    from delivery import DeliveryWorker
+    from rate_limiter import TelegramRateLimiter
+
+    fake = await FakeTelegram(latency=args.latency, jitter=args.jitter, seed=1).start()
+    db = Database(os.path.join(tempfile.mkdtemp(prefix="bench_tg_"), "bench.db"))
+    db.init_db()
+    users = [3000 + i for i in range(args.users)]
+    for telegram_id in users:
+        db.register_user(telegram_id, "Bench", None)
+
+    manager = BroadcastManager(db)
+    job_id = manager.create("📢 <b>OBVESTILO ADMINA</b>\n\nbench broadcast", body="bench broadcast")
+    await asyncio.to_thread(manager.advance)
+
+    delivered = []
+    interrupted = asyncio.Event()
+
+    def on_call(call):
+        if call["method"] == "sendMessage" and call["status"] == 200:
+            delivered.append(call["chat_id"])
+            if len(delivered) >= args.interrupt_after:
+                interrupted.set()
+
+    fake.on_call = on_call
+    application = build_application(fake)
+    start = time.perf_counter()
+    async with application:
+        context = types.SimpleNamespace(bot=application.bot)
+        worker = DeliveryWorker(db, limiter=TelegramRateLimiter(), base_delay=0.5, max_delay=5)
+        task = asyncio.create_task(worker.drain(context))
+        await interrupted.wait()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        # Preklican to_thread(mark_outbox_sent) se v threadu še dokonča
+        await asyncio.sleep(0.5)
+        before = broadcast_status(db, job_id)
+        persisted = {chat for chat, status in before.items() if status == 'sent'}
+        claimed = sum(1 for status in before.values() if status == 'sending')
+        first_run = len(delivered)
+        concurrency = worker.concurrency
+
+        # "Restart": nov worker, nedokončana obvestila nazaj v vrsto
+        requeued = db.reset_outbox_inflight()
+        worker = DeliveryWorker(db, limiter=TelegramRateLimiter(), base_delay=0.5, max_delay=5)
+        while True:
+            await worker.drain(context)
+            stats = db.get_outbox_stats()
+            if not stats.get('pending') and not stats.get('sending'):
+                break
+            await asyncio.sleep(0.2)
+        await asyncio.to_thread(manager.advance)
+    elapsed = time.perf_counter() - start
+    await fake.stop()
+
+    resent = [chat for chat in delivered[first_run:] if chat in persisted]
+    duplicates = len(delivered) - len(set(delivered))
+    missing = set(users) - set(delivered)
+    job = db.get_broadcast_jobs(limit=1)[0]
+    print(f"\n=== BROADCAST ===  {args.users} uporabnikov, prekinitev po {first_run} poslanih ({elapsed:.1f}s)")
+    print(f"Ob prekinitvi: sent {len(persisted)}, sending {claimed} -> restart vrnil v vrsto {requeued}")
+    print(f"Poslano skupaj: {len(delivered)} | podvojenih: {duplicates} | ponovno poslanih že 'sent': {len(resent)} "
+          f"| manjka: {len(missing)} | job: {job['status']} ({job['sent']}/{job['total']})")
+    assert not resent, f"ponovno poslano {len(resent)} že dostavljenim"
+    assert not missing, f"{len(missing)} uporabnikov ni dobilo sporočila"
+    # Podvojiti se smejo samo klici, ki so bili ob prekinitvi v teku (odgovor API-ja še ni prišel) -
+    # največ en na chat skupino, torej največ OUTBOX_CONCURRENCY
+    assert duplicates <= concurrency, f"{duplicates} podvojenih > {concurrency} klicev v teku ob prekinitvi"
+
+
+# --- commands ---
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def run_commands(mode, args):
+    fake = await FakeTelegram(latency=args.latency, jitter=args.jitter, seed=1).start()
+    if mode not in ("polling", "polling-concurrent", "webhook"):
+        raise ValueError(f"neznan način: {mode}")
+    concurrent = None if mode == "polling" else args.concurrent
+    application = build_application(fake, concurrent_updates=concurrent)
+
+    async def ping(update, context):
+        if args.handler_delay:
+            await asyncio.sleep(args.handler_delay * random.uniform(0.5, 1.5))
+        await update.message.reply_text(update.message.text)
+
+    application.add_handler(telegram.ext.CommandHandler("ping", ping))
+
+    sent_at, latencies = {}, []
+    done = asyncio.Event()
+    expected = args.users * args.commands
+
+    def on_call(call):
+        if call["method"] == "sendMessage" and call.get("text"):
+            match = re.search(r"#(\d+)", call["text"])
+            if match and int(match.group(1)) in sent_at:
+                latencies.append((time.perf_counter() - sent_at.pop(int(match.group(1)))) * 1000)
+                if len(latencies) >= expected:
+                    done.set()
+
+    fake.on_call = on_call
+    server = server_task = None
+    async with application:
+        if mode == "webhook":
+            import uvicorn
+            from webhook import TelegramWebhookApp
+            port = free_port()
+            app = TelegramWebhookApp(application, path="/tg", secret="bench")
+            server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning",
+                                                   access_log=False, lifespan="off"))
+            server_task = asyncio.create_task(server.serve())
+            while not server.started:
+                await asyncio.sleep(0.05)
+            await application.bot.set_webhook(url=f"http://127.0.0.1:{port}/tg", secret_token="bench")
+        else:
+            await application.updater.start_polling(poll_interval=0.0, timeout=10)
+        await application.start()
+
+        counter = iter(range(1, expected + 1))
+
+        async def user(chat_id):
+            await asyncio.sleep(random.random() * args.interval)
+            for _ in range(args.commands):
+                n = next(counter)
+                sent_at[n] = time.perf_counter()
+                fake.push_update(fake.make_message_update(chat_id, f"/ping #{n}"))
+                await asyncio.sleep(args.interval)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(user(2000 + i) for i in range(args.users)))
+        try:
+            await asyncio.wait_for(done.wait(), timeout=args.timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️ {mode}: {len(sent_at)} ukazov brez odgovora po {args.timeout}s")
+        elapsed = time.perf_counter() - start
+
+        await application.stop()
+        if mode == "webhook":
+            server.should_exit = True
+            await server_task
+        else:
+            await application.updater.stop()
+
+    await fake.stop()
+    print(f"\n=== COMMANDS: {mode.upper()} ===  ({args.users} uporabnikov x {args.commands} ukazov, "
+          f"concurrent_updates={concurrent or 'off'})")
+    print(f"Čas: {elapsed:.1f}s | {len(latencies) / elapsed:.1f} odgovorov/s")
+    print_percentiles("ukaz -> odgovor", latencies)
+
+
+async def bench_commands(args):
+    for mode in args.modes.split(","):
+        await run_commands(mode, args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Telegram benchmark proti lokalnemu fake API")
+    sub = parser.add_subparsers(dest="scenario", required=True)
+
+    for name in ("delivery", "commands", "broadcast"):
+        p = sub.add_parser(name)
+        p.add_argument("--latency", type=float, default=0.05, help="RTT do API (s)")
+        p.add_argument("--jitter", type=float, default=0.02)
+
+    p = sub.choices["delivery"]
+    p.add_argument("--messages", type=int, default=1000)
+    p.add_argument("--chats", type=int, default=200)
+    p.add_argument("--fanout", type=int, default=5, help="povprečno prejemnikov na oglas")
+    p.add_argument("--rate-429", type=float, default=0.0)
+    p.add_argument("--enforce-limits", action="store_true")
+
+    p = sub.choices["commands"]
+    p.add_argument("--modes", default="polling,polling-concurrent,webhook")
+    p.add_argument("--users", type=int, default=30)
+    p.add_argument("--commands", type=int, default=10)
+    p.add_argument("--interval", type=float, default=0.5, help="premor med ukazi enega uporabnika (s)")
+    p.add_argument("--handler-delay", type=float, default=0.1, help="simulirano delo handlerja (s)")
+    p.add_argument("--concurrent", type=int, default=32, help="CONCURRENT_UPDATES za polling-concurrent in webhook")
+    p.add_argument("--timeout", type=float, default=60)
+
+    p = sub.choices["broadcast"]
+    p.add_argument("--users", type=int, default=600)
+    p.add_argument("--interrupt-after", type=int, default=150, help="prekini po toliko dostavljenih")
+
+    args = parser.parse_args()
+    scenarios = {"delivery": bench_delivery, "commands": bench_commands, "broadcast": bench_broadcast}
+    asyncio.run(scenarios[args.scenario](args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,435 @@
+"""
+Lokalni nadomestek Telegram Bot API za obremenitvene in latenčne teste.
+
+Implementira podmnožico API-ja, ki jo bot uporablja (getMe, sendMessage,
+sendPhoto, sendMediaGroup, editMessageText, setMyCommands, getUpdates,
+setWebhook/deleteWebhook ...), brez zunanjih odvisnosti (asyncio + HTTP/1.1
+keep-alive), zato ga lahko python-telegram-bot uporablja kot pravi API:
+
+    fake = FakeTelegram(latency=0.05, rate_429=0.01)
+    await fake.start()
+    app = Application.builder().token("123:FAKE").base_url(fake.base_url) \\
+        .base_file_url(fake.base_file_url).build()
+
+ali v config.py (cel bot proti lokalnemu strežniku):
+    TELEGRAM_API_BASE_URL = "http://127.0.0.1:8081/bot"
+
+Možnosti:
+- latency/jitter (in latenca po metodi) - simulira RTT do Telegrama,
+- rate_429 - verjetnost odgovora 429 z `retry_after`,
+- enforce_limits - 429 ob prekoračitvi Telegram omejitev (30/s globalno,
+  >3/s v isti chat, 20/min v skupino) - preverja rate_limiter,
+- blocked_chats - 403 "bot was blocked by the user",
+- push_update() - posodobitev za getUpdates (long polling) ali POST na
+  registriran webhook (X-Telegram-Bot-Api-Secret-Token),
+- calls - posnetek vseh klicev (metoda, chat, status, čas); record=pot
+  ga ob stop() zapiše kot JSONL.
+
+Samostojno:
+    python benchmarks/fake_telegram.py --port 8081 --latency 0.05 --rate-429 0.01
+"""
+import argparse
+import asyncio
+import collections
+import email.parser
+import hashlib
+import itertools
+import json
+import random
+import re
+import time
+import urllib.parse
+
+_JSON_LIKE = re.compile(r"^(-?\d+(\.\d+)?|true|false|null|[\[{].*)$", re.S)
+
+FAKE_BOT = {
+    "id": 100000001, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot",
+    "can_join_groups": True, "can_read_all_group_messages": False, "supports_inline_queries": False,
+}
+
+
+def _decode(value):
+    """PTB pošilja ne-string parametre kot JSON ("123", '{"..."}'), besedilo pa surovo."""
+    if isinstance(value, str) and _JSON_LIKE.match(value):
+        try:
+            return json.loads(value)
+        except ValueError:
+            pass
+    return value
+
+
+def _parse_params(content_type, body, query):
+    params = {k: v[-1] for k, v in urllib.parse.parse_qs(query).items()}
+    if not body:
+        return {k: _decode(v) for k, v in params.items()}
+    if content_type.startswith("application/json"):
+        params.update(json.loads(body))
+        return params
+    if content_type.startswith("multipart/form-data"):
+        message = email.parser.BytesParser().parsebytes(
+            b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body
+        )
+        for part in message.get_payload():
+            name = part.get_param("name", header="content-disposition")
+            payload = part.get_payload(decode=True)
+            if part.get_filename():
+                params[name] = {"upload": hashlib.sha1(payload).hexdigest()}
+            else:
+                params[name] = _decode(payload.decode())
+        return params
+    params.update({k: _decode(v[-1]) for k, v in urllib.parse.parse_qs(body.decode()).items()})
+    return params
+
+
+def _is_group(chat_id):
+    return isinstance(chat_id, int) and chat_id < 0
+
+
+class ApiError(Exception):
+    def __init__(self, code, description, parameters=None):
+        super().__init__(description)
+        self.code = code
+        self.description = description
+        self.parameters = parameters
+
+
+class FakeTelegram:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, method_latency=None,
+                 rate_429=0.0, retry_after=1, enforce_limits=False, blocked_chats=(), record=None, seed=None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.method_latency = dict(method_latency or {})
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.enforce_limits = enforce_limits
+        self.blocked_chats = set(blocked_chats)
+        self.record = record
+        self.random = random.Random(seed)
+
+        self.calls = []
+        self.on_call = None              # callback(zapis) po vsakem klicu (harness meri latenco)
+        self.webhook = None              # {'url', 'secret_token', 'max_connections'}
+        self._server = None
+        self._updates = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._new_update = asyncio.Event()
+        self._webhook_tasks = set()
+        self._handlers = set()          # odprte povezave (tudi long-poll getUpdates, ki čaka)
+        self._closing = False
+        self._webhook_slots = None
+        self._global_window = collections.deque()
+        self._chat_windows = collections.defaultdict(collections.deque)
+
+    # --- življenjski cikel ---
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self._closing = True
+        for task in list(self._webhook_tasks):
+            task.cancel()
+        if self._server is not None:
+            self._server.close()
+        # Čakajoči getUpdates in keep-alive povezave se končajo tu, ne šele ob zaprtju event loopa
+        handlers = list(self._handlers)
+        for task in handlers:
+            task.cancel()
+        await asyncio.gather(*handlers, *self._webhook_tasks, return_exceptions=True)
+        if self._server is not None:
+            await self._server.wait_closed()
+        if self.record:
+            with open(self.record, "w", encoding="utf-8") as f:
+                for call in self.calls:
+                    f.write(json.dumps(call, ensure_ascii=False) + "\n")
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def base_url(self):
+        return f"{self.url}/bot"
+
+    @property
+    def base_file_url(self):
+        return f"{self.url}/file/bot"
+
+    # --- posodobitve (ukazi uporabnikov) ---
+
+    def make_message_update(self, chat_id, text, first_name="Bench"):
+        update = {
+            "update_id": next(self._update_ids),
+            "message": {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private", "first_name": first_name},
+                "from": {"id": chat_id, "is_bot": False, "first_name": first_name},
+                "text": text,
+            },
+        }
+        if text.startswith("/"):
+            update["message"]["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return update
+
+    def push_update(self, update):
+        """Na webhook (če je registriran) ali v vrsto za getUpdates."""
+        if self.webhook:
+            task = asyncio.get_running_loop().create_task(self._post_webhook(update))
+            self._webhook_tasks.add(task)
+            task.add_done_callback(self._webhook_tasks.discard)
+        else:
+            self._updates.append(update)
+            self._new_update.set()
+
+    async def _post_webhook(self, update):
+        async with self._webhook_slots:
+            url = urllib.parse.urlsplit(self.webhook["url"])
+            body = json.dumps(update).encode()
+            headers = [
+                f"POST {url.path or '/'} HTTP/1.1", f"Host: {url.netloc}",
+                "Content-Type: application/json", f"Content-Length: {len(body)}", "Connection: close",
+            ]
+            if self.webhook.get("secret_token"):
+                headers.append(f"X-Telegram-Bot-Api-Secret-Token: {self.webhook['secret_token']}")
+            try:
+                reader, writer = await asyncio.open_connection(url.hostname, url.port or 80)
+                writer.write(("\r\n".join(headers) + "\r\n\r\n").encode() + body)
+                await writer.drain()
+                status = (await reader.readline()).split()[1:2]
+                writer.close()
+                self._record("webhook", None, int(status[0]) if status else 0, 0.0)
+            except OSError as e:
+                self._record("webhook", None, 0, 0.0, error=str(e))
+
+    # --- HTTP ---
+
+    async def _handle_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            while not self._closing:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                body = await reader.readexactly(length) if length else b""
+
+                status, payload = await self._dispatch(method, target, headers, body)
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError, asyncio.CancelledError):
+            pass
+        finally:
+            self._handlers.discard(task)
+            writer.close()
+
+    async def _dispatch(self, http_method, target, headers, body):
+        split = urllib.parse.urlsplit(target)
+        if split.path == "/_fake/stats":
+            return 200, self.stats()
+        if split.path == "/_fake/update" and http_method == "POST":
+            self.push_update(json.loads(body))
+            return 200, {"ok": True}
+
+        match = re.match(r"^/bot[^/]+/(\w+)$", split.path)
+        if not match:
+            return 404, {"ok": False, "error_code": 404, "description": "Not Found"}
+        api_method = match.group(1)
+        started = time.perf_counter()
+        params = _parse_params(headers.get("content-type", ""), body, split.query)
+        chat_id = params.get("chat_id")
+
+        delay = self.method_latency.get(api_method, self.latency)
+        if api_method != "getUpdates" and (delay or self.jitter):
+            await asyncio.sleep(delay + self.random.uniform(0, self.jitter))
+
+        try:
+            result = await self._call(api_method, params)
+            status, payload = 200, {"ok": True, "result": result}
+        except ApiError as e:
+            status = e.code
+            payload = {"ok": False, "error_code": e.code, "description": e.description}
+            if e.parameters:
+                payload["parameters"] = e.parameters
+        self._record(api_method, chat_id, status, (time.perf_counter() - started) * 1000, params=params)
+        return status, payload
+
+    def _record(self, api_method, chat_id, status, ms, error=None, params=None):
+        call = {"t": time.time(), "method": api_method, "chat_id": chat_id, "status": status, "ms": round(ms, 2)}
+        if params and isinstance(params.get("text"), str):
+            call["text"] = params["text"][:200]
+        if error:
+            call["error"] = error
+        self.calls.append(call)
+        if self.on_call is not None:
+            self.on_call(call)
+
+    # --- Bot API ---
+
+    def _check_send(self, chat_id):
+        if chat_id in self.blocked_chats:
+            raise ApiError(403, "Forbidden: bot was blocked by the user")
+        if self.rate_429 and self.random.random() < self.rate_429:
+            raise ApiError(429, f"Too Many Requests: retry after {self.retry_after}",
+                           {"retry_after": self.retry_after})
+        if self.enforce_limits:
+            now = time.monotonic()
+            window = self._global_window
+            while window and now - window[0] > 1:
+                window.popleft()
+            chat_window = self._chat_windows[chat_id]
+            span, limit = (60, 20) if _is_group(chat_id) else (1, 3)
+            while chat_window and now - chat_window[0] > span:
+                chat_window.popleft()
+            if len(window) >= 30 or len(chat_window) >= limit:
+                raise ApiError(429, f"Too Many Requests: retry after {self.retry_after}",
+                               {"retry_after": self.retry_after})
+            window.append(now)
+            chat_window.append(now)
+
+    def _message(self, chat_id, **fields):
+        chat = {"id": chat_id, "type": "private", "first_name": "Bench"}
+        if _is_group(chat_id):
+            chat = {"id": chat_id, "type": "group", "title": "Bench group"}
+        message = {"message_id": next(self._message_ids), "date": int(time.time()), "chat": chat, "from": FAKE_BOT}
+        message.update({k: v for k, v in fields.items() if v is not None})
+        return message
+
+    @staticmethod
+    def _photo_sizes(photo):
+        if isinstance(photo, dict):
+            key = photo.get("upload", "")
+        elif isinstance(photo, str) and photo.startswith("fake_"):
+            key = photo[5:].split("_")[0]
+        else:
+            key = hashlib.sha1(str(photo).encode()).hexdigest()[:16]
+        return [
+            {"file_id": f"fake_{key}_s", "file_unique_id": f"{key}s", "width": 90, "height": 67, "file_size": 1200},
+            {"file_id": f"fake_{key}", "file_unique_id": key, "width": 800, "height": 600, "file_size": 64000},
+        ]
+
+    async def _call(self, api_method, params):
+        chat_id = params.get("chat_id")
+        if api_method == "getMe":
+            return FAKE_BOT
+        if api_method == "sendMessage":
+            self._check_send(chat_id)
+            return self._message(chat_id, text=params.get("text"))
+        if api_method == "sendPhoto":
+            self._check_send(chat_id)
+            return self._message(chat_id, photo=self._photo_sizes(params.get("photo")), caption=params.get("caption"))
+        if api_method == "sendMediaGroup":
+            self._check_send(chat_id)
+            media = params.get("media") or []
+            return [
+                self._message(chat_id, photo=self._photo_sizes(item.get("media")), caption=item.get("caption"))
+                for item in media
+            ]
+        if api_method == "editMessageText":
+            if params.get("inline_message_id"):
+                return True
+            return dict(self._message(chat_id, text=params.get("text")), message_id=params.get("message_id"))
+        if api_method == "getUpdates":
+            return await self._get_updates(params)
+        if api_method == "setWebhook":
+            self.webhook = {
+                "url": params["url"], "secret_token": params.get("secret_token"),
+                "max_connections": int(params.get("max_connections") or 40),
+            }
+            self._webhook_slots = asyncio.Semaphore(self.webhook["max_connections"])
+            pending, self._updates = self._updates, []
+            for update in pending:
+                self.push_update(update)
+            return True
+        if api_method == "deleteWebhook":
+            self.webhook = None
+            if params.get("drop_pending_updates"):
+                self._updates = []
+            return True
+        if api_method == "getWebhookInfo":
+            return {"url": (self.webhook or {}).get("url", ""), "has_custom_certificate": False,
+                    "pending_update_count": len(self._updates)}
+        if api_method.startswith(("set", "delete", "answer", "sendChatAction")):
+            return True
+        raise ApiError(404, "Not Found: method not found")
+
+    async def _get_updates(self, params):
+        if self.webhook:
+            raise ApiError(409, "Conflict: can't use getUpdates method while webhook is active")
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        deadline = time.monotonic() + float(params.get("timeout") or 0)
+        while True:
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            if self._updates or time.monotonic() >= deadline:
+                return self._updates[:limit]
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                # stop(): long poll se konča s praznim odgovorom, povezava se nato zapre
+                return []
+
+    # --- poročilo ---
+
+    def stats(self):
+        by_method = collections.Counter(c["method"] for c in self.calls)
+        by_status = collections.Counter(c["status"] for c in self.calls)
+        return {"calls": len(self.calls), "methods": dict(by_method), "statuses": dict(by_status)}
+
+
+async def _serve(args):
+    fake = FakeTelegram(
+        host=args.host, port=args.port, latency=args.latency, jitter=args.jitter,
+        rate_429=args.rate_429, retry_after=args.retry_after, enforce_limits=args.enforce_limits,
+        record=args.record,
+    )
+    await fake.start()
+    print(f"Fake Telegram Bot API: {fake.base_url}  (TELEGRAM_API_BASE_URL)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await fake.stop()
+        print(json.dumps(fake.stats(), indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lokalni nadomestek Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="zamik odgovora (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="naključni dodatek k zamiku (s)")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="verjetnost 429 odgovora")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--enforce-limits", action="store_true", help="429 ob prekoračitvi Telegram omejitev")
+    parser.add_argument("--record", help="posnetek klicev (JSONL) ob izhodu")
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Lokalni nadomestek za avto.net, bolha.com in nepremicnine.net.
+
+Streže strani z rezultati (page_factory ali posnete strani iz --recordings),
+da lahko celoten fetch -> parse -> persist cevovod merimo brez pravih strani,
+ponovljivo (seed) in brez tveganja za blokado IP-ja.
+
+Scraperji ga uporabijo preko config.py (base_scraper prepiše host):
+    SCRAPER_HOST_OVERRIDE = "http://127.0.0.1:8090"
+    SCRAPER_FETCH_DELAY = (0, 0)
+https://www.avto.net/Ads/results.asp?...&stran=2 -> http://127.0.0.1:8090/www.avto.net/Ads/results.asp?...&stran=2
+
+Možnosti:
+- paginacija (avto.net `stran=`, bolha/nepremicnine `page=`), TOP vrstice na 1. strani,
+- novi oglasi s časom (--new-every) ali ročno (POST /_fixture/add?source=avtonet&n=5),
+- 403/429 z verjetnostjo (--rate-403/--rate-429), zamik (--latency), pasovna
+  širina (--bandwidth KB/s), gzip kot pri pravih straneh,
+- posnete strani: --recordings DIR z DIR/<vir>/<stran>.html (npr. avtonet/1.html)
+  imajo prednost pred generiranimi,
+- GET /_fixture/stats - število zahtev, statusi, prenešeni bajti.
+
+Samostojno:
+    python benchmarks/fixture_server.py --port 8090 --initial 500 --new-every 30 --rate-429 0.02
+"""
+import argparse
+import collections
+import gzip
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from page_factory import HOSTS, PAGE_PARAM, PAGE_SIZE, SOURCES, Inventory, render_page
+
+
+class FixtureSite:
+    """Stanje strežnika (inventar, napake, statistika) - neodvisno od HTTP plasti."""
+
+    def __init__(self, initial=300, new_every=0.0, new_batch=1, top=3, seed=1, latency=0.0, bandwidth=0,
+                 rate_403=0.0, rate_429=0.0, retry_after=5, recordings=None, use_gzip=True):
+        self.inventories = {
+            source: Inventory(source, initial=initial, new_every=new_every, new_batch=new_batch, top=top, seed=seed)
+            for source in SOURCES
+        }
+        self.latency = latency
+        self.bandwidth = bandwidth * 1024     # B/s, 0 = brez omejitve
+        self.rate_403 = rate_403
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.recordings = recordings
+        self.use_gzip = use_gzip
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "bytes": 0, "statuses": collections.Counter(), "sources": collections.Counter()}
+
+    def _recorded(self, source, page):
+        if not self.recordings:
+            return None
+        path = os.path.join(self.recordings, source, f"{page}.html")
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                return f.read()
+        return None
+
+    def resolve(self, path, query):
+        """(vir, stran) iz /<host>/... ali None."""
+        host = path.lstrip("/").split("/", 1)[0]
+        source = HOSTS.get(host)
+        if source is None:
+            return None
+        params = urllib.parse.parse_qs(query)
+        try:
+            page = int(params.get(PAGE_PARAM[source], ["1"])[0] or 1)
+        except ValueError:
+            page = 1
+        return source, page
+
+    def render(self, source, page):
+        body = self._recorded(source, page)
+        if body is None:
+            inventory = self.inventories[source]
+            body = render_page(source, inventory.page(page, PAGE_SIZE[source]), inventory.top_ads(), page)
+        return body
+
+    def injected_error(self):
+        with self._lock:
+            roll = self.random.random()
+        if roll < self.rate_403:
+            return 403
+        if roll < self.rate_403 + self.rate_429:
+            return 429
+        return None
+
+    def record(self, source, status, size):
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["bytes"] += size
+            self.stats["statuses"][status] += 1
+            if source:
+                self.stats["sources"][source] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "requests": self.stats["requests"], "bytes": self.stats["bytes"],
+                "statuses": dict(self.stats["statuses"]), "sources": dict(self.stats["sources"]),
+                "inventory": {source: len(inv) for source, inv in self.inventories.items()},
+            }
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    site = None  # FixtureSite (nastavi make_server)
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="text/html; charset=utf-8", headers=None, source=None):
+        data = body.encode("utf-8") if isinstance(body, str) else body
+        extra = dict(headers or {})
+        if self.site.use_gzip and "gzip" in self.headers.get("Accept-Encoding", "") and len(data) > 512:
+            data = gzip.compress(data, compresslevel=6)
+            extra["Content-Encoding"] = "gzip"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in extra.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self._write_throttled(data)
+        self.site.record(source, status, len(data))
+
+    def _write_throttled(self, data):
+        bandwidth = self.site.bandwidth
+        if not bandwidth:
+            self.wfile.write(data)
+            return
+        chunk = max(1024, int(bandwidth / 20))  # ~20 kosov na sekundo
+        for i in range(0, len(data), chunk):
+            self.wfile.write(data[i:i + chunk])
+            self.wfile.flush()
+            time.sleep(len(data[i:i + chunk]) / bandwidth)
+
+    def do_GET(self):
+        split = urllib.parse.urlsplit(self.path)
+        if split.path == "/_fixture/stats":
+            self._send(200, json.dumps(self.site.snapshot()), "application/json")
+            return
+
+        resolved = self.site.resolve(split.path, split.query)
+        if resolved is None:
+            self._send(404, "<html><body>Not found</body></html>")
+            return
+        source, page = resolved
+
+        if self.site.latency:
+            time.sleep(self.site.latency)
+        error = self.site.injected_error()
+        if error == 403:
+            self._send(403, "<html><body>Access denied (Cloudflare)</body></html>", source=source)
+            return
+        if error == 429:
+            self._send(429, "<html><body>Too Many Requests</body></html>",
+                       headers={"Retry-After": str(self.site.retry_after)}, source=source)
+            return
+        self._send(200, self.site.render(source, page), source=source)
+
+    def do_POST(self):
+        split = urllib.parse.urlsplit(self.path)
+        params = urllib.parse.parse_qs(split.query)
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        if split.path == "/_fixture/add":
+            sources = params.get("source", list(SOURCES))
+            count = int(params.get("n", ["1"])[0])
+            for source in sources:
+                self.site.inventories[source].add_ads(count)
+            self._send(200, json.dumps(self.site.snapshot()), "application/json")
+            return
+        self._send(404, "Not found", "text/plain")
+
+
+def make_server(site, host="127.0.0.1", port=0):
+    """ThreadingHTTPServer za `site`; server.server_address[1] je dejanski port."""
+    handler = type("BoundFixtureHandler", (FixtureHandler,), {"site": site})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_thread(site, host="127.0.0.1", port=0):
+    """Za benchmarke v istem procesu: vrne (server, base_url)."""
+    server = make_server(site, host, port)
+    threading.Thread(target=server.serve_forever, name="fixture-server", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lokalni avto.net / bolha / nepremicnine strežnik")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--initial", type=int, default=300, help="oglasov na vir ob zagonu")
+    parser.add_argument("--new-every", type=float, default=0.0, help="nov oglas vsakih N s (0 = izklop)")
+    parser.add_argument("--new-batch", type=int, default=1)
+    parser.add_argument("--top", type=int, default=3, help="TOP vrstic na prvi strani")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.0, help="zamik odgovora (s)")
+    parser.add_argument("--bandwidth", type=float, default=0, help="KB/s (0 = brez omejitve)")
+    parser.add_argument("--rate-403", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--recordings", help="mapa s posnetimi stranmi (<vir>/<stran>.html)")
+    parser.add_argument("--no-gzip", action="store_true")
+    args = parser.parse_args()
+
+    site = FixtureSite(
+        initial=args.initial, new_every=args.new_every, new_batch=args.new_batch, top=args.top, seed=args.seed,
+        latency=args.latency, bandwidth=args.bandwidth, rate_403=args.rate_403, rate_429=args.rate_429,
+        recordings=args.recordings, use_gzip=not args.no_gzip,
+    )
+    server = make_server(site, args.host, args.port)
+    print(f"Fixture strežnik: http://{args.host}:{server.server_address[1]}  (SCRAPER_HOST_OVERRIDE)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(site.snapshot(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
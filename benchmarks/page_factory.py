@@ -0,0 +1,233 @@
+"""
+Generator strani z rezultati za avto.net, bolha.com in nepremicnine.net.
+
+HTML ima enako strukturo (razrede, atribute, besedilne vzorce), kot jo
+pričakujejo scraperji v scraper/*, zato gre skozi iste parserje kot prava
+stran - brez omrežja in brez spreminjanja podatkov na pravih straneh.
+
+Inventory je determinističen (seed): isti parametri dajo iste oglase, novi
+oglasi se dodajajo na vrh (najnovejši zgoraj, kot pri presort=3/sort=new)
+- s časom (new_every) ali ročno z add_ads().
+
+    inv = Inventory("avtonet", initial=300, seed=1)
+    html = render_page("avtonet", inv.page(1, PAGE_SIZE["avtonet"]), top_rows=inv.top_ads())
+"""
+import html
+import random
+import threading
+import time
+
+SOURCES = ("avtonet", "bolha", "nepremicnine")
+PAGE_SIZE = {"avtonet": 48, "bolha": 25, "nepremicnine": 30}
+PAGE_PARAM = {"avtonet": "stran", "bolha": "page", "nepremicnine": "page"}
+HOSTS = {"www.avto.net": "avtonet", "www.bolha.com": "bolha", "www.nepremicnine.net": "nepremicnine"}
+
+_CARS = [
+    ("Volkswagen", "Golf"), ("Volkswagen", "Passat"), ("Audi", "A4"), ("Audi", "A6"), ("BMW", "320d"),
+    ("BMW", "X3"), ("Škoda", "Octavia"), ("Renault", "Clio"), ("Peugeot", "308"), ("Toyota", "Yaris"),
+    ("Mercedes-Benz", "C 220"), ("Ford", "Focus"), ("Opel", "Astra"), ("Hyundai", "i30"), ("Kia", "Ceed"),
+]
+_FUELS = ["diesel motor", "bencinski motor", "hibridni pogon", "elektro pogon"]
+_GEARBOX = ["ročni menjalnik", "avtomatski menjalnik"]
+_ITEMS = ["Gorsko kolo", "Električno kolo", "Otroški voziček", "Kavč", "iPhone 13", "Prenosnik Lenovo",
+          "Smuči Atomic", "Pralni stroj", "Kosilnica Husqvarna", "PlayStation 5"]
+_PLACES = ["Ljubljana", "Maribor", "Celje", "Kranj", "Koper", "Novo mesto", "Velenje", "Žalec", "Ptuj", "Murska Sobota"]
+_HOUSE_TYPES = ["samostojna", "dvostanovanjska", "vrstna", "večstanovanjska"]
+
+
+def _thousands(n):
+    return f"{n:,}".replace(",", ".")
+
+
+class Inventory:
+    """Oglasi enega vira, najnovejši prvi. Varno za sočasne zahteve (ThreadingHTTPServer)."""
+
+    def __init__(self, source, initial=300, new_every=0.0, new_batch=1, top=3, seed=1, epoch=None):
+        self.source = source
+        # epoch: fiksen čas objave (oglas i = epoch + i minut), da so strani ponovljive (korpus)
+        self.epoch = epoch
+        self._made = 0
+        self.new_every = new_every
+        self.new_batch = new_batch
+        self.random = random.Random(f"{source}:{seed}")
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._next_id = {"avtonet": 20_000_000, "bolha": 12_000_000, "nepremicnine": 7_000_000}[source]
+        self._ads = []               # najstarejši prvi (append = nov oglas)
+        self._timed = 0              # oglasi, dodani zaradi časa
+        self._top = [self._make_ad() for _ in range(top)]
+        self.add_ads(initial)
+
+    def _make_ad(self):
+        self._next_id += self.random.randint(1, 40)
+        rng = self.random
+        self._made += 1
+        created = time.time() if self.epoch is None else self.epoch + self._made * 60
+        ad = {"id": self._next_id, "place": rng.choice(_PLACES), "created": created}
+        if self.source == "avtonet":
+            make, model = rng.choice(_CARS)
+            year = rng.randint(2005, 2024)
+            kw = rng.choice([55, 66, 81, 85, 110, 140, 150, 190])
+            ad.update({
+                "title": f"{make} {model} {rng.choice(['1.6 TDI', '2.0 TDI', '1.5 TSI', 'Comfortline', 'Sport', ''])}".strip(),
+                "price": rng.randrange(1500, 60000, 10), "year": year,
+                "km": rng.randrange(5000, 320000, 1000), "fuel": rng.choice(_FUELS),
+                "gearbox": rng.choice(_GEARBOX), "ccm": rng.choice([999, 1395, 1498, 1598, 1968, 2993]),
+                "kw": kw, "hp": round(kw * 1.36),
+            })
+        elif self.source == "bolha":
+            ad.update({"title": f"{rng.choice(_ITEMS)} {rng.choice(['', 'kot nov', 'rabljen', 'ugodno'])}".strip(),
+                       "price": rng.randrange(10, 3000, 5)})
+        else:
+            m2 = round(rng.uniform(40, 320), 1)
+            ad.update({
+                "title": f"{ad['place']}, {rng.choice(['Center', 'Okolica', 'Novo naselje'])}",
+                "price": rng.randrange(80000, 900000, 500), "m2": m2, "land_m2": rng.randrange(150, 2500),
+                "year": rng.randint(1950, 2026), "type": rng.choice(_HOUSE_TYPES),
+            })
+        return ad
+
+    def add_ads(self, count=1):
+        with self._lock:
+            for _ in range(count):
+                self._ads.append(self._make_ad())
+
+    def _tick(self):
+        if not self.new_every:
+            return
+        due = int((time.monotonic() - self.started) / self.new_every) * self.new_batch
+        if due > self._timed:
+            self.add_ads(due - self._timed)
+            self._timed = due
+
+    def page(self, number, size):
+        """Oglasi strani `number` (1 = najnovejši)."""
+        self._tick()
+        with self._lock:
+            newest_first = self._ads[::-1]
+        start = (max(1, number) - 1) * size
+        return newest_first[start:start + size]
+
+    def top_ads(self):
+        return list(self._top)
+
+    def __len__(self):
+        return len(self._ads)
+
+
+# --- avto.net ---
+
+def _avtonet_row(ad, top=False):
+    top_cls = " GO-Results-Top-Photo" if top else ""
+    data = (
+        f"<table class='table table-striped table-sm'><tbody>"
+        f"<tr><td>1.registracija</td><td>{ad['year']}</td></tr>"
+        f"<tr><td>Prevoženih</td><td>{_thousands(ad['km'])} km</td></tr>"
+        f"<tr><td>Gorivo</td><td>{ad['fuel']}</td></tr>"
+        f"<tr><td>Menjalnik</td><td>{ad['gearbox']}</td></tr>"
+        f"<tr><td>Motor</td><td>{ad['ccm']} ccm, {ad['kw']} kW / {ad['hp']} KM</td></tr>"
+        f"</tbody></table>"
+    )
+    if top:
+        price = f"<div class='GO-Results-Top-Price'><div class='GO-Results-Top-Price-TXT-Regular'>{_thousands(ad['price'])} €</div></div>"
+        data_div = f"<div class='GO-Results-Top-Data'>{data}</div>"
+        ribbon = "<div class='GO-ResultsRibbon'>TOP PONUDBA</div>"
+    else:
+        price = f"<div class='GO-Results-Price'><div class='GO-Results-Price-TXT-Regular'>{_thousands(ad['price'])} €</div></div>"
+        data_div = f"<div class='GO-Results-Data'>{data}</div>"
+        ribbon = ""
+    return (
+        f"<div class='row bg-white position-relative GO-Results-Row GO-Shadow-B'>"
+        f"{ribbon}"
+        f"<a class='stretched-link' href='../Ads/details.asp?id={ad['id']}&amp;display={html.escape(ad['title'])}'></a>"
+        f"<div class='GO-Results-Naziv bg-dark px-3 py-2 font-weight-bold text-truncate text-white text-decoration-none'>"
+        f"<span>{html.escape(ad['title'])}</span></div>"
+        f"<div class='col-auto px-3 py-3 GO-Results-Photo{top_cls}'><div class='GO-Results-PhotoImg'>"
+        f"<img class='img-fluid' src='https://images.avto.net/photo/{ad['id']}/1_160.jpg' alt=''></div></div>"
+        f"{data_div}{price}"
+        f"</div>\n"
+    )
+
+
+def _avtonet_page(ads, top_rows, page):
+    rows = "".join(_avtonet_row(ad, top=True) for ad in top_rows) if page == 1 else ""
+    rows += "".join(_avtonet_row(ad) for ad in ads)
+    return (
+        "<!DOCTYPE html><html lang='sl'><head><meta charset='utf-8'><title>Avto.net - rezultati iskanja</title></head>"
+        "<body><div class='container'><div class='GO-Results-Top'></div>"
+        f"<div class='GO-Results-Count'>Rezultati iskanja: stran {page}</div>\n{rows}"
+        "<ul class='pagination'><li class='page-item GO-Rounded-R'><a class='page-link' href='#'>Naprej</a></li></ul>"
+        "</div></body></html>"
+    )
+
+
+# --- bolha ---
+
+def _bolha_item(ad, featured=False):
+    cls = "EntityList-item--VauVau" if featured else "EntityList-item--Regular"
+    slug = html.escape(ad['title'].lower().replace(" ", "-"))
+    published = time.strftime("%Y-%m-%dT%H:%M:%S+01:00", time.localtime(ad['created']))
+    return (
+        f"<li class='EntityList-item {cls}' data-href='/oglas/{slug}-oglas-{ad['id']}'>"
+        f"<article class='entity-body cf'>"
+        f"<h3 class='entity-title'><a name='{ad['id']}' class='link' href='/oglas/{slug}-oglas-{ad['id']}'>"
+        f"{html.escape(ad['title'])}</a></h3>"
+        f"<div class='entity-thumbnail'><img class='entity-thumbnail-img' alt='' "
+        f"data-src='//www.bolha.com/image-w300x225/{ad['id']}.jpg' src='data:image/gif;base64,R0lGODlhAQABAAAAACw='></div>"
+        f"<div class='entity-description'><div class='entity-description-main'>Lokacija: {ad['place']}</div></div>"
+        f"<div class='entity-pub-date'><time class='date' datetime='{published}'>{time.strftime('%d.%m.%Y.', time.localtime(ad['created']))}</time></div>"
+        f"<div class='entity-prices'><ul class='price-list'><li class='price-item'>"
+        f"<strong class='price price--hrk'>{_thousands(ad['price'])}&nbsp;€</strong></li></ul></div>"
+        f"</article></li>\n"
+    )
+
+
+def _bolha_page(ads, top_rows, page):
+    featured = "".join(_bolha_item(ad, featured=True) for ad in top_rows)
+    regular = "".join(_bolha_item(ad) for ad in ads)
+    regular_section = (
+        f"<section class='EntityList EntityList--Standard EntityList--Regular'><ul class='EntityList-items'>{regular}</ul></section>"
+        if ads else ""
+    )
+    return (
+        "<!DOCTYPE html><html lang='sl'><head><meta charset='utf-8'><title>Bolha.com</title></head><body>"
+        f"<section class='EntityList EntityList--VauVau'><ul class='EntityList-items'>{featured}</ul></section>"
+        f"{regular_section}"
+        f"<nav class='Pagination'><span class='Pagination-item--active'>{page}</span></nav>"
+        "</body></html>"
+    )
+
+
+# --- nepremicnine ---
+
+def _nepremicnine_card(ad):
+    slug = html.escape(ad['place'].lower().replace(" ", "-"))
+    m2 = str(ad['m2']).replace(".", ",")
+    description = f"{m2} m2, {ad['type']}, zgr. l. {ad['year']}, {ad['land_m2']} m2 zemljišča, prodamo hišo v lepem okolju."
+    return (
+        f"<div class='property-box property-normal mt-4 mt-md-0'><div class='property-section'>"
+        f"<div class='property-image'><a href='/oglasi-prodaja/{slug}-hisa_{ad['id']}/'>"
+        f"<img data-src='https://img.nepremicnine.link/slonep_oglasi2/{ad['id']}.jpg' alt=''></a></div>"
+        f"<div class='property-details'><a class='url-title-m' href='/oglasi-prodaja/{slug}-hisa_{ad['id']}/'>"
+        f"<h2>{html.escape(ad['title'])}</h2></a>"
+        f"<ul class='features'><li>Hiša</li></ul>"
+        f"<p class='font-roboto'>{html.escape(description)}</p>"
+        f"<h6>{_thousands(ad['price'])},00 €</h6></div></div></div>\n"
+    )
+
+
+def _nepremicnine_page(ads, top_rows, page):
+    cards = "".join(_nepremicnine_card(ad) for ad in ads)
+    return (
+        "<!DOCTYPE html><html lang='sl'><head><meta charset='utf-8'><title>Nepremicnine.net</title></head><body>"
+        f"<div id='vsebina'><div class='seznam'>{cards}</div>"
+        f"<div class='paging'><span class='paging_current'>{page}</span></div></div></body></html>"
+    )
+
+
+_RENDERERS = {"avtonet": _avtonet_page, "bolha": _bolha_page, "nepremicnine": _nepremicnine_page}
+
+
+def render_page(source, ads, top_rows=(), page=1):
+    """HTML strani z rezultati; TOP vrstice samo na prvi strani (kot na pravih straneh)."""
+    return _RENDERERS[source](ads, list(top_rows) if page == 1 else [], page)
@@ -0,0 +1,95 @@
+"""
+Obvestila vsem uporabnikom (/broadcast) kot trajen job v bazi.
+
+Prej je /broadcast pošiljal v handlerju: pri velikem številu uporabnikov je
+ukaz visel več minut, restart sredi pošiljanja pa je pomenil, da ne vemo,
+kdo je sporočilo že dobil.
+
+Zdaj:
+- /broadcast samo ustvari vrstico v BroadcastJobs in takoj odgovori,
+- BroadcastManager.job prejemnike po kosih (BROADCAST_CHUNK_SIZE, po
+  telegram_id) vpisuje v Outbox; vpis kosa in premik kurzorja sta ena
+  transakcija, zato se po restartu nadaljuje točno tam, kjer se je ustavilo,
+  UNIQUE(telegram_id, content_id) pa prepreči podvojena sporočila,
+- pošilja DeliveryWorker (isti rate limiter, ponovni poskusi, blokirani
+  uporabniki -> 'failed') z nižjo prioriteto kot obvestila o oglasih
+  (BROADCAST_PRIORITY), da novi oglasi ne čakajo za broadcastom,
+- napredek: /broadcast_status, preklic: /broadcast_cancel.
+
+    broadcasts = BroadcastManager(db)
+    application.job_queue.run_repeating(broadcasts.job, interval=10)
+"""
+import asyncio
+import html
+
+from utils import config_value
+
+
+class BroadcastManager:
+    def __init__(self, db, chunk_size=None, priority=None):
+        self.db = db
+        self.chunk_size = int(chunk_size or config_value("BROADCAST_CHUNK_SIZE", 500))
+        self.priority = int(priority if priority is not None else config_value("BROADCAST_PRIORITY", -1))
+        self._lock = asyncio.Lock()
+
+    def create(self, text, created_by=None, body=None):
+        """Nov job; pošiljanje začne naslednji job() (handler ga sproži takoj z run_once)."""
+        return self.db.create_broadcast_job(text, created_by, body)
+
+    def advance(self):
+        """
+        Vpiše preostale prejemnike aktivnih jobov v Outbox in osveži števce.
+        Sinhrono (kliče se v asyncio.to_thread). Vrne število novo vpisanih.
+        """
+        enqueued = 0
+        for job in self.db.get_broadcast_jobs(limit=100, active_only=True):
+            if job['status'] == 'enqueuing':
+                while True:
+                    count = self.db.enqueue_broadcast_chunk(job['id'], self.chunk_size, self.priority)
+                    if not count:
+                        break
+                    enqueued += count
+            self.db.refresh_broadcast_job(job['id'])
+        return enqueued
+
+    async def job(self, context):
+        """Callback za job_queue (run_repeating ob zagonu + run_once iz /broadcast)."""
+        if self._lock.locked():
+            return
+        async with self._lock:
+            try:
+                enqueued = await asyncio.to_thread(self.advance)
+            except Exception as e:
+                print(f"❌ [BROADCAST] Napaka pri vpisu v Outbox: {e}")
+                return
+        if enqueued:
+            print(f"📢 [BROADCAST] V vrsto dodanih {enqueued} sporočil")
+            worker = context.application.bot_data.get("delivery_worker")
+            if worker is not None:
+                context.job_queue.run_once(worker.job, when=0)
+
+    def progress(self, limit=5):
+        """Zadnji jobi z osveženimi števci (za /broadcast_status)."""
+        for job in self.db.get_broadcast_jobs(limit=limit, active_only=True):
+            self.db.refresh_broadcast_job(job['id'])
+        return self.db.get_broadcast_jobs(limit=limit)
+
+    def cancel(self, job_id):
+        """Vrne število odstranjenih neposlanih sporočil ali None, če job ni aktiven."""
+        return self.db.cancel_broadcast_job(job_id)
+
+
+def format_job(job):
+    """Ena vrstica za /broadcast_status (HTML)."""
+    icons = {"enqueuing": "📥", "sending": "📤", "done": "✅", "cancelled": "🛑"}
+    total = job['total'] or 0
+    processed = (job['sent'] or 0) + (job['failed'] or 0)
+    percent = (processed / total * 100) if total else 100
+    # Starejši jobi nimajo body - takrat predogled celotnega besedila
+    preview = html.escape((job.get('body') or job['text'])[:40])
+    line = (f"{icons.get(job['status'], '•')} <b>#{job['id']}</b> {job['status']} - "
+            f"{processed}/{total} ({percent:.0f}%) | ✅ {job['sent']} ❌ {job['failed']}\n"
+            f"   <i>{preview}</i> | {job['created_at']}")
+    if job.get('finished_at'):
+        line += f" → {job['finished_at']}"
+    return line
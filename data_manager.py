@@ -2,75 +2,320 @@ from database import Database
 import json
 import sqlite3
 import html
+import datetime
+import functools
+from collections import OrderedDict
+from tracing import traced
+
+# Polja, ki jih pri stagingu prenesemo v snippet_data (enako kot prej ScrapedData)
+STAGED_SNIPPET_FIELDS = (
+    'leto_1_reg', 'prevozenih', 'gorivo', 'menjalnik', 'motor',
+    'lokacija', 'published_date', 'source', 'category',
+    'm2', 'land_m2', 'type', 'year'   # nepremicnine
+)
+
+
+def stage_ad(url_id, data):
+    """
+    Pripravi oglas za obvestila tega cikla (namesto INSERT v ScrapedData).
+
+    Vrne dict z istimi stolpci kot ScrapedData; snippet_data ostane JSON tekst.
+    Scraperji vrnejo seznam teh vrstic, main.py jih poda direktno v check_new_offers().
+    """
+    # Oglas iz arhiva (MarketData) že ima snippet_data - ohranimo ga kot osnovo
+    snippet_data = {}
+    existing = data.get('snippet_data')
+    if isinstance(existing, str):
+        try:
+            snippet_data = json.loads(existing) or {}
+        except:
+            snippet_data = {}
+    elif isinstance(existing, dict):
+        snippet_data = dict(existing)
+
+    for key in STAGED_SNIPPET_FIELDS:
+        if data.get(key) is not None:
+            snippet_data[key] = data.get(key)
+    # Remove None values to keep JSON clean
+    snippet_data = {k: v for k, v in snippet_data.items() if v is not None}
+
+    return {
+        'url_id': url_id,
+        'content_id': data.get('content_id'),
+        'ime_avta': data.get('ime_avta') or data.get('title') or snippet_data.get('ime_avta'),
+        'cena': data.get('cena') or data.get('price'),
+        'link': data.get('link'),
+        'slika_url': data.get('slika_url'),
+        'snippet_data': json.dumps(snippet_data, ensure_ascii=False),
+        'created_at': datetime.datetime.now().strftime('%d.%m.%Y %H:%M:%S'),
+    }
+
+
+# --- PREDLOGE OBVESTIL ---
+# Povečaj TEMPLATE_VERSION ob vsaki spremembi predlog - ključ render cache-a se s tem zamenja.
+TEMPLATE_VERSION = 2
+
+MESSAGE_HEADER = (
+    "<b>NOV OGLAS NAJDEN!</b>\n"
+    "━━━━━━━━━━━━━━━━━━\n"
+    "<b>{ime}</b>\n\n"
+    "Cena: <b>{cena}</b>\n"
+)
+MESSAGE_FIELD = "\n{label}: <b>{value}</b>"
+MESSAGE_FOOTER = "\n🔗 <a href='{link}'>KLIKNI ZA OGLED OGLASA</a>"
+
+# (oznaka, ključ v normaliziranem oglasu) - vrstni red je vrstni red v sporočilu
+VEHICLE_FIELDS = (
+    ('Letnik', 'leto_1_reg'),
+    ('Prevozenih', 'km_str'),
+    ('Gorivo', 'gorivo'),
+    ('Menjalnik', 'menjalnik'),
+    ('Motor', 'motor'),
+    ('Lokacija', 'lokacija'),
+    ('Objavljeno', 'published_date'),
+)
+# Bolha: splošni oglasi (scraper ne pozna letnika/km) - samo kraj in čas objave
+ITEM_FIELDS = (
+    ('Lokacija', 'lokacija'),
+    ('Objavljeno', 'published_date'),
+)
+PROPERTY_FIELDS = (
+    ('Vrsta', 'type'),
+    ('Velikost', 'm2'),
+    ('Zemljišče', 'land_m2'),
+    ('Leto', 'year'),
+    ('Lokacija', 'lokacija'),
+    ('Objavljeno', 'published_date'),
+)
+MESSAGE_TEMPLATES = {
+    'avtonet': VEHICLE_FIELDS,
+    'bolha': ITEM_FIELDS,
+    'nepremicnine': PROPERTY_FIELDS,
+}
+EMPTY_VALUES = ('None', 'null', 'Neznano', '')
+
+# Zbirno obvestilo (digest): več oglasov cikla v enem sporočilu ali albumu
+DIGEST_HEADER = "📦 <b>{count} NOVIH OGLASOV</b>{part}\n━━━━━━━━━━━━━━━━━━\n"
+DIGEST_ITEM = "\n<b>{n}.</b> <a href='{link}'>{ime}</a>\n💰 <b>{cena}</b>{details}\n"
+DIGEST_DETAIL_FIELDS = {
+    'avtonet': ('leto_1_reg', 'km_str', 'gorivo', 'lokacija'),
+    'bolha': ('lokacija',),
+    'nepremicnine': ('type', 'm2', 'lokacija'),
+}
+# Telegram: sporočilo do 4096 znakov, napis albuma do 1024, album do 10 slik
+DIGEST_TEXT_LIMIT = 4096
+DIGEST_CAPTION_LIMIT = 1024
+
+# Render cache: isti oglas za N uporabnikov se oblikuje enkrat (tudi čez cikle)
+RENDER_CACHE_SIZE = 2000
+_RENDER_CACHE = OrderedDict()
+
+
+@functools.lru_cache(maxsize=4096)
+def format_published_date(raw):
+    try:
+        return datetime.datetime.fromisoformat(raw.replace('Z', '+00:00')).strftime('%d.%m.%Y')
+    except:
+        return raw
+
+
+def offer_source(oglas):
+    source = oglas.get('source')
+    if source:
+        return source
+    content_id = str(oglas.get('content_id') or '')
+    if content_id.startswith('bo_'):
+        return 'bolha'
+    if content_id.startswith('np_'):
+        return 'nepremicnine'
+    return 'avtonet'
+
 
 class DataManager():
     def __init__(self, database: Database):
         self.db = database
 
-    def check_new_offers(self, filter_url_ids=None):
+    def check_new_offers(self, staged_ads, filter_url_ids=None, chunk_size=200):
         """
-        Queries MarketData (source of truth) for unsent ads.
-        MarketData is the permanent archive - single source of truth.
-        Dedup via SentAds prevents respamming to users.
-        
-        For Bolha ads: all relevant data (ime_avta, lokacija, published_date, image_url)
-        is in snippet_data JSON - this method merges it into the result.
+        Generator neposlanih oglasov iz staginga tega cikla (ena vrstica na oglas + sledilca).
+
+        staged_ads je seznam vrstic iz stage_ad(), ki jih vrnejo scraperji.
+        Staging živi samo v TEMP tabeli te povezave - ni več DELETE/INSERT
+        v ScrapedData na vsak cikel. Dedup via SentAds prevents respamming to users.
+
+        Vrstice beremo po kosih (fetchmany), zato lahko pošiljanje začne že ob prvem kosu.
+        snippet_data ostane surov JSON - razširi ga expand_offer() šele ob formatiranju.
         """
-        if not filter_url_ids:
-            return []
+        if not filter_url_ids or not staged_ads:
+            return
 
         conn = self.db.get_connection()
         conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-
-        # Prepare SQL placeholders
-        placeholders = ', '.join(['?'] * len(filter_url_ids))
-        
-        # Query MarketData (source of truth) for unsent ads
-        query = f"""
-        SELECT s.*, t.telegram_id as target_user_id
-        FROM ScrapedData s
-        JOIN Tracking t ON s.url_id = t.url_id
-        WHERE s.url_id IN ({placeholders})
-        AND NOT EXISTS (
-            SELECT 1 FROM SentAds sa 
-            WHERE sa.telegram_id = t.telegram_id 
-            AND sa.content_id = s.content_id
+        try:
+            c = conn.cursor()
+
+            # TEMP tabela je vezana na to povezavo in izgine ob conn.close()
+            c.execute("""
+                CREATE TEMP TABLE CycleStaging (
+                    id INTEGER PRIMARY KEY,
+                    url_id INTEGER,
+                    content_id TEXT,
+                    ime_avta TEXT,
+                    cena TEXT,
+                    link TEXT,
+                    slika_url TEXT,
+                    snippet_data TEXT,
+                    created_at TEXT
+                )
+            """)
+            c.executemany("""
+                INSERT INTO CycleStaging (url_id, content_id, ime_avta, cena, link, slika_url, snippet_data, created_at)
+                VALUES (:url_id, :content_id, :ime_avta, :cena, :link, :slika_url, :snippet_data, :created_at)
+            """, staged_ads)
+
+            # Prepare SQL placeholders
+            placeholders = ', '.join(['?'] * len(filter_url_ids))
+
+            query = f"""
+            SELECT s.*, t.telegram_id as target_user_id, t.digest
+            FROM CycleStaging s
+            JOIN Tracking t ON s.url_id = t.url_id
+            WHERE s.url_id IN ({placeholders})
+            AND NOT EXISTS (
+                SELECT 1 FROM SentAds sa 
+                WHERE sa.telegram_id = t.telegram_id 
+                AND sa.content_id = s.content_id
+            )
+            ORDER BY s.id DESC
+            """
+
+            c.execute(query, filter_url_ids)
+            while True:
+                rows = c.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(row)
+        finally:
+            conn.close()
+
+    def expand_offer(self, oglas):
+        """
+        Razširi snippet_data JSON v sam oglas (lazy - kliče se šele ob formatiranju).
+
+        For Bolha ads: all relevant data (ime_avta, lokacija, published_date, image_url)
+        is in snippet_data JSON - this method merges it into the result.
+        """
+        if oglas.get('_expanded'):
+            return oglas
+
+        row_dict = dict(oglas)
+        if row_dict.get('snippet_data'):
+            try:
+                snippet = json.loads(row_dict['snippet_data'])
+                # Merge all snippet_data fields into row_dict
+                # This overwrites None values with actual data from snippet
+                for key, value in snippet.items():
+                    if value is not None:  # Only add non-None values
+                        row_dict[key] = value
+            except:
+                pass  # If JSON parse fails, continue with what we have
+        row_dict['_expanded'] = True
+        return row_dict
+
+    @traced("render")
+    def render_offer(self, oglas):
+        """
+        Obvestilo za oglas: {'text': HTML, 'photo_url': slika ali None}.
+
+        Rezultat je v cache-u pod (content_id, TEMPLATE_VERSION, cena, snippet_data),
+        zato se pri razpošiljanju istega oglasa N uporabnikom snippet_data
+        razčleni in sporočilo oblikuje samo enkrat. Sprememba cene/podatkov
+        oglasa da nov ključ.
+        """
+        key = (
+            oglas.get('content_id'), TEMPLATE_VERSION,
+            oglas.get('cena') or oglas.get('price'), oglas.get('snippet_data')
         )
-        ORDER BY s.created_at DESC
-    """
-        
-        params = filter_url_ids
-        rows = c.execute(query, params).fetchall()
-        conn.close()
-        
-        # Merge JSON snippet_data back into each row
-        result = []
-        for row in rows:
-            row_dict = dict(row)
-            # Parse snippet_data JSON and merge ALL fields into row
-            # This ensures Bolha ads have ime_avta, lokacija, published_date available
-            if row_dict.get('snippet_data'):
-                try:
-                    snippet = json.loads(row_dict['snippet_data'])
-                    # Merge all snippet_data fields into row_dict
-                    # This overwrites None values with actual data from snippet
-                    for key, value in snippet.items():
-                        if value is not None:  # Only add non-None values
-                            row_dict[key] = value
-                except:
-                    pass  # If JSON parse fails, continue with what we have
-            result.append(row_dict)
-        
-        return result
+        if key[0] is not None:
+            cached = _RENDER_CACHE.get(key)
+            if cached is not None:
+                _RENDER_CACHE.move_to_end(key)
+                return cached
+
+        oglas = self.expand_offer(oglas)
+        rendered = {
+            'text': self._render_message(oglas),
+            # Try both slika_url (Avtonet) and image_url (Bolha)
+            'photo_url': oglas.get('slika_url') or oglas.get('image_url'),
+        }
+        if key[0] is not None:
+            _RENDER_CACHE[key] = rendered
+            while len(_RENDER_CACHE) > RENDER_CACHE_SIZE:
+                _RENDER_CACHE.popitem(last=False)
+        return rendered
 
     def format_telegram_message(self, oglas):
-        from datetime import datetime
-        import html
-        
+        return self.render_offer(oglas)['text']
+
+    @traced("render")
+    def render_digest(self, oglasi, album=False, max_items=10):
+        """
+        Zbirna obvestila za več oglasov enega uporabnika: seznam
+        [{'text', 'photos', 'content_ids'}], vsak element je EN klic Telegram API-ja.
+        album=True: 'text' je napis albuma (<= 1024 znakov), 'photos' so slike
+        oglasov (sendMediaGroup); sicer kompakten tekst (<= 4096 znakov).
+        """
+        limit = DIGEST_CAPTION_LIMIT if album else DIGEST_TEXT_LIMIT
+        max_items = min(max_items, 10) if album else max_items
+        # Rezerva za glavo (število in "(2/3)" se izračunata na koncu)
+        budget = limit - len(DIGEST_HEADER) - 16
+
+        chunks, items, size = [], [], 0
+        for oglas in oglasi:
+            oglas = self.expand_offer(oglas)
+            ime, cena, values = self._offer_values(oglas)
+            detail_fields = DIGEST_DETAIL_FIELDS.get(offer_source(oglas), DIGEST_DETAIL_FIELDS['avtonet'])
+            details = [str(values[key]) for key in detail_fields
+                       if values.get(key) and str(values[key]) not in EMPTY_VALUES]
+            item = {
+                'content_id': oglas.get('content_id'),
+                'photo': oglas.get('slika_url') or oglas.get('image_url'),
+                'ime': ime,
+                'cena': html.escape(cena),
+                'link': html.escape(oglas.get('link', 'https://www.avto.net'), quote=True),
+                'details': html.escape(" | ".join(details)),
+            }
+            length = len(DIGEST_ITEM.format(n=99, **item)) + 3
+            if items and (len(items) >= max_items or size + length > budget):
+                chunks.append(items)
+                items, size = [], 0
+            items.append(item)
+            size += length
+        if items:
+            chunks.append(items)
+
+        rendered = []
+        for index, items in enumerate(chunks, 1):
+            part = f" ({index}/{len(chunks)})" if len(chunks) > 1 else ""
+            parts = [DIGEST_HEADER.format(count=len(items), part=part)]
+            for n, item in enumerate(items, 1):
+                parts.append(DIGEST_ITEM.format(
+                    n=n, link=item['link'], ime=item['ime'], cena=item['cena'],
+                    details=f"\n{item['details']}" if item['details'] else ""
+                ))
+            rendered.append({
+                'text': "".join(parts),
+                'photos': [i['photo'] for i in items if i['photo'] and str(i['photo']).startswith('http')],
+                'content_ids': [i['content_id'] for i in items],
+            })
+        return rendered
+
+    def _offer_values(self, oglas):
+        """(ime, cena, vrednosti polj) - skupno za posamezno in zbirno obvestilo."""
         # --- EXTRACT FIELDS ---
         ime = html.escape(str(oglas.get('ime_avta') or oglas.get('title', 'Neznano')))
-        
+
         # Cena
         raw_cena = oglas.get('cena') or oglas.get('price')
         if not raw_cena:
@@ -78,67 +323,43 @@ class DataManager():
         cena = str(raw_cena).replace('\xa0', ' ').strip()
         if any(char.isdigit() for char in cena) and '€' not in cena:
             cena += " €"
-        
-        # All other fields
-        leto = oglas.get('leto_1_reg')
-        km = oglas.get('prevozenih')
-        gorivo = oglas.get('gorivo')
-        menjalnik = oglas.get('menjalnik')
-        motor = oglas.get('motor')
-        lokacija = oglas.get('lokacija')
-        published_date_raw = oglas.get('published_date')
-        link = oglas.get('link', 'https://www.avto.net')
-        
+
         # Format km
+        km = oglas.get('prevozenih')
         if km and str(km) not in ['None', 'null', 'Neznano']:
             km_str = str(km).strip()
             if 'km' not in km_str.lower():
                 km_str += " km"
         else:
             km_str = None
-        
+
         # Format published date
-        published_date = None
-        if published_date_raw:
-            try:
-                dt = datetime.fromisoformat(published_date_raw.replace('Z', '+00:00'))
-                published_date = dt.strftime('%d.%m.%Y')
-            except:
-                published_date = published_date_raw
-        
+        published_date_raw = oglas.get('published_date')
+        published_date = format_published_date(published_date_raw) if published_date_raw else None
+
+        values = dict(oglas, km_str=km_str, published_date=published_date)
+        return ime, cena, values
+
+    def _render_message(self, oglas):
+        ime, cena, values = self._offer_values(oglas)
+
         # --- BUILD MESSAGE ---
-        msg = (
-            f"<b>NOV OGLAS NAJDEN!</b>\n"
-            f"━━━━━━━━━━━━━━━━━━\n"
-            f"<b>{ime}</b>\n\n"
-            f"Cena: <b>{cena}</b>\n"
-        )
-        
-        # Add all available fields (smart filtering - only show non-empty)
-        fields = [
-            ('Letnik', leto),
-            ('Prevozenih', km_str),
-            ('Gorivo', gorivo),
-            ('Menjalnik', menjalnik),
-            ('Motor', motor),
-            ('Lokacija', lokacija),
-            ('Objavljeno', published_date),
-        ]
-        
+        parts = [MESSAGE_HEADER.format(ime=ime, cena=cena)]
+
         # Only show fields that have actual values
+        fields = MESSAGE_TEMPLATES.get(offer_source(oglas), VEHICLE_FIELDS)
         shown_any = False
-        for label, value in fields:
-            if value and str(value) not in ['None', 'null', 'Neznano', '']:
-                msg += f"\n{label}: <b>{html.escape(str(value))}</b>"
+        for label, key in fields:
+            value = values.get(key)
+            if value and str(value) not in EMPTY_VALUES:
+                parts.append(MESSAGE_FIELD.format(label=label, value=html.escape(str(value))))
                 shown_any = True
-        
+
         if shown_any:
-            msg += "\n"
-        
-        msg += f"\n🔗 <a href='{link}'>KLIKNI ZA OGLED OGLASA</a>"
-        return msg
-    
-    
+            parts.append("\n")
+
+        parts.append(MESSAGE_FOOTER.format(link=oglas.get('link', 'https://www.avto.net')))
+        return "".join(parts)
 
 
 if __name__ == "__main__":
@@ -148,12 +369,13 @@ if __name__ == "__main__":
     db.init_db()
 
     scraper = Scraper(DataBase=db)
-    scraper.run()
+    staged = scraper.run(db.get_pending_urls())
 
     manager = DataManager(db)
-    novi_oglasi = manager.check_new_offers()
+    novi_oglasi = manager.check_new_offers(staged, filter_url_ids=list({s['url_id'] for s in staged}))
 
     for oglas in novi_oglasi:
+        oglas = manager.expand_offer(oglas)
         tekst = manager.format_telegram_message(oglas)
         print(f"POŠILJAM: {oglas['ime_avta']}")
         # bot.send_message(chat_id, tekst)
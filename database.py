@@ -1,23 +1,218 @@
 import sqlite3
 import json
 import datetime
+import os
+import threading
 
 import hashlib
 
+import metrics
+from query_log import QUERY_LOG, connection_factory
+from tracing import traced
+from utils import config_value
+
+
+# --- READ-ONLY POOL ZA ANALITIKO ---
+# Poročila (/admin_stats, /errors, /check_user, enrichment API, iskanje po arhivu)
+# berejo preko ločenih read-only povezav: WAL bralci nikoli ne čakajo na scraper
+# in ne morejo ničesar zapisati (mode=ro + query_only).
+
+def _ro_uri(path):
+    from urllib.parse import quote
+    return f"file:{quote(os.path.abspath(path))}?mode=ro"
+
+
+class _ReadOnlyPool:
+    def __init__(self, path, size, market_path=None):
+        self.path = path
+        self.market_path = market_path
+        self.size = size
+        self.generation = 0
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _open(self):
+        try:
+            conn = sqlite3.connect(_ro_uri(self.path), uri=True, check_same_thread=False, factory=connection_factory())
+        except sqlite3.OperationalError:
+            conn = sqlite3.connect(self.path, check_same_thread=False, factory=connection_factory())
+        if self.market_path:
+            conn.execute("ATTACH DATABASE ? AS market", (_ro_uri(self.market_path),))
+        conn.execute("PRAGMA query_only = 1")
+        # autocommit: brez implicitnega BEGIN, da povezava v poolu ne obvisi na starem snapshotu
+        conn.isolation_level = None
+        return conn
+
+    def acquire(self):
+        with self._lock:
+            generation = self.generation
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._open()
+        conn.row_factory = sqlite3.Row
+        return _PooledConnection(self, conn, generation)
+
+    def release(self, conn, generation):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if generation == self.generation and len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def invalidate(self):
+        """Po zamenjavi snapshot datoteke: stare povezave se zaprejo ob vrnitvi."""
+        with self._lock:
+            self.generation += 1
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+class _PooledConnection:
+    """Ovoj okoli sqlite3.Connection: close() vrne povezavo v pool (idempotentno)."""
+
+    def __init__(self, pool, conn, generation):
+        object.__setattr__(self, "_pool", pool)
+        object.__setattr__(self, "_conn", conn)
+        object.__setattr__(self, "_generation", generation)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def close(self):
+        conn = self._conn
+        if conn is None:
+            return
+        object.__setattr__(self, "_conn", None)
+        self._pool.release(conn, self._generation)
+
+
+_READ_POOLS = {}
+_READ_POOLS_LOCK = threading.Lock()
+
+
+def _read_pool(path, market_path=None):
+    key = (os.path.abspath(path), os.path.abspath(market_path) if market_path else None)
+    with _READ_POOLS_LOCK:
+        pool = _READ_POOLS.get(key)
+        if pool is None:
+            pool = _READ_POOLS[key] = _ReadOnlyPool(
+                path, int(config_value("READ_POOL_SIZE", 4)), market_path=market_path
+            )
+        return pool
+
+
 class Database:
-    def __init__(self, db_name):
+    def __init__(self, db_name, market_db=None):
         self.db_name = db_name
+        # Ločena datoteka za MarketData (+ FTS in indeks arhiva), priklopljena kot "market".
+        # Vroče tabele (Users, Tracking, Urls, SentAds, ScraperLogs) ostanejo v db_name:
+        # ločen write lock, WAL in cache -> masovni vpisi master crawlerja ne čakajo
+        # na dedup zapise v SentAds in obratno.
+        if market_db is None:
+            market_db = config_value("MARKET_DB_PATH", None)
+        if market_db and os.path.abspath(market_db) == os.path.abspath(db_name):
+            market_db = None
+        self.market_db = market_db
 
     def get_connection(self):
-        conn = sqlite3.connect(self.db_name)
+        # check_same_thread=False: AsyncDatabase izvaja klice na DB executorju in
+        # generatorji (check_new_offers) lahko nadaljujejo na drugem threadu.
+        # Povezava se nikoli ne deli med sočasnimi klici - vsaka metoda odpre svojo.
+        # TimedConnection meri vsak stavek (query_log.py, /slow).
+        conn = sqlite3.connect(self.db_name, check_same_thread=False, factory=connection_factory())
         conn.row_factory = sqlite3.Row 
+        if self.market_db:
+            self._attach_market(conn)
         return conn
 
+    def _attach_market(self, conn):
+        """
+        Priklopi arhivsko bazo kot shemo "market". Nekvalificirana imena (MarketData,
+        MarketDataFTS, MarketArchiveIndex) SQLite poišče v priklopljeni bazi, zato
+        poizvedbe ostanejo nespremenjene; transakcija, ki piše samo v MarketData,
+        zaklene samo market datoteko.
+        """
+        conn.execute("ATTACH DATABASE ? AS market", (self.market_db,))
+        # Pragme veljajo samo za market shemo (append-heavy, večji cache, WAL brez fsync na commit)
+        conn.execute(f"PRAGMA market.synchronous = {config_value('MARKET_DB_SYNCHRONOUS', 'NORMAL')}")
+        conn.execute(f"PRAGMA market.cache_size = -{int(config_value('MARKET_DB_CACHE_KB', 65536))}")
+        conn.execute(f"PRAGMA market.journal_size_limit = {int(config_value('MARKET_DB_WAL_LIMIT', 64 * 1024 * 1024))}")
+
+    def market_schema(self, cursor):
+        """
+        Shema, v kateri živi MarketData: "market" (MARKET_DB_PATH) ali "main".
+        Dokler migrations/split_market_db.py ni pognan, ostane MarketData v main.
+        """
+        if not self.market_db:
+            return "main"
+        in_main = cursor.execute(
+            "SELECT 1 FROM main.sqlite_master WHERE type = 'table' AND name = 'MarketData'"
+        ).fetchone()
+        return "main" if in_main else "market"
+
+    def checkpoint(self, schema="main", mode="PASSIVE"):
+        """WAL checkpoint za eno shemo ("main" ali "market"). Vrne (busy, log, checkpointed)."""
+        if schema == "market" and not self.market_db:
+            return None
+        conn = self.get_connection()
+        try:
+            return tuple(conn.execute(f"PRAGMA {schema}.wal_checkpoint({mode})").fetchone())
+        finally:
+            conn.close()
+
+    def get_read_connection(self, allow_snapshot=True):
+        """
+        Read-only povezava iz poola (mode=ro, query_only) za poročila in analitiko.
+        conn.close() jo vrne v pool. Z ANALYTICS_SNAPSHOT=True in allow_snapshot
+        bere iz periodično osveženega snapshota (refresh_analytics_snapshot) in
+        se sploh ne dotika produkcijske datoteke.
+        """
+        if allow_snapshot and config_value("ANALYTICS_SNAPSHOT", False):
+            snapshot = self.analytics_snapshot_path()
+            market_snapshot = self.analytics_snapshot_path(market=True)
+            if os.path.exists(snapshot) and (market_snapshot is None or os.path.exists(market_snapshot)):
+                return _read_pool(snapshot, market_snapshot).acquire()
+        return _read_pool(self.db_name, self.market_db).acquire()
+
+    def analytics_snapshot_path(self, market=False):
+        if market:
+            return f"{self.market_db}.analytics" if self.market_db else None
+        return config_value("ANALYTICS_SNAPSHOT_PATH", None) or f"{self.db_name}.analytics"
+
+    def refresh_analytics_snapshot(self):
+        """Osveži snapshot za analitiko (online backup po korakih + atomarna zamenjava)."""
+        from backup_manager import online_backup
+        snapshot = self.analytics_snapshot_path()
+        market_snapshot = self.analytics_snapshot_path(market=True)
+        copies = [(self.db_name, snapshot)]
+        if market_snapshot:
+            copies.append((self.market_db, market_snapshot))
+        for source, target in copies:
+            partial = target + ".part"
+            if os.path.exists(partial):
+                os.remove(partial)
+            online_backup(source, partial)
+            os.replace(partial, target)
+        _read_pool(snapshot, market_snapshot).invalidate()
+        return snapshot
+
     def init_db(self):
         """Ustvari vse tabele za sistem paketov."""
         conn = self.get_connection()
         cursor = conn.cursor()
 
+        # WAL: bralci (npr. check_new_offers generator) ne blokirajo pisanja v SentAds
+        # Nastavitev je trajna - shrani se v datoteko baze.
+        cursor.execute("PRAGMA journal_mode=WAL")
+        if self.market_db:
+            cursor.execute("PRAGMA market.journal_mode=WAL")
+
         # 1. USERS: Shranjuje vse o paketu in omejitvah
         cursor.execute("""
         CREATE TABLE IF NOT EXISTS Users (
@@ -57,6 +252,10 @@ class Database:
             UNIQUE(telegram_id, url_id) 
         )
         """)
+        # digest: 1 = zbirno obvestilo, 0 = posamezna, NULL = po paketu (DIGEST_PACKAGES)
+        cursor.execute("PRAGMA table_info(Tracking)")
+        if 'digest' not in {col[1] for col in cursor.fetchall()}:
+            cursor.execute("ALTER TABLE Tracking ADD COLUMN digest INTEGER")
 
         # 4. SCRAPED_DATA: Zadnji podatki iz Avto.net
         cursor.execute("""
@@ -114,9 +313,109 @@ class Database:
         )
         """)
 
-        # 8. Market Data (Unified multi-source schema)
+        # 8. OUTBOX: Trajna vrsta obvestil - scraper vpiše, delivery.py pošilja z retry/backoff
         cursor.execute("""
-        CREATE TABLE IF NOT EXISTS MarketData (
+        CREATE TABLE IF NOT EXISTS Outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            telegram_id INTEGER NOT NULL,
+            content_id TEXT,
+            text TEXT NOT NULL,
+            photo_url TEXT,
+            media TEXT,                     -- JSON seznam slik za album (digest), sicer NULL
+            status TEXT DEFAULT 'pending',  -- pending / sending / sent / failed
+            priority INTEGER DEFAULT 0,     -- višja = prej (paket uporabnika, glej delivery.plan_deliveries)
+            attempts INTEGER DEFAULT 0,
+            next_attempt_at REAL DEFAULT 0, -- unix čas naslednjega poskusa
+            last_error TEXT,
+            created_at DATETIME DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime')),
+            sent_at DATETIME,
+            UNIQUE(telegram_id, content_id)
+        )
+        """)
+        cursor.execute("PRAGMA table_info(Outbox)")
+        outbox_columns = {col[1] for col in cursor.fetchall()}
+        if 'priority' not in outbox_columns:
+            cursor.execute("ALTER TABLE Outbox ADD COLUMN priority INTEGER DEFAULT 0")
+        if 'media' not in outbox_columns:
+            cursor.execute("ALTER TABLE Outbox ADD COLUMN media TEXT")
+        cursor.execute("DROP INDEX IF EXISTS idx_outbox_pending")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_outbox_claim ON Outbox (status, priority DESC, id);")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_outbox_content ON Outbox (content_id, status);")
+
+        # BROADCAST_JOBS: Obvestila vsem uporabnikom kot trajni job (glej broadcast.py)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS BroadcastJobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            text TEXT NOT NULL,
+            created_by INTEGER,
+            status TEXT DEFAULT 'enqueuing',  -- enqueuing / sending / done / cancelled
+            total INTEGER DEFAULT 0,
+            cursor INTEGER,                   -- zadnji telegram_id, že vpisan v Outbox
+            enqueued INTEGER DEFAULT 0,
+            sent INTEGER DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            created_at DATETIME DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime')),
+            finished_at DATETIME
+        )
+        """)
+        cursor.execute("PRAGMA table_info(BroadcastJobs)")
+        if 'body' not in {col[1] for col in cursor.fetchall()}:
+            # Vsebina brez glave "OBVESTILO ADMINA" - za predogled v /broadcast_status
+            cursor.execute("ALTER TABLE BroadcastJobs ADD COLUMN body TEXT")
+
+        # 9. PHOTO_CACHE: Telegram file_id slike oglasa (isti oglas več uporabnikom -> brez ponovnega prenosa)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS PhotoCache (
+            content_id TEXT PRIMARY KEY,
+            photo_url TEXT NOT NULL,
+            file_id TEXT NOT NULL,
+            hits INTEGER DEFAULT 0,
+            created_at DATETIME DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime')),
+            last_used_at DATETIME DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime'))
+        )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_photo_cache_used ON PhotoCache (last_used_at);")
+
+        # CYCLE_TRACE: Časi faz cikla (glej tracing.py) - agregat na fazo + posamezni počasni spani
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS CycleTrace (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cycle_id TEXT NOT NULL,
+            kind TEXT NOT NULL,           -- scrape / delivery
+            stage TEXT NOT NULL,          -- fetch, parse.avtonet, ai, db, dedup, render, send, ...
+            detail TEXT,                  -- NULL = agregat faze, sicer opis počasnega klica (URL, chat)
+            calls INTEGER,
+            total_ms REAL,
+            self_ms REAL,                 -- brez gnezdenih spanov
+            max_ms REAL,
+            created_at DATETIME DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime'))
+        )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cycle_trace_kind ON CycleTrace (kind, cycle_id);")
+
+        # SLOW_QUERIES: Agregat SQL stavkov po normaliziranem besedilu (glej query_log.py)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS SlowQueries (
+            statement TEXT PRIMARY KEY,   -- normaliziran stavek (literali -> ?)
+            calls INTEGER DEFAULT 0,
+            total_ms REAL DEFAULT 0,
+            max_ms REAL DEFAULT 0,
+            slow_calls INTEGER DEFAULT 0, -- klici nad SLOW_QUERY_MS
+            params_shape TEXT,            -- tipi parametrov zadnjega počasnega klica
+            plan TEXT,                    -- EXPLAIN QUERY PLAN
+            full_scan INTEGER DEFAULT 0,
+            first_seen_at DATETIME DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime')),
+            last_seen_at DATETIME DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime'))
+        )
+        """)
+
+        # 10. Market Data (Unified multi-source schema) - v market bazi, če je MARKET_DB_PATH nastavljen
+        market = self.market_schema(cursor)
+        if market == "main" and self.market_db:
+            print("⚠️ [DB] MARKET_DB_PATH je nastavljen, MarketData pa je še v glavni bazi - "
+                  "zaženi migrations/split_market_db.py")
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {market}.MarketData (
             content_id TEXT PRIMARY KEY,    -- UNIQUE: source_prefix + ID (e.g. an_12345)
             source TEXT DEFAULT 'avtonet',  -- Source: avtonet, bolha, etc.
             category TEXT,                  -- Category: avtonet_kategorija code (0=car, 1=motorcycle, etc.)
@@ -131,10 +430,137 @@ class Database:
         )
         """)
 
+        # Generirani stolpci (cena, leto, km, kW, gorivo, lokacija) + indeksi nad snippet_data
+        self.ensure_market_columns(cursor, schema=market)
+
+        # Full-text indeks (FTS5) nad naslovi in opisi
+        self.ensure_market_fts(cursor, schema=market)
+
+        # Indeks hladnega arhiva (stari oglasi v stisnjenih segmentih, glej market_archive.py)
+        from market_archive import ensure_archive_schema
+        ensure_archive_schema(cursor, schema=market)
+
         conn.commit()
         conn.close()
         print("Baza podatkov je uspešno pripravljena.")
 
+    # --- MARKET DATA: GENERIRANI STOLPCI (JSON1) ---
+
+    @staticmethod
+    def _market_pick(columns, *sources, row=""):
+        """
+        SQL izraz, ki vrne prvo neprazno vrednost iz `sources`.
+        sources: ime stolpca ali '$.json_pot' (iz snippet_data); row="new." za triggerje.
+        """
+        parts = []
+        for src in sources:
+            if src.startswith('$.'):
+                if 'snippet_data' in columns:
+                    parts.append(
+                        f"CASE WHEN json_valid({row}snippet_data) "
+                        f"THEN NULLIF(json_extract({row}snippet_data, '{src}'), '') END"
+                    )
+            elif src in columns:
+                parts.append(f"NULLIF({row}{src}, '')")
+        if not parts:
+            return "NULL"
+        return parts[0] if len(parts) == 1 else f"COALESCE({', '.join(parts)})"
+
+    def _market_generated_columns(self, columns):
+        """
+        Vrne [(ime, tip, izraz)] za virtualne generirane stolpce MarketData.
+        Izrazi so odvisni od sheme: stara shema ima prave stolpce (ime_avta, cena,
+        leto_1_reg, ...), čista/unified shema ima vse v snippet_data JSON.
+        """
+        def pick(*sources):
+            return self._market_pick(columns, *sources)
+
+        def digits(expr):
+            # '12.490 €' -> 12490, '145.000 km' -> 145000, 'Po dogovoru' -> NULL
+            stripped = f"replace(replace(replace(CAST({expr} AS TEXT), '.', ''), ' ', ''), char(160), '')"
+            return f"NULLIF(CAST({stripped} AS INTEGER), 0)"
+
+        price = pick('price', 'cena', '$.cena', '$.price')
+        year = f"CAST({pick('leto_1_reg', '$.leto_1_reg', '$.year')} AS INTEGER)"
+        motor = pick('motor', '$.motor', '$."moč"')
+        fuel = f"lower({pick('gorivo', '$.gorivo', '$.fuel')})"
+
+        # '1968 ccm, 110 kW / 150 KM' -> 110 ; '110 kW / 150 KM' -> 110
+        kw_pos = f"instr({motor}, ' kW')"
+        comma_pos = f"instr({motor}, ',')"
+        power = (
+            f"CASE WHEN {kw_pos} = 0 THEN NULL "
+            f"WHEN {comma_pos} BETWEEN 1 AND {kw_pos} "
+            f"THEN CAST(trim(substr({motor}, {comma_pos} + 1, {kw_pos} - {comma_pos} - 1)) AS INTEGER) "
+            f"ELSE CAST(trim(substr({motor}, 1, {kw_pos} - 1)) AS INTEGER) END"
+        )
+
+        fuel_enum = (
+            f"CASE WHEN {fuel} LIKE '%hibrid%' OR {fuel} LIKE '%hybrid%' THEN 'hibrid' "
+            f"WHEN {fuel} LIKE '%diesel%' OR {fuel} LIKE '%dizel%' THEN 'diesel' "
+            f"WHEN {fuel} LIKE '%bencin%' OR {fuel} LIKE '%benzin%' THEN 'bencin' "
+            f"WHEN {fuel} LIKE '%elektr%' THEN 'elektro' "
+            f"WHEN {fuel} LIKE '%plin%' OR {fuel} LIKE '%lpg%' OR {fuel} LIKE '%cng%' THEN 'plin' END"
+        )
+
+        return [
+            ('model', 'TEXT', pick('title', 'ime_avta', '$.ime_avta', '$.title')),
+            ('price_eur', 'INTEGER', digits(price)),
+            ('reg_year', 'INTEGER', f"CASE WHEN {year} BETWEEN 1900 AND 2100 THEN {year} END"),
+            ('mileage_km', 'INTEGER', digits(pick('prevozenih', '$.prevozenih', '$.mileage'))),
+            ('power_kw', 'INTEGER', f"NULLIF({power}, 0)"),
+            ('fuel_type', 'TEXT', fuel_enum),
+            ('location', 'TEXT', pick('$.lokacija', '$.location')),
+        ]
+
+    MARKET_INDEXES = [
+        # model + najpogostejši filtri: range pogoji se preverijo iz indeksa brez branja JSON-a
+        ("idx_market_model", "model COLLATE NOCASE, reg_year, mileage_km, price_eur"),
+        ("idx_market_price", "price_eur"),
+        ("idx_market_year", "reg_year"),
+        ("idx_market_km", "mileage_km"),
+        ("idx_market_kw", "power_kw"),
+        ("idx_market_fuel", "fuel_type, reg_year"),
+        ("idx_market_location", "location"),
+    ]
+
+    def ensure_market_columns(self, cursor=None, schema=None):
+        """Doda manjkajoče generirane stolpce in indekse v MarketData (idempotentno)."""
+        own_conn = None
+        if cursor is None:
+            own_conn = self.get_connection()
+            cursor = own_conn.cursor()
+        try:
+            schema = schema or self.market_schema(cursor)
+            # Generirani stolpci zahtevajo SQLite >= 3.31
+            if sqlite3.sqlite_version_info < (3, 31, 0):
+                print(f"⚠️ [DB] SQLite {sqlite3.sqlite_version} ne podpira generiranih stolpcev - preskakujem.")
+                return
+
+            # table_xinfo vidi tudi skrite (generirane) stolpce, table_info jih ne
+            cursor.execute(f"PRAGMA {schema}.table_xinfo(MarketData)")
+            columns = {col[1] for col in cursor.fetchall()}
+
+            added = []
+            for name, col_type, expr in self._market_generated_columns(columns):
+                if name in columns:
+                    continue
+                cursor.execute(
+                    f"ALTER TABLE {schema}.MarketData ADD COLUMN {name} {col_type} GENERATED ALWAYS AS ({expr}) VIRTUAL"
+                )
+                added.append(name)
+
+            for index_name, index_cols in self.MARKET_INDEXES:
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {schema}.{index_name} ON MarketData ({index_cols})")
+
+            if added:
+                print(f"🧩 [DB] MarketData generirani stolpci dodani: {', '.join(added)}")
+            if own_conn:
+                own_conn.commit()
+        finally:
+            if own_conn:
+                own_conn.close()
+
 
     # --- FUNKCIJE ZA SCRAPER ---
     
@@ -459,7 +885,7 @@ class Database:
 
     def get_admin_stats(self):
         """Vrne statistiko za DANES (od 00:00) in za tekoči mesec s pravilnim formatom datuma."""
-        conn = self.get_connection()
+        conn = self.get_read_connection()
         conn.row_factory = sqlite3.Row
         c = conn.cursor()
 
@@ -578,7 +1004,7 @@ class Database:
         return row
 
     def get_all_users_admin(self):
-        conn = self.get_connection()
+        conn = self.get_read_connection()
         c = conn.cursor()
         # Prepričaj se, da je telegram_username v SELECT stavku!
         query = "SELECT telegram_id, telegram_name, telegram_username, subscription_type, subscription_end, is_active FROM Users"
@@ -742,6 +1168,7 @@ class Database:
 
     # --- LOGGING METODE ---
 
+    @traced("db")
     def log_scraper_run(self, url_id, status_code, found_count, duration, bytes_used, error_msg):
         conn = self.get_connection()
         c = conn.cursor()
@@ -777,7 +1204,7 @@ class Database:
 
     def get_recent_system_logs(self, limit=5):
         """Vrne zadnje aktivnosti uporabnikov iz tabele UserActivity."""
-        conn = self.get_connection()
+        conn = self.get_read_connection()
         cursor = conn.cursor()
         # Zamenjali smo SystemLogs z UserActivity
         cursor.execute("""
@@ -792,7 +1219,7 @@ class Database:
         
     def get_scraper_health(self, limit=10):
         """Vrne zadnjih N zapisov scraperja."""
-        conn = self.get_connection()
+        conn = self.get_read_connection()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM ScraperLogs ORDER BY id DESC LIMIT ?", (limit,))
@@ -802,7 +1229,7 @@ class Database:
     
 
     def get_admin_health_stats(self):
-        conn = self.get_connection()
+        conn = self.get_read_connection()
         conn.row_factory = sqlite3.Row
         c = conn.cursor()
 
@@ -822,9 +1249,57 @@ class Database:
         conn.close()
         return dict(row) if row else None
 
+    def get_admin_overview(self):
+        """Paketi, 'ghost' uporabniki (aktivni brez linkov) in linki z napakami za /admin_overview."""
+        conn = self.get_read_connection()
+        c = conn.cursor()
+        try:
+            # 1. Razvrstitev po paketih
+            packages = c.execute("SELECT subscription_type, COUNT(*) FROM Users GROUP BY subscription_type").fetchall()
+
+            # 2. Kdo nima URL-jev (Ghost users)
+            ghosts = c.execute("""
+                SELECT telegram_name, telegram_id FROM Users 
+                WHERE telegram_id NOT IN (SELECT telegram_id FROM Tracking)
+                AND is_active = 1
+            """).fetchall()
+
+            # 3. Kdo ima pokvarjene linke (Fails)
+            failed_links = c.execute("""
+                SELECT us.telegram_name, u.url_id FROM Urls u 
+                JOIN Tracking t ON u.url_id = t.url_id 
+                JOIN Users us ON t.telegram_id = us.telegram_id 
+                WHERE u.fail_count > 0
+            """).fetchall()
+        finally:
+            conn.close()
+
+        return {
+            'packages': [tuple(r) for r in packages],
+            'ghosts': [tuple(r) for r in ghosts],
+            'failed_links': [tuple(r) for r in failed_links],
+        }
+
+    def get_recent_errors(self, limit=10):
+        """Zadnjih N neuspešnih scraper requestov z imeni uporabnikov (/errors)."""
+        conn = self.get_read_connection()
+        try:
+            rows = conn.execute("""
+                SELECT u.telegram_name, sl.url_id, sl.status_code, sl.error_msg, sl.timestamp
+                FROM ScraperLogs sl
+                JOIN Tracking t ON sl.url_id = t.url_id
+                JOIN Users u ON t.telegram_id = u.telegram_id
+                WHERE sl.status_code != 200
+                ORDER BY sl.id DESC
+                LIMIT ?
+            """, (limit,)).fetchall()
+        finally:
+            conn.close()
+        return [dict(r) for r in rows]
+
     def get_user_diagnostic(self, t_id):
         """Vrne vse info o uporabniku za diagnozo."""
-        conn = self.get_connection()
+        conn = self.get_read_connection()
         cursor = conn.cursor()
         # Podatki o naročnini
         cursor.execute("SELECT * FROM Users WHERE telegram_id = ?", (t_id,))
@@ -848,7 +1323,7 @@ class Database:
 
     def get_proxy_cost_analysis(self, price_per_gb=5.0):
         """Izračuna trenutni strošek in napoved za mesec."""
-        conn = self.get_connection()
+        conn = self.get_read_connection()
         cursor = conn.cursor()
 
         price_per_gb = float(price_per_gb)
@@ -879,7 +1354,7 @@ class Database:
     
     def get_user_tracked_urls(self, telegram_id):
         """Vrne seznam vseh URL-jev, ki jih uporabnik spremlja."""
-        conn = self.get_connection()
+        conn = self.get_read_connection()
         conn.row_factory = sqlite3.Row
         c = conn.cursor()
         query = """
@@ -901,6 +1376,455 @@ class Database:
         finally:
             conn.close()
 
+    @traced("db")
+    def add_sent_ads(self, pairs):
+        """Masovni vpis (telegram_id, content_id) parov v SentAds v eni transakciji."""
+        conn = self.get_connection()
+        c = conn.cursor()
+        try:
+            c.executemany("INSERT OR IGNORE INTO SentAds (telegram_id, content_id) VALUES (?, ?)", pairs)
+            conn.commit()
+        finally:
+            conn.close()
+
+    # --- OUTBOX (glej delivery.py) ---
+
+    @traced("db")
+    def enqueue_notifications(self, rows):
+        """
+        Vpiše obvestila v Outbox in jih v ISTI transakciji označi v SentAds.
+        rows: [{'telegram_id', 'content_id', 'text', 'photo_url', 'priority' (opcijsko),
+                'media' (opcijsko, seznam slik za album), 'sent_content_ids' (opcijsko)}]
+        Zbirno obvestilo (digest) v SentAds označi vse svoje oglase (sent_content_ids).
+        SentAds tako pomeni "prevzeto v dostavo": naslednji cikel oglasa ne vrne
+        več, dostavo pa (tudi po restartu) zagotovi Outbox. Vrne število novih vrstic.
+        """
+        if not rows:
+            return 0
+        conn = self.get_connection()
+        c = conn.cursor()
+        try:
+            before = conn.total_changes
+            c.executemany("""
+                INSERT OR IGNORE INTO Outbox (telegram_id, content_id, text, photo_url, media, priority)
+                VALUES (:telegram_id, :content_id, :text, :photo_url, :media, :priority)
+            """, [
+                dict(r, priority=r.get('priority', 0), media=json.dumps(r['media']) if r.get('media') else None)
+                for r in rows
+            ])
+            queued = conn.total_changes - before
+            c.executemany(
+                "INSERT OR IGNORE INTO SentAds (telegram_id, content_id) VALUES (?, ?)",
+                [
+                    (r['telegram_id'], content_id)
+                    for r in rows
+                    for content_id in (r.get('sent_content_ids') or [r.get('content_id')])
+                    if content_id
+                ]
+            )
+            conn.commit()
+            metrics.OUTBOX_PENDING.inc(queued)
+            return queued
+        finally:
+            conn.close()
+
+    @traced("db")
+    def get_subscription_types(self, telegram_ids):
+        """{telegram_id: subscription_type} za podane uporabnike (po 500 v poizvedbi)."""
+        ids = list(telegram_ids)
+        if not ids:
+            return {}
+        conn = self.get_connection()
+        try:
+            result = {}
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT telegram_id, subscription_type FROM Users WHERE telegram_id IN ({', '.join(['?'] * len(chunk))})",
+                    chunk
+                ).fetchall()
+                result.update({row['telegram_id']: row['subscription_type'] for row in rows})
+            return result
+        finally:
+            conn.close()
+
+    @traced("db")
+    def claim_outbox(self, limit=50):
+        """Prevzame do `limit` zapadlih obvestil (status -> 'sending'), višja prioriteta prej."""
+        import time
+        conn = self.get_connection()
+        c = conn.cursor()
+        try:
+            rows = c.execute("""
+                SELECT * FROM Outbox
+                WHERE status = 'pending' AND next_attempt_at <= ?
+                ORDER BY priority DESC, id
+                LIMIT ?
+            """, (time.time(), limit)).fetchall()
+            if not rows:
+                return []
+            ids = [r['id'] for r in rows]
+            c.execute(
+                f"UPDATE Outbox SET status = 'sending', attempts = attempts + 1 "
+                f"WHERE id IN ({', '.join(['?'] * len(ids))})",
+                ids
+            )
+            conn.commit()
+            claimed = []
+            for r in rows:
+                item = dict(r)
+                item['attempts'] += 1
+                item['status'] = 'sending'
+                claimed.append(item)
+            return claimed
+        finally:
+            conn.close()
+
+    @traced("db")
+    def mark_outbox_sent(self, ids):
+        if not ids:
+            return
+        conn = self.get_connection()
+        try:
+            conn.executemany(
+                "UPDATE Outbox SET status = 'sent', last_error = NULL, "
+                "sent_at = strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime') WHERE id = ?",
+                [(i,) for i in ids]
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def mark_outbox_retry(self, outbox_id, error, delay):
+        """Vrne obvestilo v vrsto; naslednji poskus čez `delay` sekund."""
+        import time
+        conn = self.get_connection()
+        try:
+            conn.execute(
+                "UPDATE Outbox SET status = 'pending', last_error = ?, next_attempt_at = ? WHERE id = ?",
+                (str(error)[:500], time.time() + delay, outbox_id)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def mark_outbox_failed(self, outbox_id, error):
+        conn = self.get_connection()
+        try:
+            conn.execute(
+                "UPDATE Outbox SET status = 'failed', last_error = ? WHERE id = ?",
+                (str(error)[:500], outbox_id)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def reset_outbox_inflight(self):
+        """Ob zagonu: obvestila, ki so ostala v 'sending' (crash/restart), gredo nazaj v vrsto."""
+        conn = self.get_connection()
+        try:
+            count = conn.execute("UPDATE Outbox SET status = 'pending' WHERE status = 'sending'").rowcount
+            conn.commit()
+            return count
+        finally:
+            conn.close()
+
+    def get_outbox_stats(self):
+        """{status: število} + starost najstarejšega čakajočega obvestila v sekundah."""
+        conn = self.get_read_connection(allow_snapshot=False)
+        try:
+            stats = {row[0]: row[1] for row in conn.execute("SELECT status, COUNT(*) FROM Outbox GROUP BY status")}
+            oldest = conn.execute("""
+                SELECT strftime('%s', 'now', 'localtime') - strftime('%s', MIN(created_at))
+                FROM Outbox WHERE status = 'pending'
+            """).fetchone()[0]
+            stats['oldest_pending_s'] = max(0, oldest or 0)
+            return stats
+        finally:
+            conn.close()
+
+    def cleanup_outbox(self, days=7):
+        """Pobriše dostavljena (in dokončno neuspela) obvestila, starejša od `days` dni."""
+        conn = self.get_connection()
+        try:
+            count = conn.execute(
+                "DELETE FROM Outbox WHERE status IN ('sent', 'failed') "
+                "AND created_at < strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime', ?)",
+                (f'-{days} days',)
+            ).rowcount
+            conn.commit()
+            print(f"[DB] Outbox čiščenje: odstranjenih {count} starih obvestil.")
+            return count
+        finally:
+            conn.close()
+
+    # --- BROADCAST JOBS (glej broadcast.py) ---
+
+    def create_broadcast_job(self, text, created_by=None, body=None):
+        """text = celotno sporočilo (z glavo), body = samo vsebina admina (predogled)."""
+        conn = self.get_connection()
+        try:
+            total = conn.execute("SELECT COUNT(*) FROM Users").fetchone()[0]
+            job_id = conn.execute(
+                "INSERT INTO BroadcastJobs (text, body, created_by, total) VALUES (?, ?, ?, ?)",
+                (text, body, created_by, total)
+            ).lastrowid
+            conn.commit()
+            return job_id
+        finally:
+            conn.close()
+
+    def enqueue_broadcast_chunk(self, job_id, limit=500, priority=-1):
+        """
+        Naslednjih `limit` prejemnikov (po telegram_id) v Outbox + premik kurzorja,
+        oboje v eni transakciji: po crashu se nadaljuje točno tam, kjer se je ustavilo.
+        Vrne število vpisanih; 0 -> vsi so v vrsti (status 'sending').
+        """
+        conn = self.get_connection()
+        try:
+            job = conn.execute(
+                "SELECT text, cursor, status FROM BroadcastJobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if not job or job['status'] != 'enqueuing':
+                return 0
+            ids = [row[0] for row in conn.execute(
+                "SELECT telegram_id FROM Users WHERE telegram_id > COALESCE(?, -9223372036854775808) "
+                "ORDER BY telegram_id LIMIT ?",
+                (job['cursor'], limit)
+            )]
+            if not ids:
+                conn.execute("UPDATE BroadcastJobs SET status = 'sending' WHERE id = ?", (job_id,))
+                conn.commit()
+                return 0
+            content_id = f"broadcast:{job_id}"
+            conn.executemany(
+                "INSERT OR IGNORE INTO Outbox (telegram_id, content_id, text, priority) VALUES (?, ?, ?, ?)",
+                [(telegram_id, content_id, job['text'], priority) for telegram_id in ids]
+            )
+            conn.execute(
+                "UPDATE BroadcastJobs SET cursor = ?, enqueued = enqueued + ? WHERE id = ?",
+                (ids[-1], len(ids), job_id)
+            )
+            conn.commit()
+            metrics.OUTBOX_PENDING.inc(len(ids))
+            return len(ids)
+        finally:
+            conn.close()
+
+    def refresh_broadcast_job(self, job_id):
+        """Prešteje poslana/neuspela iz Outbox; ko ni več čakajočih, je job 'done'."""
+        conn = self.get_connection()
+        try:
+            counts = dict(conn.execute(
+                "SELECT status, COUNT(*) FROM Outbox WHERE content_id = ? GROUP BY status", (f"broadcast:{job_id}",)
+            ).fetchall())
+            open_count = counts.get('pending', 0) + counts.get('sending', 0)
+            conn.execute("""
+                UPDATE BroadcastJobs SET
+                    sent = ?, failed = ?,
+                    status = CASE WHEN status = 'sending' AND ? = 0 THEN 'done' ELSE status END,
+                    finished_at = CASE WHEN status = 'sending' AND ? = 0
+                        THEN strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime') ELSE finished_at END
+                WHERE id = ? AND status IN ('enqueuing', 'sending')
+            """, (counts.get('sent', 0), counts.get('failed', 0), open_count, open_count, job_id))
+            conn.commit()
+            return open_count
+        finally:
+            conn.close()
+
+    def get_broadcast_jobs(self, limit=5, active_only=False):
+        conn = self.get_connection()
+        try:
+            where = "WHERE status IN ('enqueuing', 'sending')" if active_only else ""
+            rows = conn.execute(
+                f"SELECT * FROM BroadcastJobs {where} ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            conn.close()
+
+    def cancel_broadcast_job(self, job_id):
+        """Ustavi job; še neposlana sporočila se odstranijo iz Outbox. Vrne število odstranjenih."""
+        conn = self.get_connection()
+        try:
+            updated = conn.execute(
+                "UPDATE BroadcastJobs SET status = 'cancelled', "
+                "finished_at = strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime') "
+                "WHERE id = ? AND status IN ('enqueuing', 'sending')", (job_id,)
+            ).rowcount
+            removed = conn.execute(
+                "DELETE FROM Outbox WHERE content_id = ? AND status = 'pending'", (f"broadcast:{job_id}",)
+            ).rowcount
+            conn.commit()
+            metrics.OUTBOX_PENDING.dec(removed)
+            return removed if updated else None
+        finally:
+            conn.close()
+
+    # --- PHOTO CACHE (glej photo_cache.py) ---
+
+    def get_photo_file_id(self, content_id, photo_url):
+        """file_id za sliko oglasa, če je bila že poslana (in je URL slike enak)."""
+        conn = self.get_connection()
+        try:
+            row = conn.execute(
+                "SELECT file_id FROM PhotoCache WHERE content_id = ? AND photo_url = ?", (content_id, photo_url)
+            ).fetchone()
+            return row['file_id'] if row else None
+        finally:
+            conn.close()
+
+    def save_photo_file_id(self, content_id, photo_url, file_id):
+        conn = self.get_connection()
+        try:
+            conn.execute("""
+                INSERT INTO PhotoCache (content_id, photo_url, file_id) VALUES (?, ?, ?)
+                ON CONFLICT(content_id) DO UPDATE SET
+                    photo_url = excluded.photo_url,
+                    file_id = excluded.file_id,
+                    last_used_at = strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime')
+            """, (content_id, photo_url, file_id))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def touch_photo_cache(self, hits):
+        """hits: {content_id: število uporab} - en zapis na paket namesto UPDATE na vsako sporočilo."""
+        if not hits:
+            return
+        conn = self.get_connection()
+        try:
+            conn.executemany("""
+                UPDATE PhotoCache
+                SET hits = hits + ?, last_used_at = strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime')
+                WHERE content_id = ?
+            """, [(count, content_id) for content_id, count in hits.items()])
+            conn.commit()
+        finally:
+            conn.close()
+
+    def delete_photo_file_id(self, content_id):
+        conn = self.get_connection()
+        try:
+            conn.execute("DELETE FROM PhotoCache WHERE content_id = ?", (content_id,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def cleanup_photo_cache(self, days=14, max_rows=50000):
+        """Odstrani neuporabljene (starejše od `days`) in nad `max_rows` najdlje neuporabljene."""
+        conn = self.get_connection()
+        try:
+            count = conn.execute(
+                "DELETE FROM PhotoCache WHERE last_used_at < strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime', ?)",
+                (f'-{days} days',)
+            ).rowcount
+            count += conn.execute("""
+                DELETE FROM PhotoCache WHERE content_id IN (
+                    SELECT content_id FROM PhotoCache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (max_rows,)).rowcount
+            conn.commit()
+            print(f"[DB] PhotoCache čiščenje: odstranjenih {count} file_id zapisov.")
+            return count
+        finally:
+            conn.close()
+
+    # --- CYCLE TRACE (glej tracing.py) ---
+
+    def save_cycle_trace(self, rows):
+        """rows: (cycle_id, kind, stage, detail, calls, total_ms, self_ms, max_ms) - en batch na cikel."""
+        conn = self.get_connection()
+        try:
+            conn.executemany("""
+                INSERT INTO CycleTrace (cycle_id, kind, stage, detail, calls, total_ms, self_ms, max_ms)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            conn.commit()
+            return len(rows)
+        finally:
+            conn.close()
+
+    def get_cycle_traces(self, kind="scrape", cycles=20):
+        """Vse vrstice zadnjih `cycles` ciklov vrste `kind` (za tracing.summarize)."""
+        conn = self.get_read_connection()
+        try:
+            rows = conn.execute("""
+                SELECT cycle_id, stage, detail, calls, total_ms, self_ms, max_ms
+                FROM CycleTrace
+                WHERE kind = ? AND cycle_id IN (
+                    SELECT DISTINCT cycle_id FROM CycleTrace WHERE kind = ? ORDER BY cycle_id DESC LIMIT ?
+                )
+            """, (kind, kind, cycles)).fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            conn.close()
+
+    def cleanup_cycle_traces(self, days=14):
+        conn = self.get_connection()
+        try:
+            count = conn.execute(
+                "DELETE FROM CycleTrace WHERE created_at < strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime', ?)",
+                (f'-{days} days',)
+            ).rowcount
+            conn.commit()
+            print(f"[DB] CycleTrace čiščenje: odstranjenih {count} zapisov.")
+            return count
+        finally:
+            conn.close()
+
+    # --- SLOW QUERY LOG (glej query_log.py) ---
+
+    def flush_slow_queries(self):
+        """Agregat stavkov iz pomnilnika (QUERY_LOG) v SlowQueries. Vrne število stavkov."""
+        rows = QUERY_LOG.drain()
+        if not rows:
+            return 0
+        # Navadna povezava: zapis agregata se ne šteje med merjene stavke
+        conn = sqlite3.connect(self.db_name)
+        try:
+            conn.executemany("""
+                INSERT INTO SlowQueries (statement, calls, total_ms, max_ms, slow_calls, params_shape, plan, full_scan)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(statement) DO UPDATE SET
+                    calls = calls + excluded.calls,
+                    total_ms = total_ms + excluded.total_ms,
+                    max_ms = MAX(max_ms, excluded.max_ms),
+                    slow_calls = slow_calls + excluded.slow_calls,
+                    params_shape = COALESCE(excluded.params_shape, params_shape),
+                    plan = COALESCE(excluded.plan, plan),
+                    full_scan = CASE WHEN excluded.plan IS NULL THEN full_scan ELSE excluded.full_scan END,
+                    last_seen_at = strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime')
+            """, rows)
+            conn.commit()
+            return len(rows)
+        finally:
+            conn.close()
+
+    def get_slow_queries(self, limit=10, order="total"):
+        """Najdražji stavki: order = "total" (skupni čas), "max" ali "slow" (število počasnih klicev)."""
+        column = {"total": "total_ms", "max": "max_ms", "slow": "slow_calls"}.get(order, "total_ms")
+        conn = self.get_read_connection(allow_snapshot=False)
+        try:
+            rows = conn.execute(f"""
+                SELECT statement, calls, total_ms, max_ms, slow_calls, params_shape, plan, full_scan,
+                       first_seen_at, last_seen_at
+                FROM SlowQueries ORDER BY {column} DESC LIMIT ?
+            """, (limit,)).fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            conn.close()
+
+    def reset_slow_queries(self):
+        QUERY_LOG.drain()
+        conn = self.get_connection()
+        try:
+            count = conn.execute("DELETE FROM SlowQueries").rowcount
+            conn.commit()
+            return count
+        finally:
+            conn.close()
+
     # 2. Metoda za aktivacijo paketa
     def update_user_subscription(self, telegram_id, pkg_type, max_urls, interval, days_to_add):
         """Podaljša naročnino tako, da prišteje dni k obstoječemu datumu."""
@@ -983,6 +1907,7 @@ class Database:
         }
 
 
+    @traced("db")
     def get_pending_urls(self):
         conn = self.get_connection()
         conn.row_factory = sqlite3.Row
@@ -1155,6 +2080,24 @@ class Database:
         conn.close()
 
 
+    def set_tracking_digest(self, telegram_id, digest, url_id=None):
+        """
+        Način obveščanja za iskanja uporabnika: digest 1/0, None = po paketu.
+        url_id=None nastavi vsa iskanja. Vrne število spremenjenih iskanj.
+        """
+        conn = self.get_connection()
+        try:
+            if url_id is None:
+                cursor = conn.execute("UPDATE Tracking SET digest = ? WHERE telegram_id = ?", (digest, telegram_id))
+            else:
+                cursor = conn.execute(
+                    "UPDATE Tracking SET digest = ? WHERE telegram_id = ? AND url_id = ?", (digest, telegram_id, url_id)
+                )
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            conn.close()
+
     def get_user_urls_with_status(self, telegram_id):
         """Vrne URL-je z oznako, ali so aktivni ali zamrznjeni zaradi limita."""
         conn = self.get_connection()
@@ -1234,6 +2177,7 @@ class Database:
             conn.close()
 
     
+    @traced("db")
     def is_ad_new(self, content_id):
         conn = self.get_connection()
         # Preverimo, če oglas že obstaja v tabeli SentAds (zgodovina vseh poslanih)
@@ -1241,6 +2185,7 @@ class Database:
         conn.close()
         return res is None
     
+    @traced("db")
     def is_first_scan(self, url_id):
         """Preveri, če je bil ta URL že kdaj uspešno poskeniran."""
         conn = self.get_connection()
@@ -1249,6 +2194,7 @@ class Database:
         conn.close()
         return res is None
 
+    @traced("db")
     def bulk_add_sent_ads(self, url_id, content_ids):
         """Označi oglase kot že poslane za vse uporabnike, ki sledijo temu URL-ju."""
         conn = self.get_connection()
@@ -1298,6 +2244,7 @@ class Database:
 
 
 
+    @traced("db")
     def update_url_fail_count(self, url_id):
         conn = self.get_connection()
         c = conn.cursor()
@@ -1307,6 +2254,7 @@ class Database:
         conn.close()
         return res[0] if res else 0
 
+    @traced("db")
     def reset_url_fail_count(self, url_id):
         conn = self.get_connection()
         c = conn.cursor()
@@ -1315,6 +2263,7 @@ class Database:
         conn.close()
 
 
+    @traced("db")
     def get_newly_failed_urls(self):
         """Vrne seznam URL-jev in njihovih lastnikov, ki so ravnokar dosegli 3 napake."""
         conn = self.get_connection()
@@ -1334,6 +2283,7 @@ class Database:
         return [dict(row) for row in rows]
     
 
+    @traced("db")
     def get_market_data_by_id(self, content_id):
         """Poišče oglas v arhivu MarketData po ID-ju (normalizes an_ prefix)."""
         conn = self.get_connection()
@@ -1347,7 +2297,18 @@ class Database:
         
         res = c.execute("SELECT * FROM MarketData WHERE content_id = ?", (normalized_id,)).fetchone()
         conn.close()
-        return dict(res) if res else None
+        if res:
+            return dict(res)
+
+        # Ni v vroči bazi -> mogoče je že v hladnem arhivu
+        return self.market_archive().get(normalized_id)
+
+    def market_archive(self):
+        """Lazy MarketArchive za to bazo (en objekt na instanco, da se deli cache blokov)."""
+        if getattr(self, '_market_archive', None) is None:
+            from market_archive import MarketArchive
+            self._market_archive = MarketArchive(self)
+        return self._market_archive
 
     def get_scraped_data_by_content_id(self, content_id):
         """Check if ad already exists in ScrapedData."""
@@ -1365,6 +2326,7 @@ class Database:
         conn.close()
         return res is not None
 
+    @traced("db")
     def insert_market_data(self, data, raw_snippet=None):
         """Shrani oglas v splošni arhiv trga za ML analitiko."""
         import json
@@ -1415,22 +2377,26 @@ class Database:
                 # CLEAN schema (after clean_marketdata_schema.py migration)
                 # Normalize field names from both Avtonet (ime_avta, cena) and Bolha (title, price)
                 price = data.get('price') or data.get('cena')
-                c.execute("""
-                    INSERT OR IGNORE INTO MarketData (
-                        content_id, source, category, price, link,
-                        snippet_data, enriched, enriched_json, url_id
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    content_id,
-                    data.get('source', 'avtonet'),
-                    data.get('category', 'car'),
-                    price,
-                    data.get('link'),
-                    snippet_data_json,
-                    data.get('enriched', 0),
-                    data.get('enriched_json'),
-                    data.get('url_id')
-                ))
+                values = {
+                    'content_id': content_id,
+                    'source': data.get('source', 'avtonet'),
+                    'category': data.get('category', 'car'),
+                    'price': price,
+                    'link': data.get('link'),
+                    'snippet_data': snippet_data_json,
+                    'enriched': data.get('enriched', 0),
+                    'enriched_json': data.get('enriched_json'),
+                }
+                # title / url_id obstajata samo v nekaterih različicah sheme (init_db ju nima oba)
+                if 'title' in columns:
+                    values['title'] = data.get('title') or data.get('ime_avta')
+                if 'url_id' in columns:
+                    values['url_id'] = data.get('url_id')
+                c.execute(
+                    f"INSERT OR IGNORE INTO MarketData ({', '.join(values)}) "
+                    f"VALUES ({', '.join(':' + name for name in values)})",
+                    values
+                )
             else:
                 # OLD schema (before clean_marketdata_schema.py)
                 c.execute("""
@@ -1457,16 +2423,245 @@ class Database:
                 ))
             
             conn.commit()
-            conn.close()
         except Exception as e:
             print(f"❌ [DB ERROR] MarketData insert: {e}")
+            conn.rollback()
+        finally:
             conn.close()
-            conn.commit()
-        except Exception as e:
-            print(f"❌ [DB ERROR] MarketData insert: {e}")
+
+    def search_market_data(self, model=None, year_min=None, year_max=None, km_max=None,
+                           price_min=None, price_max=None, fuel=None, kw_min=None,
+                           location=None, source=None, limit=50, include_archive=True):
+        """
+        Iskanje po arhivu trga preko generiranih stolpcev (brez json.loads v Pythonu).
+        Primer: search_market_data(model="Audi A4", year_min=2015, km_max=150000, price_max=15000)
+        `model` je prefiks naslova (case-insensitive, uporabi idx_market_model).
+        include_archive: vključi tudi hladni arhiv (MarketArchiveIndex ima iste stolpce).
+        """
+        where = []
+        params = []
+        if model:
+            where.append("model LIKE ?")
+            params.append(f"{model}%")
+        if year_min is not None:
+            where.append("reg_year >= ?")
+            params.append(int(year_min))
+        if year_max is not None:
+            where.append("reg_year <= ?")
+            params.append(int(year_max))
+        if km_max is not None:
+            where.append("mileage_km <= ?")
+            params.append(int(km_max))
+        if price_min is not None:
+            where.append("price_eur >= ?")
+            params.append(int(price_min))
+        if price_max is not None:
+            where.append("price_eur <= ?")
+            params.append(int(price_max))
+        if fuel:
+            where.append("fuel_type = ?")
+            params.append(fuel)
+        if kw_min is not None:
+            where.append("power_kw >= ?")
+            params.append(int(kw_min))
+        if location:
+            where.append("location LIKE ?")
+            params.append(f"%{location}%")
+        if source:
+            where.append("source = ?")
+            params.append(source)
+
+        select = """
+            SELECT content_id, source, model, price_eur, reg_year, mileage_km,
+                   power_kw, fuel_type, location, link, created_at, {archived} AS archived
+            FROM {table}
+        """
+        where_sql = (" WHERE " + " AND ".join(where)) if where else ""
+        query = select.format(archived=0, table="MarketData") + where_sql
+        if include_archive:
+            query += " UNION ALL " + select.format(archived=1, table="MarketArchiveIndex") + where_sql
+            query = f"SELECT * FROM ({query})"
+            params = params + params
+        query += " ORDER BY price_eur IS NULL, price_eur ASC LIMIT ?"
+        params.append(int(limit))
+
+        conn = self.get_read_connection()
+        try:
+            rows = conn.execute(query, params).fetchall()
+            return [dict(r) for r in rows]
+        finally:
+            conn.close()
+
+    # --- MARKET DATA: FULL-TEXT ISKANJE (FTS5) ---
+
+    # remove_diacritics 2: "cevapcici" najde "čevapčiči" (in obratno), tudi č/š/ž/ć/đ
+    MARKET_FTS_TOKENIZER = "unicode61 remove_diacritics 2"
+
+    def _market_fts_exprs(self, columns, row=""):
+        """Vrne (title, body) SQL izraza za vrstico MarketData (row="new." v triggerjih)."""
+        title = self._market_pick(columns, 'title', 'ime_avta', '$.ime_avta', '$.title', row=row)
+        body_parts = [
+            self._market_pick(columns, '$.description', '$.opis', row=row),
+            self._market_pick(columns, '$.lokacija', '$.location', row=row),
+            self._market_pick(columns, 'gorivo', '$.gorivo', row=row),
+            self._market_pick(columns, 'motor', '$.motor', row=row),
+        ]
+        body = " || ' ' || ".join(f"COALESCE({part}, '')" for part in body_parts)
+        return f"COALESCE({title}, '')", body
+
+    def ensure_market_fts(self, cursor=None, schema=None):
+        """
+        Ustvari MarketDataFTS (rowid = MarketData.rowid) + triggerje za sinhronizacijo.
+        Ob prvem zagonu napolni indeks iz obstoječih vrstic.
+        """
+        own_conn = None
+        if cursor is None:
+            own_conn = self.get_connection()
+            cursor = own_conn.cursor()
+        try:
+            schema = schema or self.market_schema(cursor)
+            exists = cursor.execute(
+                f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = 'MarketDataFTS'"
+            ).fetchone()
+            if not exists:
+                try:
+                    cursor.execute(f"""
+                        CREATE VIRTUAL TABLE {schema}.MarketDataFTS USING fts5(
+                            content_id UNINDEXED, title, body,
+                            tokenize = '{self.MARKET_FTS_TOKENIZER}',
+                            prefix = '2 3'
+                        )
+                    """)
+                except sqlite3.OperationalError as e:
+                    print(f"⚠️ [DB] FTS5 ni na voljo ({e}) - iskanje po besedilu onemogočeno.")
+                    return
+
+            cursor.execute(f"PRAGMA {schema}.table_info(MarketData)")
+            columns = {col[1] for col in cursor.fetchall()}
+            new_title, new_body = self._market_fts_exprs(columns, row="new.")
+
+            # Triggerji se ob spremembi sheme (migracija) ustvarijo na novo
+            cursor.execute(f"DROP TRIGGER IF EXISTS {schema}.market_fts_ai")
+            cursor.execute(f"DROP TRIGGER IF EXISTS {schema}.market_fts_ad")
+            cursor.execute(f"DROP TRIGGER IF EXISTS {schema}.market_fts_au")
+            cursor.execute(f"""
+                CREATE TRIGGER {schema}.market_fts_ai AFTER INSERT ON MarketData BEGIN
+                    INSERT INTO MarketDataFTS (rowid, content_id, title, body)
+                    VALUES (new.rowid, new.content_id, {new_title}, {new_body});
+                END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER {schema}.market_fts_ad AFTER DELETE ON MarketData BEGIN
+                    DELETE FROM MarketDataFTS WHERE rowid = old.rowid;
+                END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER {schema}.market_fts_au AFTER UPDATE ON MarketData BEGIN
+                    DELETE FROM MarketDataFTS WHERE rowid = old.rowid;
+                    INSERT INTO MarketDataFTS (rowid, content_id, title, body)
+                    VALUES (new.rowid, new.content_id, {new_title}, {new_body});
+                END
+            """)
+
+            if not exists:
+                self.rebuild_market_fts(cursor)
+            if own_conn:
+                own_conn.commit()
+        finally:
+            if own_conn:
+                own_conn.close()
+
+    def rebuild_market_fts(self, cursor=None):
+        """Ponovno zgradi FTS indeks iz MarketData (npr. po migraciji sheme)."""
+        own_conn = None
+        if cursor is None:
+            own_conn = self.get_connection()
+            cursor = own_conn.cursor()
+        try:
+            cursor.execute("PRAGMA table_info(MarketData)")
+            columns = {col[1] for col in cursor.fetchall()}
+            title, body = self._market_fts_exprs(columns)
+            cursor.execute("DELETE FROM MarketDataFTS")
+            cursor.execute(f"""
+                INSERT INTO MarketDataFTS (rowid, content_id, title, body)
+                SELECT rowid, content_id, {title}, {body} FROM MarketData
+            """)
+            print(f"🔎 [DB] FTS indeks zgrajen ({cursor.rowcount} oglasov).")
+            if own_conn:
+                own_conn.commit()
+        finally:
+            if own_conn:
+                own_conn.close()
+
+    @staticmethod
+    def build_fts_query(text):
+        """
+        Uporabniški vnos -> varna FTS5 poizvedba.
+        Vsaka beseda gre v narekovaje (brez FTS sintakse) in je prefiks, ker so
+        slovenske besede sklonjene: "garaz" najde "garaža", "garažo", "garaži".
+        "audi a4 avant" -> '"audi"* "a4"* "avant"*'
+        """
+        import re
+        words = re.findall(r"\w+", text or "", flags=re.UNICODE)
+        if not words:
+            return None
+        return " ".join(f'"{w}"*' for w in words)
+
+    def search_market_text(self, text, limit=20, source=None, highlight=("<b>", "</b>"), order="recent"):
+        """
+        Full-text iskanje po MarketData (naslov + opis).
+        order="recent": najnovejši najprej (FTS5 bere indeks po rowid in se ustavi pri LIMIT)
+        order="rank":   bm25 relevanca (izračuna oceno za VSE zadetke - počasneje pri pogostih besedah)
+        `hit` vsebuje izsek besedila z zadetki, ovitimi v `highlight` oznake.
+        """
+        match = self.build_fts_query(text)
+        if not match:
+            return []
+
+        from market_archive import ARCHIVE_ROWID_BASE
+
+        # Pozitiven rowid = vroča vrstica MarketData, negativen = hladni arhiv
+        query = """
+            SELECT f.rowid AS fts_rowid, f.content_id, f.title AS fts_title,
+                   snippet(MarketDataFTS, -1, ?, ?, '…', 12) AS hit
+            FROM MarketDataFTS f
+            WHERE MarketDataFTS MATCH ?
+        """
+        params = [highlight[0], highlight[1], match]
+        if source:
+            query += """ AND COALESCE(
+                (SELECT source FROM MarketData WHERE rowid = f.rowid),
+                (SELECT source FROM MarketArchiveIndex WHERE id = f.rowid + ?)
+            ) = ?"""
+            params.extend([ARCHIVE_ROWID_BASE, source])
+        query += " ORDER BY f.rank LIMIT ?" if order == "rank" else " ORDER BY f.rowid DESC LIMIT ?"
+        params.append(int(limit))
+
+        conn = self.get_read_connection()
+        try:
+            hits = [dict(r) for r in conn.execute(query, params).fetchall()]
+            hot_ids = [h['fts_rowid'] for h in hits if h['fts_rowid'] > 0]
+            hot = {}
+            if hot_ids:
+                placeholders = ",".join("?" * len(hot_ids))
+                for r in conn.execute(
+                    f"SELECT rowid AS fts_rowid, * FROM MarketData WHERE rowid IN ({placeholders})", hot_ids
+                ).fetchall():
+                    hot[r['fts_rowid']] = dict(r)
         finally:
             conn.close()
 
+        cold = self.market_archive().get_by_fts_rowids([h['fts_rowid'] for h in hits if h['fts_rowid'] < 0])
+
+        results = []
+        for h in hits:
+            row = hot.get(h['fts_rowid']) or cold.get(h['fts_rowid'])
+            if row is None:
+                continue
+            row.update(h)
+            results.append(row)
+        return results
+
     def mark_enriched(self, content_id, enriched_json):
         """Označi oglas kot obdelan (enriched=1), shrani JSON rezultat, in posodobi updated_at."""
         conn = self.get_connection()
@@ -1489,7 +2684,7 @@ class Database:
 
     def fetch_unenriched(self, limit=50, offset=0):
         """Vrne najstarejše neobdelane zapise za obogatitev."""
-        conn = self.get_connection()
+        conn = self.get_read_connection(allow_snapshot=False)
         conn.row_factory = sqlite3.Row
         c = conn.cursor()
         rows = c.execute(
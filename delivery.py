@@ -0,0 +1,314 @@
+"""
+Dostava obvestil iz Outbox tabele.
+
+Scrape cikel (main.check_for_new_ads) obvestil ne pošilja več sam: oblikovana
+sporočila vpiše v Outbox (Database.enqueue_notifications) in se takoj vrne.
+DeliveryWorker jih nato pošilja ločeno:
+
+- obvestila prevzame po paketih (status 'sending'), vsako je označeno kot
+  'sent' takoj po uspešnem klicu; ob restartu se v vrsto vrnejo samo
+  nedostavljena -> nič se ne izgubi in nič se ne pošlje dvakrat,
+- različni chati se pošiljajo vzporedno (OUTBOX_CONCURRENCY), znotraj
+  enega chata po vrsti; hitrost določa rate_limiter (globalno ~30/s,
+  na chat ~1/s), ne fiksni sleep,
+- RetryAfter limiter obdela sam (pavza + ponovni poskus); druge začasne
+  napake (omrežje, timeout) -> ponovni poskus z eksponentnim backoffom,
+- trajne napake (uporabnik blokiral bota, chat ne obstaja) ali preveč
+  poskusov -> status 'failed' z razlogom v last_error,
+- slika oglasa se na Telegram naloži enkrat, ostali prejemniki dobijo
+  file_id iz photo_cache.PhotoCache.
+
+Pred vpisom v Outbox plan_deliveries() v pomnilniku odstrani podvojene
+oglase istega uporabnika (prekrivajoča se iskanja, isti oglas na dveh URL-jih)
+in jih razvrsti po paketu uporabnika (ULTRA najprej). plan_digests() nato
+uporabnikom v digest načinu več oglasov cikla združi v eno sporočilo/album
+(DataManager.render_digest) - en klic API-ja namesto enega na oglas.
+
+    worker = DeliveryWorker(db)
+    application.job_queue.run_repeating(worker.job, interval=2)
+"""
+import asyncio
+import json
+import random
+from collections import OrderedDict
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+
+import metrics
+from photo_cache import PhotoCache, largest_file_id
+from rate_limiter import get_rate_limiter
+from tracing import CycleTrace, traced
+from utils import config_value
+
+
+# Prioriteta dostave po paketu (višja = prej); ostali paketi 0
+DELIVERY_PRIORITY = {"ULTRA": 4, "VIP": 3, "PRO": 2, "BASIC": 1, "SOLO": 1}
+
+
+def plan_deliveries(rows, subscription_types, priorities=None, seen=None):
+    """
+    Načrt dostave za cikel (v pomnilniku, pred kakršnimkoli pošiljanjem).
+
+    rows: vrstice iz DataManager.check_new_offers (ena na oglas + sledilca)
+    subscription_types: {telegram_id: paket} (Database.get_subscription_types)
+
+    Vrne (načrt, duplikati): največ ena vrstica na (uporabnik, oglas)
+    - oglas je isti, če se ujema content_id ALI link - razvrščeno po prioriteti
+    paketa, znotraj iste prioritete v prvotnem vrstnem redu (najnovejši najprej).
+    Vsaka vrstica dobi ključ 'priority'. Duplikate je treba vpisati v SentAds,
+    sicer bi se (npr. z drugim content_id za isti link) vrnili naslednji cikel.
+
+    seen: skupen set med klici, ko se cikel planira po kosih (duplikat iz
+    prejšnjega kosa se prepozna tudi v naslednjem).
+    """
+    priorities = priorities or config_value("DELIVERY_PRIORITY", DELIVERY_PRIORITY)
+    seen = set() if seen is None else seen
+    plan = []
+    duplicates = []
+    for row in rows:
+        user = row['target_user_id']
+        keys = [(user, 'id', row.get('content_id'))]
+        if row.get('link'):
+            keys.append((user, 'link', row['link'].split('#')[0].rstrip('/')))
+        if any(key in seen for key in keys):
+            duplicates.append(row)
+            continue
+        seen.update(keys)
+        row['priority'] = priorities.get(subscription_types.get(user), 0)
+        plan.append(row)
+    # sort je stabilen: znotraj iste prioritete ostane vrstni red iz check_new_offers
+    plan.sort(key=lambda r: -r['priority'])
+    return plan, duplicates
+
+
+def digest_enabled(row, subscription_type, packages=None):
+    """Tracking.digest 1/0 velja; NULL -> po paketu (DIGEST_PACKAGES)."""
+    if row.get('digest') is not None:
+        return bool(row['digest'])
+    packages = packages if packages is not None else config_value("DIGEST_PACKAGES", ())
+    return subscription_type in packages
+
+
+def plan_digests(plan, subscription_types, min_ads=None):
+    """
+    Razdeli načrt cikla na posamezna obvestila in zbirna (digest).
+
+    Vrne (posamezna, {telegram_id: [vrstice]}). Uporabnik dobi digest samo,
+    če ima v ciklu vsaj `min_ads` (DIGEST_MIN_ADS) oglasov iz iskanj v digest
+    načinu; pri enem ali dveh oglasih ostane običajno obvestilo s sliko.
+    """
+    min_ads = int(min_ads or config_value("DIGEST_MIN_ADS", 3))
+    packages = config_value("DIGEST_PACKAGES", ())
+    candidates = {}
+    for row in plan:
+        user = row['target_user_id']
+        if digest_enabled(row, subscription_types.get(user), packages):
+            candidates.setdefault(user, []).append(row)
+
+    digests = {user: rows for user, rows in candidates.items() if len(rows) >= min_ads}
+    if not digests:
+        return plan, {}
+    grouped = {id(row) for rows in digests.values() for row in rows}
+    return [row for row in plan if id(row) not in grouped], digests
+
+
+# BadRequest sporočila, pri katerih ponovni poskus nima smisla
+PERMANENT_BAD_REQUESTS = ("chat not found", "user is deactivated", "peer_id_invalid", "bot was blocked")
+
+
+def classify_error(error):
+    """Vrne ('retry', zamik_ali_None) ali ('fail', None)."""
+    if isinstance(error, RetryAfter):
+        retry_after = error.retry_after
+        seconds = retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else retry_after
+        return "retry", float(seconds) + 1
+    if isinstance(error, Forbidden):
+        return "fail", None
+    if isinstance(error, BadRequest):
+        message = str(error).lower()
+        if any(reason in message for reason in PERMANENT_BAD_REQUESTS):
+            return "fail", None
+        return "retry", None
+    if isinstance(error, (TimedOut, NetworkError)):
+        return "retry", None
+    return "retry", None
+
+
+class DeliveryWorker:
+    def __init__(self, db, concurrency=None, batch_size=None, max_attempts=None,
+                 base_delay=None, max_delay=None, limiter=None, photo_cache=None):
+        self.db = db
+        self.limiter = limiter or get_rate_limiter()
+        self.photos = photo_cache or PhotoCache(db)
+        # Toliko chatov hkrati; dejansko hitrost omejuje limiter
+        self.concurrency = int(concurrency or config_value("OUTBOX_CONCURRENCY", 30))
+        self.batch_size = int(batch_size or config_value("OUTBOX_BATCH_SIZE", 300))
+        self.max_attempts = int(max_attempts or config_value("OUTBOX_MAX_ATTEMPTS", 6))
+        self.base_delay = float(base_delay or config_value("OUTBOX_RETRY_BASE", 5))
+        self.max_delay = float(max_delay or config_value("OUTBOX_RETRY_MAX", 900))
+        self._lock = asyncio.Lock()
+
+    def backoff(self, attempts):
+        """Eksponentni backoff z jitterjem: base * 2^(n-1), omejen z max_delay."""
+        delay = min(self.max_delay, self.base_delay * (2 ** max(0, attempts - 1)))
+        return delay * random.uniform(0.8, 1.2)
+
+    async def job(self, context):
+        """Callback za job_queue (run_repeating / run_once)."""
+        await self.drain(context)
+
+    async def drain(self, context):
+        """
+        Pošilja, dokler je v vrsti kaj zapadlega. Vzporedni klici (job + run_once
+        po ciklu) se ne podvajajo - drugi se takoj vrne.
+        Vrne (poslano, ponovno_v_vrsti, neuspelo).
+        """
+        if self._lock.locked():
+            return 0, 0, 0
+        totals = [0, 0, 0]
+        trace = CycleTrace("delivery")
+        async with self._lock:
+            with trace:
+                while True:
+                    batch = await asyncio.to_thread(self.db.claim_outbox, self.batch_size)
+                    if not batch:
+                        break
+                    sent, retried, failed = await self._send_batch(context, batch)
+                    totals[0] += sent
+                    totals[1] += retried
+                    totals[2] += failed
+        if any(totals):
+            print(f"📬 [OUTBOX] Poslano: {totals[0]} | ponovno v vrsti: {totals[1]} | neuspelo: {totals[2]}")
+            # Prazni prehodi (vsakih OUTBOX_POLL_INTERVAL s) se ne zapisujejo
+            await asyncio.to_thread(trace.flush, self.db)
+        return tuple(totals)
+
+    async def _send_batch(self, context, batch):
+        # Po chatih: vrstni red znotraj chata ostane, različni chati tečejo vzporedno
+        by_chat = OrderedDict()
+        for item in batch:
+            by_chat.setdefault(item['telegram_id'], []).append(item)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        outcome = {"sent": 0, "retry": 0, "fail": 0}
+        metrics.OUTBOX_IN_FLIGHT.inc(len(batch))
+
+        async def deliver_chat(items):
+            async with semaphore:
+                for item in items:
+                    try:
+                        await self.send(context, item)
+                    except Exception as e:
+                        action = await self._handle_error(item, e)
+                        outcome[action] += 1
+                        continue
+                    # Takoj po uspehu, ne ob koncu batcha: po crashu/preklicu reset_outbox_inflight
+                    # vrne v vrsto samo tista, ki res niso bila dostavljena
+                    await asyncio.to_thread(self.db.mark_outbox_sent, [item['id']])
+                    outcome["sent"] += 1
+
+        try:
+            await asyncio.gather(*(deliver_chat(items) for items in by_chat.values()))
+        finally:
+            metrics.OUTBOX_IN_FLIGHT.dec(len(batch))
+            metrics.DELIVERIES.inc(outcome["sent"], result="sent")
+            metrics.DELIVERIES.inc(outcome["retry"], result="retry")
+            metrics.DELIVERIES.inc(outcome["fail"], result="failed")
+            metrics.OUTBOX_PENDING.dec(outcome["sent"] + outcome["fail"])
+        await self.photos.flush()
+        return outcome["sent"], outcome["retry"], outcome["fail"]
+
+    @traced("send", detail=lambda self, context, item: f"chat {item['telegram_id']} / {item.get('content_id')}")
+    async def send(self, context, item):
+        """Slika s tekstom (fallback na tekst), napake gredo naprej."""
+        chat_id = item['telegram_id']
+        media = json.loads(item['media']) if item.get('media') else None
+        if media:
+            try:
+                await self.send_album(context, item, media)
+                return
+            except (RetryAfter, Forbidden):
+                raise
+            except Exception as album_err:
+                print(f"⚠️ Napaka pri albumu ({item.get('content_id')}): {album_err}. Pošiljam samo tekst...")
+
+        photo = item.get('photo_url')
+        if photo and photo.startswith('http'):
+            try:
+                await self.send_photo(context, item, photo)
+                return
+            except (RetryAfter, Forbidden):
+                raise
+            except Exception as img_err:
+                print(f"⚠️ Napaka pri sliki (ID:{item.get('content_id')}): {img_err}. Poskušam samo tekst...")
+
+        from telegram_bot import send_message
+        await self.limiter.call(
+            chat_id,
+            send_message,
+            context,
+            chat_id=chat_id,
+            text=item['text'],
+            parse_mode="HTML",
+            disable_web_page_preview=True,
+            raise_errors=True
+        )
+
+    async def send_album(self, context, item, photos):
+        """Digest kot album (sendMediaGroup): napis z vsemi oglasi na prvi sliki."""
+        from telegram import InputMediaPhoto
+        media = [
+            InputMediaPhoto(photo, caption=item['text'], parse_mode="HTML") if index == 0 else InputMediaPhoto(photo)
+            for index, photo in enumerate(photos[:10])
+        ]
+        await self.limiter.call(item['telegram_id'], context.bot.send_media_group, chat_id=item['telegram_id'], media=media)
+
+    async def send_photo(self, context, item, photo):
+        """Po file_id iz predpomnilnika, sicer po URL (in shrani dobljeni file_id)."""
+        chat_id = item['telegram_id']
+        content_id = item.get('content_id')
+
+        async def send(photo_ref):
+            return await self.limiter.call(
+                chat_id,
+                context.bot.send_photo,
+                chat_id=chat_id,
+                photo=photo_ref,
+                caption=item['text'],
+                parse_mode="HTML"
+            )
+
+        if not content_id:
+            await send(photo)
+            return
+
+        file_id, owner = await self.photos.get(content_id, photo)
+        if file_id:
+            try:
+                await send(file_id)
+                return
+            except BadRequest as e:
+                # npr. "wrong file identifier" - pozabimo file_id in pošljemo po URL
+                print(f"⚠️ [PHOTO] file_id za {content_id} zavrnjen ({e}) - pošiljam po URL.")
+                await self.photos.invalidate(content_id)
+                owner = True
+
+        file_id = None
+        try:
+            message = await send(photo)
+            file_id = largest_file_id(message)
+        finally:
+            if owner:
+                await self.photos.end_upload(content_id, photo, file_id)
+
+    async def _handle_error(self, item, error):
+        action, delay = classify_error(error)
+        if action == "retry" and item['attempts'] < self.max_attempts:
+            delay = delay if delay is not None else self.backoff(item['attempts'])
+            await asyncio.to_thread(self.db.mark_outbox_retry, item['id'], error, delay)
+            print(f"🔁 [OUTBOX] {item['telegram_id']} / {item.get('content_id')}: {error} "
+                  f"- poskus {item['attempts']}/{self.max_attempts}, znova čez {delay:.0f}s")
+            return "retry"
+        await asyncio.to_thread(self.db.mark_outbox_failed, item['id'], error)
+        print(f"❌ [OUTBOX] Dostava {item['telegram_id']} / {item.get('content_id')} dokončno neuspela: {error}")
+        return "fail"
@@ -10,12 +10,19 @@ from scraper.avtonet.master_crawler import run_master_crawler_once
 from telegram_bot import start_command, list_command, add_url_command, remove_url_command, info_command, activate_user, \
     deactivate_user, admin_stats_command, admin_help_command, broadcast_command, list_users_admin, admin_logs_command, \
     health_command, check_user_command, proxy_stats_command, packages_command, help_command, post_init, server_status_command, \
-    admin_overview_command, send_dm_command, add_url_user_command, button_callback_handler, admin_errors_command, send_message
+    admin_overview_command, send_dm_command, add_url_user_command, button_callback_handler, admin_errors_command, send_message, \
+    search_command, digest_command, broadcast_status_command, broadcast_cancel_command, broadcasts, perf_command, slow_command
+
+from delivery import DeliveryWorker, digest_enabled, plan_deliveries, plan_digests
 
 from dotenv import load_dotenv
-import os
 import datetime
+import hashlib
+import itertools
 import pytz
+import config
+import metrics
+import tracing
 
 import logging
 
@@ -57,6 +64,7 @@ from config import (
     DEV_MODE,
 )
 
+@tracing.traced_cycle("scrape", lambda: Database(DB_PATH))
 async def check_for_new_ads(context: telegram.ext.ContextTypes.DEFAULT_TYPE, send_notifications=True):
     def get_time():
         return datetime.datetime.now().strftime('%H:%M:%S')
@@ -65,18 +73,18 @@ async def check_for_new_ads(context: telegram.ext.ContextTypes.DEFAULT_TYPE, sen
     
     db = Database(DB_PATH)
     
-    # Clear previous cycle's ScrapedData snapshot (VPS behavior)
-    db.clear_scraped_snapshot()
-    
-    pending_urls = db.get_pending_urls()
+    # Vsi klici SQLite tečejo v threadu - handlerji med ciklom ne čakajo na bazo
+    pending_urls = await asyncio.to_thread(db.get_pending_urls)
     
     # V razvojnem načinu procesujem samo svoje URL-je (ADMIN_ID)
     if TEST_BOT or DEV_MODE:
         admin_id_int = int(ADMIN_ID)
         pending_urls = [u for u in pending_urls if u.get('telegram_id') == admin_id_int]
+    metrics.PENDING_URLS.set(len(pending_urls))
     
     if not pending_urls:
         print(f"{B_BLUE}[{get_time()}] IDLE - Noben URL še ni na vrsti.{B_END}")
+        tracing.discard()
         return
 
     pending_ids = [u['url_id'] for u in pending_urls]
@@ -94,10 +102,13 @@ async def check_for_new_ads(context: telegram.ext.ContextTypes.DEFAULT_TYPE, sen
     
     manager = DataManager(db)
 
+    # Staging tega cikla: scraperji vrnejo vrstice, ki gredo direktno v check_new_offers
+    staged = []
+
     # Avtonet obdelava (obstoječa logika)
     if avtonet_urls:
         scraper = Scraper(DataBase=db)
-        await asyncio.to_thread(scraper.run, avtonet_urls)
+        staged.extend(await asyncio.to_thread(scraper.run, avtonet_urls))
     
     # Bolha obdelava (paralelno za vsak URL)
     if bolha_urls:
@@ -110,14 +121,16 @@ async def check_for_new_ads(context: telegram.ext.ContextTypes.DEFAULT_TYPE, sen
                 ads = await asyncio.to_thread(bolha_scraper.run_with_pagination, url_entry['url'])
                 if ads:
                     print(f"[{get_time()}] BOLHA - Najdeno {len(ads)} oglasov, shranjevanje...")
-                    await asyncio.to_thread(bolha_scraper.save_ads_to_scraped_data, ads, url_entry['url_id'])
+                    return await asyncio.to_thread(bolha_scraper.stage_ads, ads, url_entry['url_id'])
             except Exception as e:
                 print(f"[{get_time()}] ❌ BOLHA napaka za URL ID {url_entry['url_id']}: {e}")
+            return []
         
         # Izvrši vse Bolha URL-je paralelno
-        await asyncio.gather(*[process_bolha_url(url) for url in bolha_urls]) 
+        for bolha_staged in await asyncio.gather(*[process_bolha_url(url) for url in bolha_urls]):
+            staged.extend(bolha_staged)
     
-    failed_ones = db.get_newly_failed_urls()
+    failed_ones = await asyncio.to_thread(db.get_newly_failed_urls)
     for f in failed_ones:
         t_id = f['telegram_id']
         u_id = f['url_id']
@@ -133,75 +146,182 @@ async def check_for_new_ads(context: telegram.ext.ContextTypes.DEFAULT_TYPE, sen
         try:
             await send_message(context, chat_id=t_id, text=user_msg, parse_mode="HTML")
             await send_message(context, chat_id=ADMIN_ID, text=f"🚨 POKVARJEN LINK: {u_name} ({t_id})", parse_mode="HTML")
-            db.update_url_fail_count(u_id) 
+            await asyncio.to_thread(db.update_url_fail_count, u_id)
         except:
             pass
 
-    novi_oglasi = manager.check_new_offers(filter_url_ids=pending_ids)
-    
-    if not novi_oglasi:
-        print(f"{B_BLUE}[{get_time()}] INFO - Ni novih oglasov za te skene.{B_END}")
-        return
+    # Generator - vrstice pridejo po kosih, pošiljanje začne takoj ob prvem kosu
+    novi_oglasi = manager.check_new_offers(staged, filter_url_ids=pending_ids)
 
     # On startup, mark as sent but don't send notifications
     if not send_notifications:
-        for oglas in novi_oglasi:
-            db.add_sent_ad(oglas['target_user_id'], oglas['content_id'])
-        print(f"{B_YELLOW}[{get_time()}] STARTUP - Silent check: {len(novi_oglasi)} ads indexed and marked for this user, notifications skipped.{B_END}")
+        def mark_all_sent():
+            indexed = 0
+            batch = []
+            for oglas in novi_oglasi:
+                batch.append((oglas['target_user_id'], oglas['content_id']))
+                if len(batch) >= 500:
+                    db.add_sent_ads(batch)
+                    indexed += len(batch)
+                    batch = []
+            if batch:
+                db.add_sent_ads(batch)
+                indexed += len(batch)
+            return indexed
+
+        indexed = await asyncio.to_thread(mark_all_sent)
+
+        if not indexed:
+            print(f"{B_BLUE}[{get_time()}] INFO - Ni novih oglasov za te skene.{B_END}")
+            return
+        print(f"{B_YELLOW}[{get_time()}] STARTUP - Silent check: {indexed} ads indexed and marked for this user, notifications skipped.{B_END}")
         return
 
-    print(f"{B_YELLOW}[{get_time()}] SEND - Pošiljam {len(novi_oglasi)} novih obvestil...{B_END}")
-
-    for oglas in novi_oglasi:
-        chat_id = oglas['target_user_id']
-        tekst = manager.format_telegram_message(oglas)
-        # Try both slika_url (Avtonet) and image_url (Bolha)
-        slika = oglas.get("slika_url") or oglas.get("image_url")
+    # Načrt dostave po kosih generatorja (check_new_offers bere s fetchmany, cikel ni nikoli
+    # cel v pomnilniku): duplikati se prepoznajo prek skupnega `seen`, vrstni red po paketu
+    # (ULTRA najprej) pa zagotovi Outbox (claim_outbox: priority DESC). V pomnilniku ostanejo
+    # samo vrstice uporabnikov v digest načinu - digest potrebuje vse njihove oglase cikla.
+    def enqueue_offers(oglasi):
+        """Posamezna obvestila -> Outbox (po 200); isti oglas se oblikuje enkrat (render cache)."""
+        vpisanih = 0
+        batch = []
+        for oglas in oglasi:
+            rendered = manager.render_offer(oglas)
+            batch.append({
+                'telegram_id': oglas['target_user_id'],
+                'content_id': oglas['content_id'],
+                'text': rendered['text'],
+                'photo_url': rendered['photo_url'],
+                'priority': oglas['priority'],
+            })
+            if len(batch) >= 200:
+                vpisanih += db.enqueue_notifications(batch)
+                batch = []
+        if batch:
+            vpisanih += db.enqueue_notifications(batch)
+        return vpisanih
+
+    def enqueue_digests(digesti):
+        """Več oglasov istega uporabnika -> eno sporočilo/album namesto N."""
+        album = getattr(config, "DIGEST_STYLE", "text") == "album"
+        max_items = int(getattr(config, "DIGEST_MAX_ADS", 10))
+        oglasov = 0
+        batch = []
+        for telegram_id, oglasi in digesti.items():
+            for chunk in manager.render_digest(oglasi, album=album, max_items=max_items):
+                content_ids = chunk['content_ids']
+                batch.append({
+                    'telegram_id': telegram_id,
+                    'content_id': "digest:" + hashlib.sha1("|".join(map(str, content_ids)).encode()).hexdigest()[:16],
+                    'text': chunk['text'],
+                    'photo_url': None,
+                    # album potrebuje vsaj 2 sliki, sicer gre kot tekst
+                    'media': chunk['photos'] if album and len(chunk['photos']) >= 2 else None,
+                    'priority': max(o['priority'] for o in oglasi),
+                    'sent_content_ids': content_ids,
+                })
+                oglasov += len(content_ids)
+        print(f"{B_BLUE}[{get_time()}] DIGEST - {oglasov} oglasov v {len(batch)} zbirnih obvestilih "
+              f"({len(digesti)} uporabnikov){B_END}")
+        return db.enqueue_notifications(batch)
+
+    # Obvestila gredo v Outbox (trajno, skupaj z SentAds), pošilja jih delivery.DeliveryWorker
+    najdeno = 0
+    podvojenih = 0
+    paketi, seen, kandidati = {}, set(), []
+
+    def plan_chunk():
+        """En kos generatorja: dedup + vpis posameznih obvestil. None, ko je generator prazen."""
+        with tracing.span("dedup"):
+            kos = list(itertools.islice(novi_oglasi, 200))
+            if not kos:
+                return None
+            novi_uporabniki = {v['target_user_id'] for v in kos} - paketi.keys()
+            if novi_uporabniki:
+                paketi.update(db.get_subscription_types(novi_uporabniki))
+            nacrt, duplikati = plan_deliveries(kos, paketi, seen=seen)
+            if duplikati:
+                db.add_sent_ads([(d['target_user_id'], d['content_id']) for d in duplikati])
+            posamezni = []
+            for oglas in nacrt:
+                if digest_enabled(oglas, paketi.get(oglas['target_user_id'])):
+                    kandidati.append(oglas)
+                else:
+                    posamezni.append(oglas)
+        return enqueue_offers(posamezni), len(duplikati)
+
+    while True:
+        # Generator (fetchmany), planiranje in vpis v Outbox tečejo v threadu, kos za kosom
+        rezultat = await asyncio.to_thread(plan_chunk)
+        if rezultat is None:
+            break
+        najdeno += rezultat[0]
+        podvojenih += rezultat[1]
+
+    if podvojenih:
+        print(f"{B_BLUE}[{get_time()}] PLAN - {podvojenih} podvojenih oglasov odstranjenih "
+              f"(prekrivajoča se iskanja){B_END}")
+
+    # Digest način: uporabnik z manj kot DIGEST_MIN_ADS oglasi dobi običajna obvestila
+    with tracing.span("dedup"):
+        posamezni, digesti = plan_digests(kandidati, paketi)
+    if digesti:
+        najdeno += await asyncio.to_thread(enqueue_digests, digesti)
+    najdeno += await asyncio.to_thread(enqueue_offers, posamezni)
+
+    if not najdeno:
+        print(f"{B_BLUE}[{get_time()}] INFO - Ni novih oglasov za te skene.{B_END}")
+        return
 
-        try:
-            # --- VARNO POŠILJANJE S FALLBACKOM ---
-            success = False
-            if slika and slika.startswith('http'):
-                try:
-                    await context.bot.send_photo(
-                        chat_id=chat_id, 
-                        photo=slika, 
-                        caption=tekst, 
-                        parse_mode="HTML"
-                    )
-                    success = True
-                except Exception as img_err:
-                    print(f"⚠️ Napaka pri sliki (ID:{oglas['content_id']}): {img_err}. Poskušam samo tekst...")
-            
-            # Če slike ni ali pa je pošiljanje slike spodletelo
-            if not success:
-                await send_message(
-                    context,
-                    chat_id=chat_id, 
-                    text=tekst, 
-                    parse_mode="HTML", 
-                    disable_web_page_preview=True
-                )
-            
-            db.add_sent_ad(chat_id, oglas['content_id'])
-            await asyncio.sleep(0.5) 
-            
-        except Exception as e:
-            print(f"[{get_time()}] ❌ Kritična napaka pri pošiljanju uporabniku {chat_id}: {e}")
+    # Dostava takoj, ne šele ob naslednjem intervalu workerja
+    delivery_worker = context.application.bot_data.get("delivery_worker")
+    if delivery_worker:
+        context.job_queue.run_once(delivery_worker.job, when=0)
 
-    print(f"{B_GREEN}[{get_time()}] --- [ CIKEL KONČAN: Uspešno poslano ] ---{B_END}")
+    print(f"{B_GREEN}[{get_time()}] --- [ CIKEL KONČAN: {najdeno} obvestil v vrsti za pošiljanje ] ---{B_END}")
 
 
 async def daily_maintenance(context: telegram.ext.ContextTypes.DEFAULT_TYPE):
     print(f"\n{B_YELLOW}--- [ DNEVNO VZDRŽEVANJE BAZE ] ---{B_END}")
-    db = Database(os.getenv("DB_PATH"))
-    db.cleanup_sent_ads(days=14)
+    db = Database(DB_PATH)
+    # Čiščenje (veliki DELETE-i) v threadu, da event loop ne čaka na SQLite
+    await asyncio.to_thread(db.cleanup_sent_ads, days=14)
+    await asyncio.to_thread(db.cleanup_outbox, days=7)
+    await asyncio.to_thread(db.cleanup_photo_cache, days=14)
+    await asyncio.to_thread(db.cleanup_cycle_traces, days=14)
+
+    # Online backup po korakih (v threadu - handlerji in scraper med tem delajo naprej)
+    try:
+        from backup_manager import BackupManager
+        await asyncio.to_thread(BackupManager(db.db_name).run)
+        if db.market_db:
+            await asyncio.to_thread(BackupManager(db.market_db).run)
+    except Exception as e:
+        print(f"❌ [BACKUP] Napaka pri backupu: {e}")
+
+    # Stari oglasi iz MarketData -> stisnjeni segmenti (v threadu, da ne blokira bota)
+    try:
+        archived = await asyncio.to_thread(db.market_archive().run)
+        stats = await asyncio.to_thread(db.market_archive().stats)
+        print(f"🧊 [ARCHIVE] Preseljenih danes: {archived} | "
+              f"skupaj v arhivu: {stats['archived']} ({stats['bytes'] / (1024 * 1024):.1f} MB, {stats['segments']} segmentov)")
+    except Exception as e:
+        print(f"❌ [ARCHIVE] Napaka pri arhiviranju MarketData: {e}")
+
+    # Market baza ima svoj WAL: po arhiviranju (veliko brisanj) ga skrajšamo
+    if db.market_db:
+        try:
+            busy, log_pages, done = await asyncio.to_thread(db.checkpoint, "market", "TRUNCATE")
+            print(f"🧹 [DB] Market WAL checkpoint: {done}/{log_pages} strani{' (zasedeno)' if busy else ''}")
+        except Exception as e:
+            print(f"❌ [DB] Market checkpoint ni uspel: {e}")
+
     print(f"{B_GREEN}--- [ VZDRŽEVANJE KONČANO ] ---{B_END}")
 
 
 async def check_subscription_expirations(context: telegram.ext.ContextTypes.DEFAULT_TYPE):
     db = Database(DB_PATH)
-    expiring_users = db.get_users_for_expiry_reminder()
+    expiring_users = await asyncio.to_thread(db.get_users_for_expiry_reminder)
     
     for user in expiring_users:
         t_id = user['telegram_id']
@@ -218,7 +338,7 @@ async def check_subscription_expirations(context: telegram.ext.ContextTypes.DEFA
         
         try:
             await send_message(context, chat_id=t_id, text=msg, parse_mode="HTML")
-            db.set_expiry_reminder_sent(t_id) # Označi v bazi, da ne pošljemo še enkrat
+            await asyncio.to_thread(db.set_expiry_reminder_sent, t_id) # Označi v bazi, da ne pošljemo še enkrat
             print(f"[SYSTEM] Poslano opozorilo o poteku uporabniku {t_id}")
         except Exception as e:
             print(f"Napaka pri pošiljanju opomina uporabniku {t_id}: {e}")
@@ -230,7 +350,7 @@ async def check_subscription_expirations(context: telegram.ext.ContextTypes.DEFA
     now_str = datetime.datetime.now().strftime("%d.%m.%Y %H:%M:%S")
     
     # --- 1. DEL: OPOMNIKI (24 ur prej) ---
-    expiring_soon = db.get_users_for_expiry_reminder()
+    expiring_soon = await asyncio.to_thread(db.get_users_for_expiry_reminder)
     for user in expiring_soon:
         t_id = user['telegram_id']
         msg = (
@@ -242,11 +362,11 @@ async def check_subscription_expirations(context: telegram.ext.ContextTypes.DEFA
         )
         try:
             await send_message(context, chat_id=t_id, text=msg, parse_mode="HTML")
-            db.set_expiry_reminder_sent(t_id)
+            await asyncio.to_thread(db.set_expiry_reminder_sent, t_id)
         except: pass
 
     # --- 2. DEL: DEJANSKI POTEK (Final Goodbye) ---
-    expired_ids = db.get_newly_expired_users()
+    expired_ids = await asyncio.to_thread(db.get_newly_expired_users)
     for t_id in expired_ids:
         msg = (
             "🚫 <b>NAROČNINA JE POTEKLA</b>\n\n"
@@ -256,7 +376,7 @@ async def check_subscription_expirations(context: telegram.ext.ContextTypes.DEFA
         )
         try:
             await send_message(context, chat_id=t_id, text=msg, parse_mode="HTML")
-            db.deactivate_user_after_expiry(t_id)
+            await asyncio.to_thread(db.deactivate_user_after_expiry, t_id)
             print(f"[SYSTEM] Uporabnik {t_id} je bil deaktiviran (potek naročnine).")
         except Exception as e:
             print(f"Napaka pri deaktivaciji uporabnika {t_id}: {e}")
@@ -270,7 +390,20 @@ def main():
 
     # Nastavitev bota
     # Uporabimo defaults, da ne pišemo parse_mode v vsak klic
-    application = telegram.ext.Application.builder().token(TOKEN).post_init(post_init).build()
+    builder = telegram.ext.Application.builder().token(TOKEN).post_init(post_init)
+    # Lokalni Bot API (npr. benchmarks/fake_telegram.py za obremenitvene teste)
+    api_base_url = getattr(config, "TELEGRAM_API_BASE_URL", None)
+    if api_base_url:
+        builder = builder.base_url(api_base_url).base_file_url(
+            getattr(config, "TELEGRAM_API_FILE_URL", api_base_url.replace("/bot", "/file/bot"))
+        )
+        print(f"🧪 Telegram API: {api_base_url}")
+    # Webhook: posodobitve se obdelujejo vzporedno (počasen handler ne zadrži ostalih)
+    webhook = getattr(config, "WEBHOOK_ENABLED", False)
+    concurrent = getattr(config, "CONCURRENT_UPDATES", 32 if webhook else None)
+    if concurrent:
+        builder = builder.concurrent_updates(concurrent)
+    application = builder.build()
 
     # --- REGISTRACIJA HANDLERJEV ---
     
@@ -283,6 +416,8 @@ def main():
 
     application.add_handler(telegram.ext.CommandHandler("help", help_command))
     application.add_handler(telegram.ext.CommandHandler("packages", packages_command))
+    application.add_handler(telegram.ext.CommandHandler("search", search_command))
+    application.add_handler(telegram.ext.CommandHandler("digest", digest_command))
 
     application.add_handler(CallbackQueryHandler(button_callback_handler))
 
@@ -293,8 +428,12 @@ def main():
     application.add_handler(telegram.ext.CommandHandler("admin_stats", admin_stats_command))
     application.add_handler(telegram.ext.CommandHandler("admin", admin_help_command))
     application.add_handler(telegram.ext.CommandHandler("broadcast", broadcast_command))
+    application.add_handler(telegram.ext.CommandHandler("broadcast_status", broadcast_status_command))
+    application.add_handler(telegram.ext.CommandHandler("broadcast_cancel", broadcast_cancel_command))
     application.add_handler(telegram.ext.CommandHandler("users", list_users_admin))
     application.add_handler(telegram.ext.CommandHandler("health", health_command))
+    application.add_handler(telegram.ext.CommandHandler("perf", perf_command))
+    application.add_handler(telegram.ext.CommandHandler("slow", slow_command))
     application.add_handler(telegram.ext.CommandHandler("check_user", check_user_command))
     application.add_handler(telegram.ext.CommandHandler("proxy_stats", proxy_stats_command))
     application.add_handler(telegram.ext.CommandHandler("admin_overview", admin_overview_command))
@@ -319,6 +458,27 @@ def main():
     
     application.job_queue.run_once(first_check, when=10)
 
+    # Dostava obvestil iz Outbox (ločeno od scrape cikla, z retry/backoff)
+    requeued = db.reset_outbox_inflight()
+    if requeued:
+        print(f"📬 [OUTBOX] {requeued} nedokončanih obvestil vrnjenih v vrsto.")
+    delivery_worker = DeliveryWorker(db)
+    application.bot_data["delivery_worker"] = delivery_worker
+
+    # Metrike (Prometheus, GET /metrics): Outbox gauge se začne s stanjem ob zagonu,
+    # nato ga posodabljata vpis v Outbox in worker - endpoint sam ne bere baze
+    outbox = db.get_outbox_stats()
+    metrics.OUTBOX_PENDING.set(outbox.get('pending', 0))
+    metrics.watch_rate_limiter(delivery_worker.limiter)
+    metrics.start_server()
+    application.job_queue.run_repeating(
+        delivery_worker.job, interval=float(getattr(config, "OUTBOX_POLL_INTERVAL", 2)), first=5
+    )
+    # Nedokončani broadcasti se po restartu nadaljujejo od kurzorja
+    application.job_queue.run_repeating(
+        broadcasts.job, interval=float(getattr(config, "BROADCAST_POLL_INTERVAL", 10)), first=5
+    )
+
     # Master crawler (MarketData-only cache warmer)
     if ENABLE_MASTER_CRAWLER:
         async def master_job(context: telegram.ext.ContextTypes.DEFAULT_TYPE):
@@ -336,10 +496,37 @@ def main():
     # Preverja in obvesti Uporabnika če se njegov paket nasledni dan zaključi
     application.job_queue.run_repeating(check_subscription_expirations, interval=3600, first=60)
 
+    # Agregat SQL stavkov (query_log.py) -> SlowQueries, za /slow
+    async def slow_query_job(context: telegram.ext.ContextTypes.DEFAULT_TYPE):
+        try:
+            await asyncio.to_thread(db.flush_slow_queries)
+        except Exception as e:
+            print(f"❌ [SQL] Zapis agregata stavkov ni uspel: {e}")
+
+    application.job_queue.run_repeating(
+        slow_query_job, interval=int(getattr(config, "SLOW_QUERY_FLUSH_INTERVAL", 300)), first=120
+    )
+
+    # Analitični snapshot (opcijsko): poročila berejo iz kopije, ne iz produkcijske baze
+    if getattr(config, "ANALYTICS_SNAPSHOT", False):
+        async def analytics_snapshot_job(context: telegram.ext.ContextTypes.DEFAULT_TYPE):
+            try:
+                path = await asyncio.to_thread(db.refresh_analytics_snapshot)
+                print(f"📸 [ANALYTICS] Snapshot osvežen: {path}")
+            except Exception as e:
+                print(f"❌ [ANALYTICS] Osvežitev snapshota ni uspela: {e}")
+
+        interval = int(getattr(config, "ANALYTICS_SNAPSHOT_MAX_AGE", 900))
+        application.job_queue.run_repeating(analytics_snapshot_job, interval=interval, first=30)
+
     print("MarketPulse Bot je zagnan in čaka na nove oglase...")
     
-    # Zaženi bota
-    application.run_polling()
+    # Zaženi bota: webhook (lokalni ASGI strežnik, glej webhook.py) ali long polling
+    if webhook:
+        from webhook import run_webhook
+        asyncio.run(run_webhook(application))
+    else:
+        application.run_polling()
 
 if __name__ == "__main__":
     main()
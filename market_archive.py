@@ -0,0 +1,291 @@
+"""
+Tiered arhiv za MarketData.
+
+Oglasi starejši od MARKET_HOT_DAYS (privzeto 180 dni = "6-month retention" iz
+PRODUCTION_AUDIT.md) se preselijo iz vroče SQLite baze v stisnjene segmente:
+
+    market_archive/seg_20260101_030000.jsonl.gz
+
+Segment je append-only zaporedje gzip blokov (vsak blok ~500 JSON vrstic je
+samostojen gzip member - `zcat seg_*.jsonl.gz` deluje). V bazi ostane samo
+majhen indeks MarketArchiveIndex (content_id -> segment, offset, dolžina bloka,
+vrstica) + analitični stolpci (model, cena, letnik, km, kW, gorivo, lokacija),
+tako da search_market_data in /search še vedno vidita arhivirane oglase.
+
+FTS vrstice arhiviranih oglasov se prestavijo na negativen rowid
+(id - ARCHIVE_ROWID_BASE), zato full-text iskanje deluje tudi po arhivu.
+"""
+import datetime
+import gzip
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from utils import config_value
+
+# FTS rowid za arhivirane vrstice: id - BASE (vedno negativen, novejši arhiv = večji rowid)
+ARCHIVE_ROWID_BASE = 2 ** 62
+
+# Analitični stolpci, ki jih indeks kopira iz generiranih stolpcev MarketData
+INDEX_COLUMNS = ["model", "price_eur", "reg_year", "mileage_km", "power_kw", "fuel_type", "location"]
+
+# created_at je v bazi v dveh formatih: '2026-01-31 12:00:00' in '31.01.2026 12:00:00'
+CREATED_AT_ISO = (
+    "CASE WHEN created_at LIKE '__.__.____%' "
+    "THEN substr(created_at, 7, 4) || '-' || substr(created_at, 4, 2) || '-' || substr(created_at, 1, 2) "
+    "|| substr(created_at, 11) ELSE created_at END"
+)
+
+
+def ensure_archive_schema(cursor, schema="main"):
+    """Ustvari MarketArchiveIndex (kliče se iz Database.init_db; schema="market" pri ločeni bazi)."""
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS {schema}.MarketArchiveIndex (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        content_id TEXT UNIQUE NOT NULL,
+        source TEXT,
+        segment TEXT NOT NULL,          -- ime datoteke v arhivski mapi
+        block_offset INTEGER NOT NULL,  -- začetek gzip bloka v datoteki
+        block_length INTEGER NOT NULL,  -- dolžina stisnjenega bloka
+        line INTEGER NOT NULL,          -- vrstica znotraj bloka
+        model TEXT,
+        price_eur INTEGER,
+        reg_year INTEGER,
+        mileage_km INTEGER,
+        power_kw INTEGER,
+        fuel_type TEXT,
+        location TEXT,
+        link TEXT,
+        created_at TEXT,
+        archived_at TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime'))
+    )
+    """)
+    cursor.execute(
+        f"CREATE INDEX IF NOT EXISTS {schema}.idx_archive_model "
+        "ON MarketArchiveIndex (model COLLATE NOCASE, reg_year, mileage_km, price_eur)"
+    )
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {schema}.idx_archive_price ON MarketArchiveIndex (price_eur)")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {schema}.idx_archive_segment ON MarketArchiveIndex (segment)")
+
+
+class MarketArchive:
+    def __init__(self, db, archive_dir=None, block_rows=500, cache_blocks=64):
+        """
+        db: Database instanca (uporabljamo njen get_connection)
+        archive_dir: mapa za segmente (privzeto market_archive/ zraven baze)
+        """
+        self.db = db
+        if archive_dir is None:
+            archive_dir = config_value("MARKET_ARCHIVE_DIR", None)
+        if archive_dir is None:
+            base = os.path.dirname(os.path.abspath(db.db_name))
+            archive_dir = os.path.join(base, "market_archive")
+        self.archive_dir = archive_dir
+        self.block_rows = block_rows
+        self.cache_blocks = cache_blocks
+        self._block_cache = OrderedDict()
+        # iskanja tečejo vzporedno (to_thread, AsyncDatabase) - LRU spreminjamo samo pod zaklepom
+        self._block_lock = threading.Lock()
+
+    # --- BRANJE ---
+
+    def _read_block(self, segment, offset, length):
+        key = (segment, offset)
+        with self._block_lock:
+            cached = self._block_cache.get(key)
+            if cached is not None:
+                self._block_cache.move_to_end(key)
+                return cached
+
+        with open(os.path.join(self.archive_dir, segment), "rb") as f:
+            f.seek(offset)
+            raw = f.read(length)
+        lines = gzip.decompress(raw).decode("utf-8").splitlines()
+
+        # Branje in dekompresija sta izven zaklepa; dva sočasna zgrešena zadetka le prebereta blok dvakrat
+        with self._block_lock:
+            self._block_cache[key] = lines
+            self._block_cache.move_to_end(key)
+            while len(self._block_cache) > self.cache_blocks:
+                self._block_cache.popitem(last=False)
+        return lines
+
+    def _load(self, entry):
+        lines = self._read_block(entry["segment"], entry["block_offset"], entry["block_length"])
+        row = json.loads(lines[entry["line"]])
+        for col in INDEX_COLUMNS:
+            row.setdefault(col, entry.get(col))
+        row["archived"] = 1
+        return row
+
+    def get(self, content_id):
+        """Vrne arhiviran oglas kot dict (enako kot vrstica MarketData) ali None."""
+        rows = self.get_many([content_id])
+        return rows.get(content_id)
+
+    def get_many(self, content_ids):
+        """{content_id: dict} za vse najdene arhivirane oglase."""
+        content_ids = list(content_ids)
+        if not content_ids:
+            return {}
+        conn = self.db.get_read_connection(allow_snapshot=False)
+        try:
+            placeholders = ",".join("?" * len(content_ids))
+            entries = conn.execute(
+                f"SELECT * FROM MarketArchiveIndex WHERE content_id IN ({placeholders})", content_ids
+            ).fetchall()
+        finally:
+            conn.close()
+
+        result = {}
+        for entry in entries:
+            try:
+                result[entry["content_id"]] = self._load(dict(entry))
+            except (OSError, IndexError, ValueError) as e:
+                print(f"⚠️ [ARCHIVE] Ne morem prebrati {entry['content_id']} iz {entry['segment']}: {e}")
+        return result
+
+    def get_by_fts_rowids(self, rowids):
+        """{fts_rowid: dict} za negativne FTS rowid-je (glej ARCHIVE_ROWID_BASE)."""
+        ids = {rowid + ARCHIVE_ROWID_BASE: rowid for rowid in rowids if rowid < 0}
+        if not ids:
+            return {}
+        conn = self.db.get_read_connection(allow_snapshot=False)
+        try:
+            placeholders = ",".join("?" * len(ids))
+            entries = conn.execute(
+                f"SELECT id, content_id FROM MarketArchiveIndex WHERE id IN ({placeholders})", list(ids)
+            ).fetchall()
+        finally:
+            conn.close()
+        rows = self.get_many([e["content_id"] for e in entries])
+        return {ids[e["id"]]: rows[e["content_id"]] for e in entries if e["content_id"] in rows}
+
+    # --- ARHIVIRANJE ---
+
+    def run(self, hot_days=None, batch_size=5000, max_rows=None):
+        """
+        Preseli oglase starejše od `hot_days` v nov segment.
+        Vrne število arhiviranih oglasov.
+
+        Vrstni red je varen ob prekinitvi: najprej se blok zapiše in fsync-a,
+        šele nato se v ENI transakciji dodajo vrstice indeksa, premakne FTS in
+        izbrišejo vroče vrstice. Prekinitev pusti kvečjemu neuporabljen blok.
+        """
+        if hot_days is None:
+            hot_days = int(config_value("MARKET_HOT_DAYS", 180))
+        cutoff = (datetime.datetime.now() - datetime.timedelta(days=hot_days)).strftime("%Y-%m-%d %H:%M:%S")
+
+        os.makedirs(self.archive_dir, exist_ok=True)
+        segment = f"seg_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl.gz"
+        segment_path = os.path.join(self.archive_dir, segment)
+
+        conn = self.db.get_connection()
+        total = 0
+        try:
+            columns = [col[1] for col in conn.execute("PRAGMA table_info(MarketData)").fetchall()]
+            gen_columns = {col[1] for col in conn.execute("PRAGMA table_xinfo(MarketData)").fetchall()}
+            index_cols = [c for c in INDEX_COLUMNS if c in gen_columns]
+            # Pri MARKET_DB_PATH je FTS v pripeti "market" shemi - golo sqlite_master je samo main
+            schema = self.db.market_schema(conn)
+            has_fts = conn.execute(
+                f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = 'MarketDataFTS'"
+            ).fetchone() is not None
+            select_cols = ", ".join(["rowid AS _rowid"] + columns + index_cols)
+
+            while max_rows is None or total < max_rows:
+                limit = batch_size if max_rows is None else min(batch_size, max_rows - total)
+                rows = conn.execute(
+                    f"SELECT {select_cols} FROM MarketData WHERE ({CREATED_AT_ISO}) < ? "
+                    f"ORDER BY rowid LIMIT ?",
+                    (cutoff, limit),
+                ).fetchall()
+                if not rows:
+                    break
+
+                entries = self._write_blocks(segment_path, segment, rows, columns, index_cols)
+                self._commit_batch(conn, entries, has_fts, schema)
+                total += len(rows)
+                print(f"🧊 [ARCHIVE] {total} oglasov preseljenih v {segment}")
+        finally:
+            conn.close()
+
+        if total == 0 and os.path.exists(segment_path) and os.path.getsize(segment_path) == 0:
+            os.remove(segment_path)
+        return total
+
+    def _write_blocks(self, segment_path, segment, rows, columns, index_cols):
+        entries = []
+        with open(segment_path, "ab") as f:
+            for start in range(0, len(rows), self.block_rows):
+                block = rows[start:start + self.block_rows]
+                payload = "\n".join(
+                    json.dumps({c: r[c] for c in columns}, ensure_ascii=False, default=str) for r in block
+                ) + "\n"
+                compressed = gzip.compress(payload.encode("utf-8"), compresslevel=6)
+                offset = f.tell()
+                f.write(compressed)
+                for line, r in enumerate(block):
+                    entry = {
+                        "rowid": r["_rowid"],
+                        "content_id": r["content_id"],
+                        "source": r["source"] if "source" in columns else None,
+                        "segment": segment,
+                        "block_offset": offset,
+                        "block_length": len(compressed),
+                        "line": line,
+                        "link": r["link"] if "link" in columns else None,
+                        "created_at": r["created_at"] if "created_at" in columns else None,
+                    }
+                    for c in INDEX_COLUMNS:
+                        entry[c] = r[c] if c in index_cols else None
+                    entries.append(entry)
+            f.flush()
+            os.fsync(f.fileno())
+        return entries
+
+    def _commit_batch(self, conn, entries, has_fts, schema="main"):
+        cols = ["content_id", "source", "segment", "block_offset", "block_length", "line",
+                "link", "created_at"] + INDEX_COLUMNS
+        try:
+            for e in entries:
+                previous = conn.execute(
+                    "SELECT id FROM MarketArchiveIndex WHERE content_id = ?", (e["content_id"],)
+                ).fetchone()
+                if previous and has_fts:
+                    # Oglas je bil že arhiviran (ponovno dodan in spet star) - stara FTS vrstica gre stran
+                    conn.execute(f"DELETE FROM {schema}.MarketDataFTS WHERE rowid = ?", (previous[0] - ARCHIVE_ROWID_BASE,))
+                cur = conn.execute(
+                    f"INSERT OR REPLACE INTO MarketArchiveIndex ({', '.join(cols)}) "
+                    f"VALUES ({', '.join('?' * len(cols))})",
+                    [e[c] for c in cols],
+                )
+                if has_fts:
+                    # FTS vrstico prestavimo na arhivski rowid, preden jo delete trigger pobriše
+                    conn.execute(
+                        f"INSERT INTO {schema}.MarketDataFTS (rowid, content_id, title, body) "
+                        f"SELECT ?, content_id, title, body FROM {schema}.MarketDataFTS WHERE rowid = ?",
+                        (cur.lastrowid - ARCHIVE_ROWID_BASE, e["rowid"]),
+                    )
+            conn.executemany("DELETE FROM MarketData WHERE rowid = ?", [(e["rowid"],) for e in entries])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def stats(self):
+        """Kratek povzetek za admin/logiranje."""
+        conn = self.db.get_read_connection(allow_snapshot=False)
+        try:
+            archived = conn.execute("SELECT COUNT(*) FROM MarketArchiveIndex").fetchone()[0]
+            segments = conn.execute("SELECT COUNT(DISTINCT segment) FROM MarketArchiveIndex").fetchone()[0]
+        finally:
+            conn.close()
+        size = 0
+        if os.path.isdir(self.archive_dir):
+            size = sum(
+                os.path.getsize(os.path.join(self.archive_dir, f))
+                for f in os.listdir(self.archive_dir) if f.endswith(".jsonl.gz")
+            )
+        return {"archived": archived, "segments": segments, "bytes": size}
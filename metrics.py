@@ -0,0 +1,273 @@
+"""
+Metrike procesa v Prometheus tekstovnem formatu (brez dodatnih odvisnosti).
+
+Danes je vpogled v delovanje samo app_debug.log ali /health (poizvedbe v
+SQLite). Ta modul drži števce, gauge in histograme v pomnilniku; kodne poti
+jih posodabljajo sproti, lokalni HTTP endpoint pa jih samo izpiše:
+
+- GET /metrics ne izvede NOBENE poizvedbe v bazo - vse vrednosti so v
+  pomnilniku (callback gauge berejo samo stanje objektov, npr. rate limiter),
+- scraper: čas fetcha, bajti in statusi po hostu,
+- faze cikla: lastni čas spanov iz tracing.py (parse, db, ai, send, ...),
+  trajanje ciklov,
+- AI: latenca klica, porabljeni žetoni (usage), uspešni/neuspešni klici,
+- vrste: URL-ji na vrsti v zadnjem ciklu, obvestila v Outbox, čakanje na DB
+  executor, SQLite "database is locked/busy",
+- Telegram: poslano/ponovno/neuspelo, klici API-ja, RetryAfter, čakanje v
+  rate limiterju (hitrosti -> rate() v Prometheusu).
+
+V config.py:
+    METRICS_PORT = 9108          # None = endpoint izklopljen (metrike se še vedno zbirajo)
+    METRICS_LISTEN = "127.0.0.1"
+
+    curl -s http://127.0.0.1:9108/metrics
+"""
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils import config_value
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=(), function=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        # brez oznak: vrednost se prebere ob izpisu (samo stanje v pomnilniku)
+        self.function = function
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: pričakovane oznake {self.labelnames}, dobljene {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key, extra=None):
+        pairs = list(zip(self.labelnames, key)) + ([extra] if extra else [])
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def samples(self):
+        if self.function is not None:
+            try:
+                return [(self.name, self.function())]
+            except Exception:
+                return []
+        with self._lock:
+            return [(f"{self.name}{self._labels(key)}", value) for key, value in sorted(self._values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{name} {_fmt(value)}" for name, value in self.samples()]
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, name, help, labels=(), buckets=None):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets or self.DEFAULT_BUCKETS))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [števci po bucketih (+Inf na koncu), vsota, število]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(state[0]), state[1], state[2]) for key, state in sorted(self._values.items())]
+        samples = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket{self._labels(key, ('le', _fmt(float(bound))))}", cumulative))
+            samples.append((f"{self.name}_sum{self._labels(key)}", round(total, 6)))
+            samples.append((f"{self.name}_count{self._labels(key)}", count))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help, labels=(), function=None):
+        return self.register(Counter(name, help, labels, function))
+
+    def gauge(self, name, help, labels=(), function=None):
+        return self.register(Gauge(name, help, labels, function))
+
+    def histogram(self, name, help, labels=(), buckets=None):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+_STARTED = time.time()
+
+# --- scraper ---
+FETCH_SECONDS = REGISTRY.histogram("scraper_fetch_seconds", "Trajanje HTTP zahteve po hostu", ("host",))
+FETCH_BYTES = REGISTRY.counter("scraper_fetch_bytes_total", "Ocenjen prenešen promet po hostu", ("host",))
+FETCH_RESPONSES = REGISTRY.counter("scraper_fetch_responses_total", "Odgovori po hostu in statusu (0 = napaka omrežja)",
+                                   ("host", "status"))
+PENDING_URLS = REGISTRY.gauge("scrape_pending_urls", "URL-ji na vrsti v zadnjem scrape ciklu")
+
+# --- faze ciklov (tracing.py) ---
+CYCLE_SECONDS = REGISTRY.histogram("cycle_seconds", "Trajanje cikla (scrape, delivery)", ("kind",),
+                                   buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600))
+STAGE_SECONDS = REGISTRY.histogram("cycle_stage_self_seconds", "Lastni čas spana po fazi (brez gnezdenih spanov)",
+                                   ("stage",))
+
+# --- AI ---
+AI_SECONDS = REGISTRY.histogram("ai_request_seconds", "Latenca klica AI modela", buckets=(0.5, 1, 2, 4, 8, 15, 30))
+AI_REQUESTS = REGISTRY.counter("ai_requests_total", "Klici AI modela po izidu", ("result",))
+AI_TOKENS = REGISTRY.counter("ai_tokens_total", "Porabljeni žetoni (usage)", ("kind",))
+
+# --- baza ---
+DB_EXECUTOR_WAIT = REGISTRY.histogram("db_executor_wait_seconds", "Čakanje klica na prost DB executor (AsyncDatabase)",
+                                      buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5))
+SQLITE_BUSY = REGISTRY.counter("sqlite_busy_total", "SQLite 'database is locked/busy' napake")
+SQLITE_SLOW = REGISTRY.counter("sqlite_slow_queries_total", "Stavki nad SLOW_QUERY_MS (query_log.py)")
+
+# --- Outbox / Telegram ---
+OUTBOX_PENDING = REGISTRY.gauge("outbox_pending", "Obvestila v Outbox, ki še niso poslana ali dokončno neuspela")
+OUTBOX_IN_FLIGHT = REGISTRY.gauge("outbox_in_flight", "Prevzeta obvestila, ki se trenutno pošiljajo")
+DELIVERIES = REGISTRY.counter("telegram_deliveries_total", "Obvestila po izidu (sent, retry, failed)", ("result",))
+
+REGISTRY.gauge("process_uptime_seconds", "Čas od zagona procesa", function=lambda: round(time.time() - _STARTED, 1))
+
+
+def _rss_bytes():
+    import psutil
+    return psutil.Process().memory_info().rss
+
+
+REGISTRY.gauge("process_resident_memory_bytes", "RSS procesa", function=_rss_bytes)
+
+
+def is_sqlite_busy(error):
+    message = str(error).lower()
+    return "database is locked" in message or "database is busy" in message
+
+
+def count_sqlite_error(error):
+    if is_sqlite_busy(error):
+        SQLITE_BUSY.inc()
+
+
+def watch_rate_limiter(limiter):
+    """Števci iz TelegramRateLimiter.stats (klici API, RetryAfter, čakanje) - brez spremembe limiterja."""
+    stats = limiter.stats
+    REGISTRY.counter("telegram_api_calls_total", "Klici Telegram API skozi rate limiter",
+                     function=lambda: stats["calls"])
+    REGISTRY.counter("telegram_retry_after_total", "Telegram RetryAfter (429) odgovori",
+                     function=lambda: stats["retry_after"])
+    REGISTRY.counter("telegram_rate_wait_seconds_total", "Skupno čakanje v rate limiterju",
+                     function=lambda: round(stats["waited_s"], 3))
+
+
+def watch_executor(name, executor):
+    """Dolžina vrste ThreadPoolExecutorja (npr. AsyncDatabase)."""
+    REGISTRY.gauge(f"{name}_queue", f"Klici, ki čakajo v vrsti {name}", function=lambda: executor._work_queue.qsize())
+
+
+# --- HTTP endpoint ---
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_server(port=None, host=None, registry=REGISTRY):
+    """HTTP strežnik v daemon threadu; vrne server ali None, če METRICS_PORT ni nastavljen."""
+    port = port if port is not None else config_value("METRICS_PORT", None)
+    if port is None:
+        return None
+    host = host or config_value("METRICS_LISTEN", "127.0.0.1")
+    handler = type("BoundMetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, int(port)), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    print(f"📈 [METRICS] http://{host}:{server.server_address[1]}/metrics")
+    return server
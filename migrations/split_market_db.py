@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+SPLIT MARKETDATA INTO A SEPARATE DATABASE FILE
+==============================================
+Preseli MarketData (+ MarketDataFTS in MarketArchiveIndex) iz glavne baze v
+ločeno datoteko, ki jo Database priklopi kot shemo "market" (MARKET_DB_PATH).
+
+Zakaj: vroče tabele (Users, Tracking, Urls, SentAds, ScraperLogs) in velik,
+append-heavy MarketData si delijo en write lock, en WAL in en cache. Po
+razdelitvi masovni vpisi master crawlerja ne čakajo na dedup zapise v
+SentAds (in obratno), checkpointi in pragme pa so ločeni.
+
+Kaj naredi:
+- Online backup glavne baze (bot.db.backup.<timestamp>)
+- Kopira tabele z nespremenjenimi rowid-ji (FTS rowid = MarketData.rowid,
+  arhivirane FTS vrstice z negativnim rowid ostanejo veljavne)
+- Preveri število vrstic, šele nato pobriše tabele iz glavne baze
+- Ustvari triggerje/indekse v market bazi (Database.init_db)
+
+Pred zagonom ustavi bota. Po migraciji nastavi v config.py:
+    MARKET_DB_PATH = "market.db"
+
+Usage: python3 migrations/split_market_db.py <path_to_bot.db> <path_to_market.db> [--vacuum]
+"""
+
+import os
+import re
+import sqlite3
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Vrstni red je pomemben: FTS in indeks arhiva se sklicujeta na MarketData
+MARKET_TABLES = ["MarketData", "MarketDataFTS", "MarketArchiveIndex"]
+
+
+def backup_database(db_path):
+    """Konsistentna kopija tudi pri WAL bazi (online backup API)"""
+    from backup_manager import online_backup
+    backup_path = f"{db_path}.backup.{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    try:
+        online_backup(db_path, backup_path)
+        print(f"✅ Backup created: {backup_path}")
+        return backup_path
+    except Exception as e:
+        print(f"❌ Backup failed: {e}")
+        return None
+
+
+def table_exists(cursor, schema, name):
+    return cursor.execute(
+        f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone() is not None
+
+
+def copy_table(cursor, name):
+    """main.<name> -> market.<name> (ista shema, isti rowid-ji). Vrne število vrstic."""
+    sql = cursor.execute(
+        "SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone()[0]
+    create = re.sub(r"^(CREATE\s+(?:VIRTUAL\s+)?TABLE\s+)", r"\1market.", sql, count=1, flags=re.IGNORECASE)
+    cursor.execute(create)
+
+    # hidden=0: brez generiranih stolpcev in skritih FTS stolpcev (rank, ime tabele)
+    cursor.execute(f"PRAGMA main.table_xinfo({name})")
+    columns = ", ".join(f'"{col[1]}"' for col in cursor.fetchall() if col[6] == 0)
+    cursor.execute(f"INSERT INTO market.{name} (rowid, {columns}) SELECT rowid, {columns} FROM main.{name}")
+
+    # Dodatni indeksi (avtomatski imajo sql NULL); generirane stolpce/indekse doda še init_db
+    indexes = cursor.execute(
+        "SELECT sql FROM main.sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (name,)
+    ).fetchall()
+    for (index_sql,) in indexes:
+        cursor.execute(re.sub(
+            r"^(CREATE\s+(?:UNIQUE\s+)?INDEX\s+)", r"\1market.", index_sql, count=1, flags=re.IGNORECASE
+        ))
+
+    return cursor.execute(f"SELECT COUNT(*) FROM market.{name}").fetchone()[0]
+
+
+def main(db_path, market_path, vacuum=False):
+    print("=" * 70)
+    print("🔀 SPLITTING MARKETDATA INTO SEPARATE DATABASE")
+    print("=" * 70)
+    print(f"   main:   {db_path}")
+    print(f"   market: {market_path}")
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    cursor = conn.cursor()
+    cursor.execute("ATTACH DATABASE ? AS market", (market_path,))
+
+    if not table_exists(cursor, "main", "MarketData"):
+        if table_exists(cursor, "market", "MarketData"):
+            print("\n✅ MarketData je že v market bazi - nič za narediti.")
+            conn.close()
+            return 0
+        print("\n❌ MarketData ne obstaja v glavni bazi.")
+        conn.close()
+        return 1
+
+    existing = [name for name in MARKET_TABLES if table_exists(cursor, "market", name)]
+    if existing:
+        print(f"\n❌ Market baza že vsebuje {', '.join(existing)} - uporabi prazno datoteko.")
+        conn.close()
+        return 1
+
+    # 1. BACKUP
+    print("\n1️⃣  CREATING BACKUP...")
+    if not backup_database(db_path):
+        print("❌ Migration aborted")
+        conn.close()
+        return 1
+
+    try:
+        cursor.execute("PRAGMA market.journal_mode=WAL")
+
+        # 2. COPY
+        print("\n2️⃣  COPYING TABLES...")
+        cursor.execute("BEGIN")
+        counts = {}
+        for name in MARKET_TABLES:
+            if not table_exists(cursor, "main", name):
+                print(f"   ⏭️  {name} ne obstaja - preskakujem")
+                continue
+            copied = copy_table(cursor, name)
+            expected = cursor.execute(f"SELECT COUNT(*) FROM main.{name}").fetchone()[0]
+            if copied != expected:
+                raise RuntimeError(f"{name}: kopiranih {copied}, pričakovanih {expected}")
+            counts[name] = copied
+            print(f"   ✅ {name}: {copied} vrstic")
+        cursor.execute("COMMIT")
+
+        # 3. DROP FROM MAIN (triggerji in indeksi gredo s tabelo)
+        print("\n3️⃣  REMOVING TABLES FROM MAIN DATABASE...")
+        cursor.execute("BEGIN")
+        for name in reversed(MARKET_TABLES):
+            if name in counts:
+                cursor.execute(f"DROP TABLE main.{name}")
+                print(f"   🗑️  main.{name}")
+        cursor.execute("COMMIT")
+        cursor.execute("PRAGMA main.wal_checkpoint(TRUNCATE)")
+        if vacuum:
+            print("   Vacuuming main database...")
+            cursor.execute("VACUUM main")
+    except Exception as e:
+        if conn.in_transaction:
+            cursor.execute("ROLLBACK")
+        print(f"\n❌ MIGRATION FAILED: {e}")
+        import traceback
+        traceback.print_exc()
+        conn.close()
+        return 1
+    conn.close()
+
+    # 4. TRIGGERJI, GENERIRANI STOLPCI, INDEKSI v market bazi
+    print("\n4️⃣  PREPARING MARKET SCHEMA...")
+    from database import Database
+    Database(db_path, market_db=market_path).init_db()
+
+    print("\n" + "=" * 70)
+    print("✅ SPLIT COMPLETED!")
+    print("=" * 70)
+    print(f"\n📊 Summary:")
+    for name, count in counts.items():
+        print(f"   {name}: {count} vrstic -> {market_path}")
+    print(f"\n👉 Nastavi v config.py:  MARKET_DB_PATH = \"{market_path}\"  in ponovno zaženi bota.")
+    return 0
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if len(args) < 2:
+        print("Usage: python3 split_market_db.py <path_to_bot.db> <path_to_market.db> [--vacuum]")
+        sys.exit(1)
+
+    exit_code = main(args[0], args[1], vacuum="--vacuum" in sys.argv)
+    sys.exit(exit_code)
@@ -0,0 +1,102 @@
+"""
+Predpomnilnik Telegram file_id za slike oglasov.
+
+Ko isti oglas dobi več uporabnikov (prekrivajoča se iskanja), bi vsak
+send_photo(photo=url) prisilil Telegram, da sliko z avto.net/bolha prenese
+znova (počasno, včasih neuspešno -> fallback na tekst). Prvi uspešen
+send_photo vrne file_id; vsi naslednji prejemniki dobijo sliko po file_id
+brez prenosa.
+
+- LRU v pomnilniku (PHOTO_CACHE_SIZE) + trajno v tabeli PhotoCache (preživi restart)
+- sočasna pošiljanja istega oglasa počakajo na prvi upload (brez podvojenih prenosov)
+- zadetki se v bazo zapišejo paketno (flush), čiščenje v daily_maintenance
+"""
+import asyncio
+from collections import OrderedDict
+
+from utils import config_value
+
+
+class PhotoCache:
+    def __init__(self, db, capacity=None):
+        self.db = db
+        self.capacity = int(capacity or config_value("PHOTO_CACHE_SIZE", 5000))
+        self._lru = OrderedDict()      # content_id -> (photo_url, file_id)
+        self._inflight = {}            # content_id -> Future (prvi upload v teku)
+        self._hits = {}                # content_id -> zadetki od zadnjega flush
+        self.stats = {"hits": 0, "misses": 0, "uploads": 0, "invalidated": 0}
+
+    def _remember(self, content_id, photo_url, file_id):
+        self._lru[content_id] = (photo_url, file_id)
+        self._lru.move_to_end(content_id)
+        while len(self._lru) > self.capacity:
+            self._lru.popitem(last=False)
+
+    async def get(self, content_id, photo_url):
+        """
+        Vrne (file_id, owner). file_id=None in owner=True: klicatelj naj pošlje po URL
+        in nato pokliče end_upload(); ostali klicatelji za isti oglas medtem čakajo
+        na njegov rezultat (en prenos slike namesto N).
+        """
+        cached = self._lru.get(content_id)
+        if cached is not None and cached[0] == photo_url:
+            self._lru.move_to_end(content_id)
+            self._hit(content_id)
+            return cached[1], False
+
+        pending = self._inflight.get(content_id)
+        if pending is not None:
+            file_id = await asyncio.shield(pending)
+            if file_id:
+                self._hit(content_id)
+            return file_id, False
+
+        # Lastništvo prevzamemo PRED branjem iz baze, da sočasni klici že čakajo
+        self._inflight[content_id] = asyncio.get_running_loop().create_future()
+        try:
+            file_id = await asyncio.to_thread(self.db.get_photo_file_id, content_id, photo_url)
+        except Exception:
+            file_id = None
+        if file_id:
+            self._remember(content_id, photo_url, file_id)
+            self._hit(content_id)
+            self._resolve(content_id, file_id)
+            return file_id, False
+        self.stats["misses"] += 1
+        return None, True
+
+    def _hit(self, content_id):
+        self.stats["hits"] += 1
+        self._hits[content_id] = self._hits.get(content_id, 0) + 1
+
+    def _resolve(self, content_id, file_id):
+        pending = self._inflight.pop(content_id, None)
+        if pending is not None and not pending.done():
+            pending.set_result(file_id)
+
+    async def end_upload(self, content_id, photo_url, file_id):
+        """file_id=None pomeni neuspeh - čakajoči pošljejo po URL sami."""
+        self._resolve(content_id, file_id)
+        if file_id:
+            self.stats["uploads"] += 1
+            self._remember(content_id, photo_url, file_id)
+            await asyncio.to_thread(self.db.save_photo_file_id, content_id, photo_url, file_id)
+
+    async def invalidate(self, content_id):
+        """file_id, ki ga Telegram zavrne (npr. 'wrong file identifier')."""
+        self.stats["invalidated"] += 1
+        self._lru.pop(content_id, None)
+        self._hits.pop(content_id, None)
+        await asyncio.to_thread(self.db.delete_photo_file_id, content_id)
+
+    async def flush(self):
+        """Zapiše zbrane zadetke (hits, last_used_at) v bazo za LRU čiščenje."""
+        hits, self._hits = self._hits, {}
+        if hits:
+            await asyncio.to_thread(self.db.touch_photo_cache, hits)
+
+
+def largest_file_id(message):
+    """file_id največje velikosti iz odgovora send_photo (Message.photo je seznam PhotoSize)."""
+    photos = getattr(message, "photo", None) or ()
+    return photos[-1].file_id if photos else None
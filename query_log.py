@@ -0,0 +1,246 @@
+"""
+Merjenje SQL stavkov in dnevnik počasnih poizvedb (slow-query log).
+
+Veliko poizvedb (get_pending_urls, check_new_offers, get_admin_stats,
+get_recent_errors ...) lahko brez opozorila bere celo tabelo. Povezave iz
+Database.get_connection() in read-only poola so TimedConnection:
+
+- vsak stavek se izmeri (execute + fetch*) in prišteje k agregatu po
+  NORMALIZIRANEM stavku (literali -> ?, IN (?, ?, ...) -> IN (?, …)),
+- stavek nad SLOW_QUERY_MS se izpiše skupaj z obliko parametrov (tipi, ne
+  vrednosti) in izhodom EXPLAIN QUERY PLAN (enkrat na SLOW_QUERY_EXPLAIN_TTL
+  na stavek); "SCAN tabela" brez indeksa se označi kot full scan,
+- agregat se periodično zapiše v SlowQueries (Database.flush_slow_queries),
+  /slow pokaže stavke z največ skupnega časa.
+
+Iteracija po kurzorju (for row in cursor) se ne meri vrstico po vrstico
+(Python __next__ bi podvojil ceno velikih branj) - šteje čas execute, ki
+vključuje prvi korak poizvedbe. Enako fetchone: stavek se zapiše ob prvem
+fetchone, nadaljnji klici se ne štejejo. Kurzor, ki ga nihče ne prebere do
+konca ali zapre, se zapiše ob pobiranju smeti (__del__), a brez EXPLAIN -
+povezava je takrat lahko že zaprta, vrnjena v pool ali v drugem threadu.
+
+V config.py:
+    SLOW_QUERY_LOG = True            # False = navadne sqlite3 povezave, brez merjenja
+    SLOW_QUERY_MS = 200
+    SLOW_QUERY_EXPLAIN_TTL = 3600
+    SLOW_QUERY_FLUSH_INTERVAL = 300
+"""
+import functools
+import re
+import sqlite3
+import threading
+import time
+
+import metrics
+from utils import config_value
+
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.?])-?\d+(?:\.\d+)?(?![\w.])")
+_SPACE = re.compile(r"\s+")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_VALUES_LIST = re.compile(r"(\(\?, …\))(?:\s*,\s*\(\?, …\))+")
+
+EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT", "REPLACE")
+MAX_STATEMENTS = 2000
+
+
+@functools.lru_cache(maxsize=2048)
+def normalize(sql):
+    """Stavek brez literalov in dolžin seznamov - ključ agregata."""
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _SPACE.sub(" ", sql).strip().rstrip(";")
+    sql = _IN_LIST.sub("IN (?, …)", sql)
+    sql = _PLACEHOLDER_LIST.sub("(?, …)", sql)
+    return _VALUES_LIST.sub(r"\1, …", sql)
+
+
+def _types(values):
+    """['int', 'int', 'str'] -> 'int×2, str'."""
+    groups = []
+    for value in values:
+        name = type(value).__name__ if value is not None else "None"
+        if groups and groups[-1][0] == name:
+            groups[-1][1] += 1
+        else:
+            groups.append([name, 1])
+    return ", ".join(name if count == 1 else f"{name}×{count}" for name, count in groups)
+
+
+def params_shape(params, many=False):
+    """Oblika parametrov brez vrednosti (osebni podatki ne gredo v dnevnik)."""
+    if many:
+        if not isinstance(params, (list, tuple)):
+            return "executemany(iterator)"
+        return f"executemany {len(params)}× {params_shape(params[0]) if params else '()'}"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in params.items()) + "}"
+    return f"({_types(params or ())})"
+
+
+def is_full_scan(plan):
+    for line in (plan or "").splitlines():
+        detail = line.strip()
+        if detail.startswith("SCAN ") and "USING" not in detail and "VIRTUAL TABLE" not in detail \
+                and "CONSTANT ROW" not in detail and not detail.startswith("SCAN ("):
+            return True
+    return False
+
+
+def explain(conn, sql, params=(), many=False):
+    """EXPLAIN QUERY PLAN na isti povezavi (navaden kurzor - ne meri se)."""
+    if sql.lstrip().split(None, 1)[0].upper() not in EXPLAINABLE:
+        return None
+    if many:
+        if not isinstance(params, (list, tuple)) or not params:
+            return None
+        params = params[0]
+    try:
+        rows = conn.cursor(sqlite3.Cursor).execute(f"EXPLAIN QUERY PLAN {sql}", params or ()).fetchall()
+    except sqlite3.Error:
+        return None
+    # Zamik po globini (parent id), kot v sqlite3 CLI
+    depth = {0: 0}
+    lines = []
+    for row in rows:
+        node, parent, detail = row[0], row[1], row[-1]
+        depth[node] = depth.get(parent, 0) + 1
+        lines.append("  " * (depth[node] - 1) + detail)
+    return "\n".join(lines)
+
+
+class QueryLog:
+    def __init__(self, slow_ms=None, explain_ttl=None):
+        self.slow_ms = float(slow_ms or config_value("SLOW_QUERY_MS", 200))
+        self.explain_ttl = float(explain_ttl or config_value("SLOW_QUERY_EXPLAIN_TTL", 3600))
+        # stavek -> [klici, skupaj_ms, max_ms, počasnih, oblika parametrov]
+        self._stats = {}
+        self._plans = {}    # stavek -> (čas EXPLAIN, plan)
+        self._lock = threading.Lock()
+
+    def record(self, conn, sql, params, many, ms):
+        statement = normalize(sql)
+        slow = ms >= self.slow_ms
+        with self._lock:
+            stats = self._stats.get(statement)
+            if stats is None:
+                if len(self._stats) >= MAX_STATEMENTS:
+                    return
+                stats = self._stats[statement] = [0, 0.0, 0.0, 0, None]
+            stats[0] += 1
+            stats[1] += ms
+            stats[2] = max(stats[2], ms)
+            if slow:
+                stats[3] += 1
+                stats[4] = params_shape(params, many)
+            explained = self._plans.get(statement)
+        if slow:
+            self._report(conn, statement, sql, params, many, ms, stats[4], explained)
+
+    def _report(self, conn, statement, sql, params, many, ms, shape, explained):
+        """conn=None: samo izpis, brez EXPLAIN."""
+        metrics.SQLITE_SLOW.inc()
+        plan = None
+        if conn is not None and (explained is None or time.time() - explained[0] > self.explain_ttl):
+            plan = explain(conn, sql, params, many)
+            with self._lock:
+                self._plans[statement] = (time.time(), plan)
+        print(f"🐢 [SQL] {ms:.0f}ms {shape} | {statement[:200]}")
+        if plan:
+            flag = " ⚠️ FULL SCAN" if is_full_scan(plan) else ""
+            print("      " + plan.replace("\n", "\n      ") + flag)
+
+    def drain(self):
+        """Agregat od zadnjega klica (za SlowQueries); plani ostanejo v pomnilniku."""
+        with self._lock:
+            stats, self._stats = self._stats, {}
+            plans = dict(self._plans)
+        rows = []
+        for statement, (calls, total, peak, slow, shape) in stats.items():
+            plan = plans.get(statement, (None, None))[1]
+            rows.append((statement, calls, round(total, 3), round(peak, 3), slow, shape, plan,
+                         1 if is_full_scan(plan) else 0))
+        return rows
+
+
+QUERY_LOG = QueryLog()
+
+
+class TimedCursor(sqlite3.Cursor):
+    _pending = None   # [sql, parametri, executemany, ms] - zapiše se, ko je kurzor prebran/zaprt
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._pending = [sql, parameters, False, (time.perf_counter() - started) * 1000]
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._pending = [sql, seq_of_parameters, True, (time.perf_counter() - started) * 1000]
+            self._finish()
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._add(started, done=True)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._add(started, done=not rows)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._add(started, done=True)
+        return rows
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish(explain=False)
+        except Exception:
+            pass
+
+    def _add(self, started, done):
+        pending = self._pending
+        if pending is not None:
+            pending[3] += (time.perf_counter() - started) * 1000
+            if done:
+                self._finish()
+
+    def _finish(self, explain=True):
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            QUERY_LOG.record(self.connection if explain else None, *pending)
+
+
+class TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connection_factory():
+    """Factory za sqlite3.connect: TimedConnection ali navadna povezava (SLOW_QUERY_LOG=False)."""
+    return TimedConnection if config_value("SLOW_QUERY_LOG", True) else sqlite3.Connection
@@ -0,0 +1,123 @@
+"""
+Omejevalnik hitrosti pošiljanja za Telegram Bot API.
+
+Telegram omejitve (približno):
+- globalno ~30 sporočil/s na bota,
+- ~1 sporočilo/s v isti zasebni chat (kratki izbruhi so dovoljeni),
+- ~20 sporočil/min v skupino (chat_id < 0).
+
+Vsaka omejitev je token bucket. Klic si rezervira žeton (bucket gre lahko v
+minus) in počaka ravno toliko, kolikor je treba - brez fiksnih sleepov, zato
+dostava teče s polno dovoljeno hitrostjo. Ob RetryAfter (429) se ustavi VSE
+pošiljanje za zahtevani čas in klic se samodejno ponovi.
+
+Vsa pošiljanja procesa (delivery worker, ki pošilja tudi /broadcast joba)
+gredo skozi isti limiter (get_rate_limiter()), da skupaj ne presežejo
+globalne meje.
+
+    limiter = get_rate_limiter()
+    await limiter.call(chat_id, context.bot.send_message, chat_id=chat_id, text="...")
+"""
+import asyncio
+import time
+
+from telegram.error import RetryAfter
+
+from utils import config_value
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def reserve(self):
+        """Vzame žeton (tudi na dolg) in vrne, koliko sekund mora klicatelj počakati."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def idle(self):
+        """Bucket je poln (nihče ga ni uporabil dovolj dolgo) - lahko ga zavržemo."""
+        elapsed = time.monotonic() - self.updated
+        return self.tokens + elapsed * self.rate >= self.capacity
+
+
+class TelegramRateLimiter:
+    def __init__(self, global_rate=None, chat_rate=None, chat_burst=None, group_rate=None, max_retries=None):
+        global_rate = float(global_rate or config_value("TG_GLOBAL_RATE", 30))
+        self.chat_rate = float(chat_rate or config_value("TG_CHAT_RATE", 1))
+        self.chat_burst = float(chat_burst or config_value("TG_CHAT_BURST", 3))
+        self.group_rate = float(group_rate or config_value("TG_GROUP_RATE", 20 / 60))
+        self.max_retries = int(max_retries if max_retries is not None else config_value("TG_MAX_RETRY_AFTER", 3))
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats = {}
+        self._paused_until = 0.0
+        self.stats = {"calls": 0, "retry_after": 0, "waited_s": 0.0}
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 10000:
+                self._chats = {k: b for k, b in self._chats.items() if not b.idle()}
+            if int(chat_id) < 0:
+                bucket = TokenBucket(self.group_rate, 1)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def pause(self, seconds):
+        """Ustavi vse pošiljanje za `seconds` (RetryAfter velja za celega bota)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self, chat_id):
+        start = time.monotonic()
+        # Najprej chat (čakanje na isti chat ne sme zasesti globalnih žetonov), nato globalno
+        wait = self._chat_bucket(chat_id).reserve()
+        if wait:
+            await asyncio.sleep(wait)
+        while True:
+            paused = self._paused_until - time.monotonic()
+            if paused <= 0:
+                break
+            await asyncio.sleep(paused)
+        wait = self._global.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+        self.stats["waited_s"] += time.monotonic() - start
+
+    async def call(self, chat_id, fn, /, *args, **kwargs):
+        """await fn(*args, **kwargs) znotraj omejitev; RetryAfter -> pavza + ponovni poskus."""
+        attempt = 0
+        while True:
+            await self.acquire(chat_id)
+            self.stats["calls"] += 1
+            try:
+                return await fn(*args, **kwargs)
+            except RetryAfter as e:
+                self.stats["retry_after"] += 1
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                retry_after = e.retry_after
+                seconds = retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+                print(f"⏳ [RATE] Telegram RetryAfter {seconds:.0f}s (chat {chat_id}) - pavza in ponovni poskus {attempt}/{self.max_retries}")
+                self.pause(seconds + 0.5)
+
+
+_LIMITER = None
+
+
+def get_rate_limiter():
+    """Skupni limiter procesa (delivery worker + broadcast)."""
+    global _LIMITER
+    if _LIMITER is None:
+        _LIMITER = TelegramRateLimiter()
+    return _LIMITER
@@ -6,7 +6,9 @@ from curl_cffi import requests
 from ai_handler import AIHandler
 import config
 from database import Database
+from data_manager import stage_ad
 from scraper.base_scraper import get_latest_offers
+from tracing import span, traced
 
 class Scraper:
     def __init__(self, DataBase: Database):
@@ -214,8 +216,13 @@ class Scraper:
                 
         return new_ads_list
 
+    @traced("parse.avtonet")
     def run(self, urls_to_scrape):
-        """Glavni proces skeniranja z uporabo arhiva (Shared Brain) in AI batchinga."""
+        """
+        Glavni proces skeniranja z uporabo arhiva (Shared Brain) in AI batchinga.
+
+        Vrne seznam staged vrstic (stage_ad) za obvestila tega cikla.
+        """
         # Barve za lepši izpis na VPS
         B_CYAN = "\033[96m"
         B_YELLOW = "\033[93m"
@@ -233,7 +240,7 @@ class Scraper:
             u_bin = res[1] if res else urls_to_scrape.encode('latin-1', 'ignore')
             urls_to_scrape = [{'url_id': u_id, 'url_bin': u_bin, 'url': urls_to_scrape, 'telegram_name': 'Manual Test'}]
 
-        self.db.clear_scraped_snapshot()
+        staged = []  # Rezultati tega cikla za check_new_offers (brez ScrapedData)
 
         for entry in urls_to_scrape:
             try:
@@ -266,7 +273,7 @@ class Scraper:
                 
                 all_ids_on_page = []
                 ads_to_ai_batch = [] # Seznam tistih, ki jih mora AI dejansko obdelati
-                final_results = []   # Končni podatki za vpis v ScrapedData (AI + Arhiv)
+                final_results = []   # Končni podatki za obvestila (AI + Arhiv)
 
                 for row in rows:
                     if self._is_top_ponudba(row): 
@@ -369,9 +376,9 @@ class Scraper:
                         # Save to MarketData archive
                         self.db.insert_market_data(manual_data, item['text'])
 
-                # --- VPIS V BAZO ZA TELEGRAM OBVESTILA ---
+                # --- STAGING ZA TELEGRAM OBVESTILA ---
                 for data in final_results:
-                    self.db.insert_scraped_data(u_id, data)
+                    staged.append(stage_ad(u_id, data))
 
                 # Logiranje uspeha
                 duration = round(time.time() - start_time, 2)
@@ -382,7 +389,12 @@ class Scraper:
             except Exception as e:
                 print(f"{B_RED}[{get_time()}] ❌ Kritična napaka pri URL {u_id}: {e}{B_END}")
             
-            time.sleep(random.uniform(1.5, 3))
+            delay_min, delay_max = getattr(config, "SCRAPER_URL_DELAY", (1.5, 3))
+            if delay_max:
+                with span("delay"):
+                    time.sleep(random.uniform(delay_min, delay_max))
+
+        return staged
 
 # --- TEST ---
 if __name__ == "__main__":
@@ -413,7 +425,8 @@ if __name__ == "__main__":
     scraper = Scraper(DataBase=test_db)
     
     # Zaženemo run metodo z našim testnim seznamom
-    scraper.run(pending_test_list)
+    staged = scraper.run(pending_test_list)
+    print(f"Staged oglasov: {len(staged)}")
 
     print("\n" + "="*50)
     print("🏁 TEST ZAKLJUČEN. Preveri loge zgoraj!")
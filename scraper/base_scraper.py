@@ -1,8 +1,26 @@
 import time
 import random
+from urllib.parse import urlsplit
 from curl_cffi import requests
+import metrics
+from scraper.http_archive import get_archive
+from tracing import span, traced
+from utils import config_value
 
 
+def resolve_url(url: str):
+    """
+    SCRAPER_HOST_OVERRIDE (npr. "http://127.0.0.1:8090") preusmeri vse vire na lokalni
+    strežnik (benchmarks/fixture_server.py): https://www.avto.net/Ads/... -> <override>/www.avto.net/Ads/...
+    """
+    override = config_value("SCRAPER_HOST_OVERRIDE", None)
+    if not override:
+        return url
+    split = urlsplit(url)
+    return f"{override.rstrip('/')}/{split.netloc}{split.path}" + (f"?{split.query}" if split.query else "")
+
+
+@traced("fetch", detail=lambda url: url)
 def get_latest_offers(url: str):
     """
     Fetch page content using curl_cffi.
@@ -23,6 +41,14 @@ def get_latest_offers(url: str):
     if not url.startswith("http"):
         return None, 0, 0  # Invalid URL format
 
+    # Replay: odgovor iz HTTP arhiva, brez omrežja (ključ je izvirni URL)
+    archive = get_archive()
+    if archive is not None and archive.mode == "replay":
+        return archive.replay(url)
+    recorder = archive if archive is not None and archive.mode == "record" else None
+    original_url = url
+    url = resolve_url(url)
+
     headers = {
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
         'Accept-Language': 'sl-SI,sl;q=0.9',
@@ -32,10 +58,17 @@ def get_latest_offers(url: str):
     }
 
     try:
-        time.sleep(random.uniform(2, 4))
+        delay_min, delay_max = config_value("SCRAPER_FETCH_DELAY", (2, 4))
+        if delay_max:
+            with span("delay"):
+                time.sleep(random.uniform(delay_min, delay_max))
+        started = time.perf_counter()
         response = requests.get(url, impersonate="chrome120", headers=headers, timeout=30)
         
         status_code = response.status_code
+        host = urlsplit(original_url).netloc
+        metrics.FETCH_SECONDS.observe(time.perf_counter() - started, host=host)
+        metrics.FETCH_RESPONSES.inc(host=host, status=status_code)
         encoding = response.headers.get('Content-Encoding', '').lower()
         
         if status_code == 200:
@@ -46,10 +79,30 @@ def get_latest_offers(url: str):
                 wire_size = decompressed_size
             
             print(f"   [OK] Dostop OK! [Ocenjen promet: {round(wire_size/1024, 1)} KB | Encoding: {encoding}]")
+            metrics.FETCH_BYTES.inc(wire_size, host=host)
+            if recorder:
+                _record(recorder, original_url, 200, response, response.text, wire_size, started)
             return response.text, wire_size, 200
         else:
+            if recorder:
+                _record(recorder, original_url, status_code, response, None, 0, started)
             return None, 0, status_code
                 
     except Exception as e:
         print(f"❌ Napaka pri skeniranju (CURL): {e}")
-        return None, 0, 0 
+        metrics.FETCH_RESPONSES.inc(host=urlsplit(original_url).netloc, status=0)
+        if recorder:
+            recorder.record(original_url, 0, error=str(e))
+        return None, 0, 0
+
+
+def _record(archive, url, status, response, html, wire_size, started):
+    """Zapis v HTTP arhiv ne sme nikoli podreti skeniranja."""
+    try:
+        archive.record(
+            url, status, html, wire_size, (time.perf_counter() - started) * 1000,
+            headers={name: response.headers.get(name) for name in ('Content-Type', 'Content-Encoding', 'Retry-After')
+                     if response.headers.get(name)}
+        )
+    except Exception as e:
+        print(f"⚠️ [ARCHIVE] Zapis ni uspel: {e}")
@@ -7,7 +7,9 @@ from curl_cffi import requests
 from ai_handler import AIHandler
 import config
 from database import Database
+from data_manager import stage_ad
 from scraper.base_scraper import get_latest_offers
+from tracing import span, traced
 
 class Scraper:
     def __init__(self, DataBase: Database):
@@ -105,6 +107,7 @@ class Scraper:
         sep = '&' if '?' in url else '?'
         return f"{url}{sep}page={page}"
     
+    @traced("parse.bolha")
     def run_with_pagination(self, base_url: str, max_pages: int = None):
         """Scrape Bolha results - stop after finding first page with real ads.
         
@@ -133,7 +136,8 @@ class Scraper:
             
             # If no ads found yet, keep trying next page
             if not page_ads:
-                time.sleep(random.uniform(config.FETCH_SLEEP_MIN, config.FETCH_SLEEP_MAX))
+                with span("delay"):
+                    time.sleep(random.uniform(config.FETCH_SLEEP_MIN, config.FETCH_SLEEP_MAX))
                 current_page += 1
                 continue
             
@@ -148,9 +152,11 @@ class Scraper:
         
         return all_ads
 
-    def save_ads_to_scraped_data(self, ads, url_id):
-        """Save extracted Bolha ads to ScrapedData (url_id + content_id tracking)."""
-        saved = 0
+    @traced("parse.bolha")
+    def stage_ads(self, ads, url_id):
+        """Stage extracted Bolha ads for this cycle's notifications and archive them to MarketData."""
+        staged = []
+        seen_ids = set()
         for ad in ads:
             try:
                 # Add bo_ prefix to content_id for uniqueness
@@ -160,11 +166,12 @@ class Scraper:
                 if self.db.get_market_data_by_id(content_id):
                     continue  # Skip if already in archive
                 
-                # Check if already exists in ScrapedData (by url_id + content_id)
-                if self.db.get_scraped_data_by_url_and_content(url_id, content_id):
-                    continue  # Skip duplicates
+                # Skip duplicates within this URL's results
+                if content_id in seen_ids:
+                    continue
+                seen_ids.add(content_id)
                 
-                # Insert into ScrapedData (with url_id for query filtering)
+                # Stage for notifications (with url_id for query filtering)
                 # For Bolha: location and published_date are in metadata, no enrichment needed
                 data = {
                     'content_id': content_id,
@@ -180,7 +187,7 @@ class Scraper:
                     'menjalnik': None,
                     'motor': None
                 }
-                self.db.insert_scraped_data(url_id, data)
+                staged.append(stage_ad(url_id, data))
                 
                 # Also save to MarketData as archive
                 market_data = {
@@ -202,19 +209,17 @@ class Scraper:
                     self.db.insert_market_data(market_data)
                 except Exception as market_error:
                     print(f"[BOLHA] Warning: Could not save to MarketData: {market_error}")
-                
-                saved += 1
             except Exception as e:
                 print(f"[BOLHA] Error saving ad {ad.get('content_id')}: {e}")
                 continue
         
-        return saved
+        return staged
 
 
 # --- TEST ---
 if __name__ == "__main__":
     print("="*70)
-    print("🚀 BOLHA SCRAPER TEST - Extract & Save Ads to ScrapedData")
+    print("🚀 BOLHA SCRAPER TEST - Extract & Stage Ads")
     print("="*70)
 
     # Use actual bot.db with migrated schema
@@ -246,7 +251,7 @@ if __name__ == "__main__":
         print(f"   Published: {ad.get('published_date', 'N/A')}")
     
     print("\n" + "="*70)
-    print(f"💾 Saving {len(ads)} ads to ScrapedData...")
-    saved = scraper.save_ads_to_scraped_data(ads)
-    print(f"✅ Saved {saved}/{len(ads)} ads to ScrapedData")
+    print(f"💾 Staging {len(ads)} ads...")
+    staged = scraper.stage_ads(ads, 0)
+    print(f"✅ Staged {len(staged)}/{len(ads)} ads")
     print("="*70)
@@ -0,0 +1,187 @@
+"""
+HTTP arhiv za scraperje: snemanje in ponovno predvajanje (record/replay).
+
+Ko avto.net spremeni markup ali je cikel v produkciji počasen, potrebujemo
+točno tisto, kar je bilo preneseno. V načinu "record" get_latest_offers vsak
+odgovor (URL, status, glave, zlib-stisnjeno telo, promet, čas) zapiše v
+ločeno SQLite datoteko; v načinu "replay" get_latest_offers omrežja ne
+uporablja in vrača posnetke:
+
+- deterministično: n-ti klic istega URL-ja vrne n-ti posnetek tega URL-ja
+  (ko jih zmanjka, zadnjega), tudi napake (403/429/0) se ponovijo,
+- SCRAPER_HTTP_ARCHIVE_SESSION omeji predvajanje na eno snemanje.
+
+V config.py:
+    SCRAPER_HTTP_ARCHIVE_MODE = "record"        # ali "replay", None = izklop
+    SCRAPER_HTTP_ARCHIVE_PATH = "http_archive.db"
+
+Orodja:
+    python scraper/http_archive.py stats http_archive.db
+    python scraper/http_archive.py export http_archive.db fixtures/   # za fixture_server.py --recordings
+    python scraper/http_archive.py prune http_archive.db 14
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+import zlib
+from datetime import datetime
+from urllib.parse import parse_qs, urlsplit
+
+from utils import config_value
+
+
+class HttpArchive:
+    def __init__(self, path, mode="replay", session=None):
+        self.path = path
+        self.mode = mode
+        # Snemanje: nova seja ob vsakem zagonu; predvajanje: opcijsko samo ena seja
+        self.session = session or (datetime.now().strftime("%Y%m%d_%H%M%S") if mode == "record" else None)
+        self._lock = threading.Lock()
+        self._cursors = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS Responses (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session TEXT,
+                url TEXT NOT NULL,
+                status INTEGER,
+                headers TEXT,          -- JSON (content-type, content-encoding, ...)
+                body BLOB,             -- zlib(utf-8 HTML), NULL pri napaki
+                body_size INTEGER,     -- velikost HTML (nestisnjeno)
+                wire_bytes INTEGER,    -- ocenjen promet, kot ga vrne get_latest_offers
+                elapsed_ms REAL,
+                error TEXT,
+                fetched_at DATETIME DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime'))
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_url ON Responses (url, id)")
+
+    # --- snemanje ---
+
+    def record(self, url, status, html=None, wire_bytes=0, elapsed_ms=0.0, headers=None, error=None):
+        body = zlib.compress(html.encode("utf-8"), 6) if html is not None else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO Responses (session, url, status, headers, body, body_size, wire_bytes, elapsed_ms, error) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.session, url, status, json.dumps(headers or {}), body,
+                 len(html) if html is not None else 0, wire_bytes, round(elapsed_ms, 1), error)
+            )
+
+    # --- predvajanje ---
+
+    def replay(self, url):
+        """(html, wire_bytes, status) kot get_latest_offers; brez posnetka (None, 0, 0)."""
+        with self._lock:
+            index = self._cursors.get(url, 0)
+            where, params = "url = ?", [url]
+            if self.session:
+                where += " AND session = ?"
+                params.append(self.session)
+            row = self._conn.execute(
+                f"SELECT status, body, wire_bytes FROM Responses WHERE {where} ORDER BY id LIMIT 1 OFFSET ?",
+                params + [index]
+            ).fetchone()
+            if row is None and index:
+                # Posnetkov je zmanjkalo - ponavljamo zadnjega
+                row = self._conn.execute(
+                    f"SELECT status, body, wire_bytes FROM Responses WHERE {where} ORDER BY id DESC LIMIT 1", params
+                ).fetchone()
+            self._cursors[url] = index + 1
+        if row is None:
+            print(f"⚠️ [ARCHIVE] Ni posnetka za {url[:120]}")
+            return None, 0, 0
+        status, body, wire_bytes = row
+        html = zlib.decompress(body).decode("utf-8") if body is not None else None
+        return html, wire_bytes or 0, status
+
+    def rewind(self):
+        """Predvajanje znova od začetka (npr. med ponovitvami benchmarka)."""
+        with self._lock:
+            self._cursors.clear()
+
+    # --- orodja ---
+
+    def stats(self):
+        rows = self._conn.execute("""
+            SELECT session, COUNT(*), COUNT(DISTINCT url), SUM(body_size), SUM(LENGTH(body)),
+                   SUM(status != 200), MIN(fetched_at), MAX(fetched_at)
+            FROM Responses GROUP BY session ORDER BY MIN(id)
+        """).fetchall()
+        return [
+            {"session": r[0], "responses": r[1], "urls": r[2], "html_bytes": r[3] or 0, "stored_bytes": r[4] or 0,
+             "errors": r[5] or 0, "first": r[6], "last": r[7]}
+            for r in rows
+        ]
+
+    def export(self, directory):
+        """Zadnji uspešen posnetek vsake strani -> <dir>/<vir>/<stran>.html (fixture_server --recordings)."""
+        hosts = {"www.avto.net": ("avtonet", "stran"), "www.bolha.com": ("bolha", "page"),
+                 "www.nepremicnine.net": ("nepremicnine", "page")}
+        written = 0
+        for url, body in self._conn.execute(
+            "SELECT url, body FROM Responses WHERE status = 200 AND body IS NOT NULL ORDER BY id"
+        ):
+            split = urlsplit(url)
+            if split.netloc not in hosts:
+                continue
+            source, param = hosts[split.netloc]
+            page = parse_qs(split.query).get(param, ["1"])[0] or "1"
+            os.makedirs(os.path.join(directory, source), exist_ok=True)
+            with open(os.path.join(directory, source, f"{page}.html"), "w", encoding="utf-8") as f:
+                f.write(zlib.decompress(body).decode("utf-8"))
+            written += 1
+        return written
+
+    def prune(self, days):
+        with self._lock:
+            count = self._conn.execute(
+                "DELETE FROM Responses WHERE fetched_at < strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime', ?)",
+                (f"-{int(days)} days",)
+            ).rowcount
+        self._conn.execute("VACUUM")
+        return count
+
+    def close(self):
+        self._conn.close()
+
+
+_ARCHIVE = None
+_ARCHIVE_LOCK = threading.Lock()
+
+
+def get_archive():
+    """Arhiv procesa glede na SCRAPER_HTTP_ARCHIVE_MODE ali None (izklopljeno)."""
+    global _ARCHIVE
+    mode = config_value("SCRAPER_HTTP_ARCHIVE_MODE", None)
+    if mode not in ("record", "replay"):
+        return None
+    if _ARCHIVE is None:
+        with _ARCHIVE_LOCK:
+            if _ARCHIVE is None:
+                path = config_value("SCRAPER_HTTP_ARCHIVE_PATH", "http_archive.db")
+                _ARCHIVE = HttpArchive(path, mode, config_value("SCRAPER_HTTP_ARCHIVE_SESSION", None))
+                print(f"📼 [ARCHIVE] {mode.upper()} -> {path} (seja {_ARCHIVE.session or 'vse'})")
+    return _ARCHIVE
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("stats", "export", "prune"):
+        print("Usage: python scraper/http_archive.py stats|export|prune <archive.db> [dir|days]")
+        sys.exit(1)
+
+    archive = HttpArchive(sys.argv[2], mode="replay")
+    if sys.argv[1] == "stats":
+        for s in archive.stats():
+            ratio = s['stored_bytes'] / s['html_bytes'] * 100 if s['html_bytes'] else 0
+            print(f"{s['session']}: {s['responses']} odgovorov, {s['urls']} URL-jev, napak {s['errors']}, "
+                  f"HTML {s['html_bytes'] / 1024 / 1024:.1f} MB -> {s['stored_bytes'] / 1024 / 1024:.1f} MB "
+                  f"({ratio:.0f}%), {s['first']} - {s['last']}")
+    elif sys.argv[1] == "export":
+        print(f"Izvoženih {archive.export(sys.argv[3] if len(sys.argv) > 3 else 'fixtures')} strani")
+    else:
+        print(f"Pobrisanih {archive.prune(sys.argv[3] if len(sys.argv) > 3 else 14)} posnetkov")
+    archive.close()
@@ -2,6 +2,7 @@ import re
 import json
 from bs4 import BeautifulSoup
 from database import Database
+from data_manager import stage_ad
 from scraper.base_scraper import get_latest_offers
 
 class Scraper:
@@ -165,9 +166,10 @@ class Scraper:
         
         return metadata
     
-    def save_ads_to_scraped_data(self, ads, url_id):
-        """Save properties to database with deduplication."""
-        saved = 0
+    def stage_ads(self, ads, url_id):
+        """Stage properties for this cycle's notifications and archive them, with deduplication."""
+        staged = []
+        seen_ids = set()
         
         for ad in ads:
             try:
@@ -178,11 +180,12 @@ class Scraper:
                 if self.db.get_market_data_by_id(content_id):
                     continue  # Skip if already in archive
                 
-                # Check if already exists in ScrapedData for this URL
-                if self.db.get_scraped_data_by_url_and_content(url_id, content_id):
-                    continue  # Skip duplicates
+                # Skip duplicates within this URL's results
+                if content_id in seen_ids:
+                    continue
+                seen_ids.add(content_id)
                 
-                # Prepare data for ScrapedData (with url_id tracking)
+                # Prepare data for staging (with url_id tracking)
                 scraped_data = {
                     'content_id': content_id,
                     'ime_avta': ad.get('title'),  # Using ime_avta for title (legacy field name)
@@ -197,8 +200,8 @@ class Scraper:
                     'description': ad.get('description')
                 }
                 
-                # Insert into ScrapedData
-                self.db.insert_scraped_data(url_id, scraped_data)
+                # Stage for this cycle's notifications
+                staged.append(stage_ad(url_id, scraped_data))
                 
                 # Also save to MarketData (permanent archive)
                 market_data = {
@@ -224,14 +227,12 @@ class Scraper:
                     self.db.insert_market_data(market_data)
                 except Exception as market_error:
                     print(f"[NEPREMICNINE] Warning: Could not save to MarketData: {market_error}")
-                
-                saved += 1
             
             except Exception as e:
                 print(f"[NEPREMICNINE] Error saving property {ad.get('content_id')}: {e}")
                 continue
         
-        return saved
+        return staged
 
 
 # --- TEST ---
@@ -1,7 +1,9 @@
 import telegram
 import telegram.ext
 from database import Database
-import sqlite3
+from async_database import AsyncDatabase
+from broadcast import BroadcastManager, format_job
+import tracing
 import asyncio
 from datetime import datetime, timedelta
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
@@ -22,13 +24,19 @@ import config
 load_dotenv()
 # Povezava z bazo - use config's DB_PATH which respects TEST_BOT mode
 db = Database(config.DB_PATH)
+# Handlerji kličejo bazo preko adb (DB executor), da SQLite ne blokira event loopa.
+# Sinhroni `db` ostane za scraperje, ki tečejo v asyncio.to_thread.
+adb = AsyncDatabase(db)
+# /broadcast kot trajen job (vpis v Outbox po kosih, pošilja DeliveryWorker)
+broadcasts = BroadcastManager(db)
 
 
 # ===== DEV MODE MESSAGE ROUTING =====
-async def send_message(context, chat_id, text, parse_mode="HTML", **kwargs):
+async def send_message(context, chat_id, text, parse_mode="HTML", raise_errors=False, **kwargs):
     """
     Smart message sender that respects DEV_MODE.
     If DEV_MODE=1, routes all messages to ADMIN_ID only.
+    raise_errors=True: napaka gre naprej (delivery worker jo potrebuje za retry/backoff).
     """
     from config import TEST_BOT, DEV_MODE, ADMIN_ID
     
@@ -49,6 +57,8 @@ async def send_message(context, chat_id, text, parse_mode="HTML", **kwargs):
             **kwargs
         )
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"❌ Error sending message to {target_chat}: {e}")
         return None
 
@@ -59,7 +69,7 @@ async def start_command(update: telegram.Update, context: telegram.ext.ContextTy
     if not user: return
 
     # 1. Registracija v bazi
-    is_new = db.register_user(user.id, user.first_name, user.username)
+    is_new = await adb.register_user(user.id, user.first_name, user.username)
 
     if is_new:
         # --- OBVESTILO ZA ADMINA ---
@@ -92,7 +102,7 @@ async def start_command(update: telegram.Update, context: telegram.ext.ContextTy
             "• Osveževanje na 15 minut\n\n"
             "Da začneš, mi pošlji URL z ukazom <code>/add_url</code> ali poglej navodila na /help."
         )
-        db.log_user_activity(user.id, "/start", "Nov uporabnik - Trial aktiviran")
+        adb.fire("log_user_activity", user.id, "/start", "Nov uporabnik - Trial aktiviran")
     else:
         # Sporočilo za obstoječega uporabnika
         safe_name = html.escape(user.first_name)
@@ -101,7 +111,7 @@ async def start_command(update: telegram.Update, context: telegram.ext.ContextTy
             "Tvoj profil je že aktiven. Za pregled tvojih iskanj uporabi /list, "
             "za več informacij o paketu pa /info."
         )
-        db.log_user_activity(user.id, "/start", "Povratek starega uporabnika")
+        adb.fire("log_user_activity", user.id, "/start", "Povratek starega uporabnika")
 
     await update.message.reply_text(msg, parse_mode="HTML")
 
@@ -127,7 +137,7 @@ async def add_url_command(update: telegram.Update, context: telegram.ext.Context
     is_bolha = "bolha.com" in raw_url.lower()
     
     if not (is_avtonet or is_bolha):
-        db.log_user_activity(t_id, "/add_url", f"ZAVRNJENO: Neveljaven link")
+        adb.fire("log_user_activity", t_id, "/add_url", f"ZAVRNJENO: Neveljaven link")
         await msg_obj.reply_text(
             "❌ <b>NAPAKA: To ni veljaven iskalni link!</b>\n\n"
             "Pojdi na Avto.net ali Bolha.com, nastavi filtre in kopiraj <b>celoten</b> naslov iz brskalnika.",
@@ -144,13 +154,13 @@ async def add_url_command(update: telegram.Update, context: telegram.ext.Context
         fixed_url = raw_url
 
     # 3. Preveri naročnino in limite
-    user_info = db.get_user_subscription_info(t_id)
+    user_info = await adb.get_user_subscription_info(t_id)
     if not user_info:
         await msg_obj.reply_text("❌ Tvoj profil ni registriran. Uporabi /start.", parse_mode="HTML")
         return
 
     if user_info['current_url_count'] >= user_info['max_urls']:
-        db.log_user_activity(t_id, "/add_url", f"ZAVRNJENO: Dosežen limit")
+        adb.fire("log_user_activity", t_id, "/add_url", f"ZAVRNJENO: Dosežen limit")
         await msg_obj.reply_text(
             f"🚫 <b>Limit dosežen!</b>\n\n"
             f"Tvoj paket {user_info['subscription_type']} dovoljuje največ <code>{user_info['max_urls']}</code> iskanj.\n"
@@ -166,7 +176,7 @@ async def add_url_command(update: telegram.Update, context: telegram.ext.Context
             from scraper.bolha.scraper import Scraper as BolhaScraper
             from bs4 import BeautifulSoup
             test_scraper = BolhaScraper(db)
-            test_html, _, test_status = test_scraper.get_latest_offers(fixed_url)
+            test_html, _, test_status = await asyncio.to_thread(test_scraper.get_latest_offers, fixed_url)
             if test_status == 200:
                 soup = BeautifulSoup(test_html, 'html.parser')
                 # Check if EntityList--Regular section exists (indicates regular user listings)
@@ -181,7 +191,7 @@ async def add_url_command(update: telegram.Update, context: telegram.ext.Context
                         "• bolha.com/elektronika",
                         parse_mode="HTML"
                     )
-                    db.log_user_activity(t_id, "/add_url", f"ZAVRNJENO: Ni redne ponudbe")
+                    adb.fire("log_user_activity", t_id, "/add_url", f"ZAVRNJENO: Ni redne ponudbe")
                     return
                 else:
                     test_ads = test_scraper.extract_all_ads(test_html)
@@ -194,13 +204,13 @@ async def add_url_command(update: telegram.Update, context: telegram.ext.Context
         await validation_msg.delete()
 
     # 4. Dodajanje v bazo
-    status, new_url_id = db.add_search_url(t_id, fixed_url)
+    status, new_url_id = await adb.add_search_url(t_id, fixed_url)
 
     if status == "exists":
         await msg_obj.reply_text("ℹ️ Temu URL-ju že slediš! Ni ga treba dodajati dvakrat.", parse_mode="HTML")
         return
     elif status is True:
-        db.log_user_activity(t_id, "/add_url", f"Dodan URL ID: {new_url_id}")
+        adb.fire("log_user_activity", t_id, "/add_url", f"Dodan URL ID: {new_url_id}")
         
         # --- KLJUČNI POPRAVEK: Preverimo, če je uporabnik sploh aktiven ---
         if user_info.get('is_active'):
@@ -225,8 +235,9 @@ async def add_url_command(update: telegram.Update, context: telegram.ext.Context
                     ads = await asyncio.to_thread(bolha_scraper.run_with_pagination, fixed_url)
                     print(f"[BOLHA ADD_URL] Found {len(ads) if ads else 0} ads")
                     if ads:
-                        saved = await asyncio.to_thread(bolha_scraper.save_ads_to_scraped_data, ads, new_url_id)
-                        print(f"[BOLHA ADD_URL] Saved {saved} ads to ScrapedData")
+                        # Tiha sinhronizacija: oglase arhiviramo, staging rezultat zavržemo
+                        staged = await asyncio.to_thread(bolha_scraper.stage_ads, ads, new_url_id)
+                        print(f"[BOLHA ADD_URL] Archived {len(staged)} new ads")
                 
                 await sync_msg.edit_text(
                     "✅ <b>Iskanje uspešno dodano!</b>\n\n"
@@ -264,22 +275,51 @@ async def remove_url_command(update: telegram.Update, context: telegram.ext.Cont
     t_id = update.effective_user.id
     
     # Uporabimo tvojo obstoječo funkcijo
-    if db.remove_subscription_by_id(t_id, int(input_id)):
+    if await adb.remove_subscription_by_id(t_id, int(input_id)):
         # --- LOGGING USPEHA ---
-        db.log_user_activity(t_id, "/remove_url", f"Uspešno izbrisal ID: {input_id}")
+        adb.fire("log_user_activity", t_id, "/remove_url", f"Uspešno izbrisal ID: {input_id}")
         # ----------------------
         await update.message.reply_text(f"🗑️ Iskanje z ID `{input_id}` je bilo uspešno odstranjeno.", parse_mode="Markdown")
     else:
         # --- LOGGING NAPAKE (Če ID ne obstaja ali ni pravi) ---
-        db.log_user_activity(t_id, "/remove_url", f"Neuspešen izbris (ID {input_id} ne obstaja)")
+        adb.fire("log_user_activity", t_id, "/remove_url", f"Neuspešen izbris (ID {input_id} ne obstaja)")
         # ----------------------
         await update.message.reply_text("❓ Iskanja s tem ID-jem nismo našli na tvojem seznamu.")
 
 
+async def digest_command(update: telegram.Update, context: telegram.ext.ContextTypes.DEFAULT_TYPE):
+    """/digest on|off|auto [ID] - več novih oglasov naenkrat dobi kot eno zbirno sporočilo."""
+    modes = {"on": 1, "off": 0, "auto": None}
+    args = [a.lower() for a in (context.args or [])]
+    if not args or args[0] not in modes or (len(args) > 1 and not args[1].isdigit()):
+        await update.message.reply_text(
+            "📦 <b>ZBIRNA OBVESTILA</b>\n\n"
+            "Ko iskanje naenkrat najde več novih oglasov, jih dobiš v enem sporočilu namesto posamično.\n\n"
+            "• <code>/digest on</code> - vklopi za vsa iskanja\n"
+            "• <code>/digest off</code> - vsak oglas posebej\n"
+            "• <code>/digest auto</code> - po tvojem paketu\n"
+            "• <code>/digest on ID</code> - samo za eno iskanje (ID iz /list)",
+            parse_mode="HTML"
+        )
+        return
+
+    t_id = update.effective_user.id
+    url_id = int(args[1]) if len(args) > 1 else None
+    changed = await adb.set_tracking_digest(t_id, modes[args[0]], url_id)
+    if not changed:
+        await update.message.reply_text("❓ Iskanja s tem ID-jem nismo našli na tvojem seznamu.")
+        return
+
+    adb.fire("log_user_activity", t_id, "/digest", f"{args[0]} ({'vsa' if url_id is None else url_id})")
+    target = "vsa iskanja" if url_id is None else f"iskanje ID {url_id}"
+    labels = {"on": "vklopljena", "off": "izklopljena", "auto": "po paketu"}
+    await update.message.reply_text(f"📦 Zbirna obvestila {labels[args[0]]} za {target}.")
+
+
 async def list_command(update: telegram.Update, context: telegram.ext.ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    urls = db.get_user_urls_with_status(user_id)
-    user_info = db.get_user_subscription_info(user_id)
+    urls = await adb.get_user_urls_with_status(user_id)
+    user_info = await adb.get_user_subscription_info(user_id)
 
     if not urls:
         await update.message.reply_text("Trenutno nimaš shranjenih iskanj. Dodaj jih z <code>/add_url</code>.", parse_mode="HTML")
@@ -333,11 +373,11 @@ async def info_command(update: telegram.Update, context: telegram.ext.ContextTyp
 
     # 3. OSVEŽIMO PODATKE V BAZI (Tukaj je bila napaka)
     # user_obj.id je številka, user_obj.first_name je besedilo, user_obj.username je @handle
-    db.register_user(t_id, user_obj.first_name, user_obj.username)
+    await adb.register_user(t_id, user_obj.first_name, user_obj.username)
     
     # 4. Pridobimo podatke za izpis
-    user_data = db.get_user(t_id)
-    pregledi_24h = db.get_user_stats_24h(t_id)
+    user_data = await adb.get_user(t_id)
+    pregledi_24h = await adb.get_user_stats_24h(t_id)
     
     if not user_data:
         await update.message.reply_text("Nisi registriran. Uporabi /start.")
@@ -369,7 +409,7 @@ async def info_command(update: telegram.Update, context: telegram.ext.ContextTyp
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
 
-    db.log_user_activity(t_id, "/info", "Pregled profila (osvežitev)")
+    adb.fire("log_user_activity", t_id, "/info", "Pregled profila (osvežitev)")
     
     await update.message.reply_text(msg, parse_mode="HTML", reply_markup=reply_markup)
 
@@ -397,6 +437,8 @@ async def help_command(update: telegram.Update, context: telegram.ext.ContextTyp
         "• <code>/list</code> - Pregled in status tvojih iskanj\n"
         "• <code>/remove_url ID</code> - Izbris iskanja\n"
         "• <code>/info</code> - Status tvojega profila\n"
+        "• <code>/search besede</code> - Iskanje po arhivu oglasov\n"
+        "• <code>/digest on|off</code> - Več oglasov v enem sporočilu\n"
         "• <code>/packages</code> - Pregled paketov"
     )
 
@@ -460,7 +502,52 @@ async def packages_command(update: telegram.Update, context: telegram.ext.Contex
     await target_msg.reply_text(msg, parse_mode="HTML", disable_web_page_preview=True)
 
 
+async def search_command(update: telegram.Update, context: telegram.ext.ContextTypes.DEFAULT_TYPE):
+    """Full-text iskanje po arhivu oglasov (MarketDataFTS). Primer: /search octavia combi"""
+    import time
 
+    user_id = update.effective_user.id
+    query_text = " ".join(context.args) if context.args else ""
+    if not query_text.strip():
+        await update.message.reply_text(
+            "🔎 Uporaba: <code>/search znamka model</code>\nPrimer: <code>/search octavia combi</code>",
+            parse_mode="HTML"
+        )
+        return
+
+    start = time.perf_counter()
+    # \x02/\x03 označita zadetke, da lahko preostanek varno escapamo
+    results = await adb.search_market_text(query_text, limit=10, highlight=("\x02", "\x03"))
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    adb.fire("log_user_activity", user_id, "/search", query_text[:100])
+
+    if not results:
+        await update.message.reply_text(
+            f"🔎 Ni zadetkov za <b>{html.escape(query_text)}</b>.", parse_mode="HTML"
+        )
+        return
+
+    msg = f"🔎 <b>ISKANJE:</b> {html.escape(query_text)}\n"
+    msg += f"<i>{len(results)} zadetkov v {elapsed_ms:.0f} ms</i>\n"
+    msg += "━━━━━━━━━━━━━━━━━━\n\n"
+
+    for r in results:
+        title = html.escape(r.get('fts_title') or r.get('content_id'))
+        price = r.get('price') or r.get('cena') or "Po dogovoru"
+        hit = html.escape(r.get('hit') or "").replace("\x02", "<b>").replace("\x03", "</b>")
+        link = r.get('link')
+
+        if link:
+            msg += f"🚗 <a href='{html.escape(link, quote=True)}'>{title}</a>\n"
+        else:
+            msg += f"🚗 {title}\n"
+        msg += f"💰 {html.escape(str(price))}\n"
+        if hit and hit.strip() != title:
+            msg += f"<i>{hit.strip()}</i>\n"
+        msg += "──────────────────\n"
+
+    await update.message.reply_text(msg, parse_mode="HTML", disable_web_page_preview=True)
 
 
 async def broadcast_command(update: telegram.Update, context: telegram.ext.ContextTypes.DEFAULT_TYPE):
@@ -485,27 +572,56 @@ async def broadcast_command(update: telegram.Update, context: telegram.ext.Conte
         f"{vsebina}"
     )
     
-    vsi_id = db.get_all_chat_ids()
-    print(f"📣 [BROADCAST] Pošiljam {len(vsi_id)} uporabnikom...")
-    
-    poslano = 0
-    for chat_id in vsi_id:
-        try:
-            await send_message(context, chat_id=chat_id, text=sporočilo, parse_mode="HTML")
-            poslano += 1
-            await asyncio.sleep(0.05)
-        except Exception as e:
-            print(f"Ni mogoče poslati {chat_id}: {e}")
-            continue
+    # Ne pošiljamo v handlerju: job vpiše prejemnike v Outbox, pošilja DeliveryWorker
+    job_id = await adb.run(broadcasts.create, sporočilo, update.effective_user.id, vsebina)
+    context.job_queue.run_once(broadcasts.job, when=0)
+    print(f"📣 [BROADCAST] Job #{job_id} ustvarjen")
+
+    await update.message.reply_text(
+        f"📢 Broadcast <b>#{job_id}</b> se pošilja v ozadju.\n"
+        f"Napredek: /broadcast_status | Preklic: <code>/broadcast_cancel {job_id}</code>",
+        parse_mode="HTML"
+    )
 
-    await update.message.reply_text(f"✅ Poslano <b>{poslano}</b> uporabnikom.", parse_mode="HTML")
+
+async def broadcast_status_command(update: telegram.Update, context: telegram.ext.ContextTypes.DEFAULT_TYPE):
+    from config import ADMIN_ID
+    if str(update.effective_user.id) != str(ADMIN_ID): return
+
+    jobs = await adb.run(broadcasts.progress)
+    if not jobs:
+        await update.message.reply_text("Ni broadcastov.")
+        return
+
+    msg = "📢 <b>BROADCASTI</b>\n━━━━━━━━━━━━━━━━━━\n\n"
+    msg += "\n\n".join(format_job(job) for job in jobs)
+    await update.message.reply_text(msg, parse_mode="HTML")
+
+
+async def broadcast_cancel_command(update: telegram.Update, context: telegram.ext.ContextTypes.DEFAULT_TYPE):
+    from config import ADMIN_ID
+    if str(update.effective_user.id) != str(ADMIN_ID): return
+
+    if not context.args or not context.args[0].lstrip("#").isdigit():
+        await update.message.reply_text("❌ Uporaba: /broadcast_cancel ID")
+        return
+
+    job_id = int(context.args[0].lstrip("#"))
+    removed = await adb.run(broadcasts.cancel, job_id)
+    if removed is None:
+        await update.message.reply_text(f"❌ Broadcast #{job_id} ni aktiven.")
+        return
+    await update.message.reply_text(
+        f"🛑 Broadcast <b>#{job_id}</b> preklican ({removed} neposlanih sporočil odstranjenih).",
+        parse_mode="HTML"
+    )
 
 
 async def list_users_admin(update: telegram.Update, context: telegram.ext.ContextTypes.DEFAULT_TYPE):
     from main import ADMIN_ID
     if str(update.effective_user.id) != str(ADMIN_ID): return
 
-    users = db.get_all_users_admin()
+    users = await adb.get_all_users_admin()
     if not users:
         await update.message.reply_text("Baza je prazna.")
         return
@@ -597,7 +713,7 @@ async def activate_user(update: telegram.Update, context: telegram.ext.ContextTy
 
         # POKLIČEMO POSODOBLJENO METODO (ki sama sešteje dni!)
         # Vrstni red: telegram_id, pkg_type, max_urls, interval, days_to_add
-        new_expiry = db.update_user_subscription(
+        new_expiry = await adb.update_user_subscription(
             target_user_id, 
             pkg_name, 
             max_urls, 
@@ -645,7 +761,7 @@ async def deactivate_user(update: telegram.Update, context: telegram.ext.Context
 
     try:
         u_id = int(context.args[0])
-        db.update_user_status(u_id, sub_type=None)
+        await adb.update_user_status(u_id, sub_type=None)
         
         await update.message.reply_text(f"🚫 Uporabnik `{u_id}` je bil deaktiviran.")
         await send_message(context, chat_id=u_id, text="⚠️ Tvoja naročnina je potekla ali bila preklicana. Za podaljšanje kontaktiraj admina.")
@@ -657,26 +773,10 @@ async def admin_overview_command(update: telegram.Update, context: telegram.ext.
     from config import ADMIN_ID
     if str(update.effective_user.id) != str(ADMIN_ID): return
 
-    conn = db.get_connection()
-    c = conn.cursor()
-
-    # 1. Razvrstitev po paketih
-    stats_pkg = c.execute("SELECT subscription_type, COUNT(*) FROM Users GROUP BY subscription_type").fetchall()
-    
-    # 2. Kdo nima URL-jev (Ghost users)
-    ghosts = c.execute("""
-        SELECT telegram_name, telegram_id FROM Users 
-        WHERE telegram_id NOT IN (SELECT telegram_id FROM Tracking)
-        AND is_active = 1
-    """).fetchall()
-
-    # 3. Kdo ima pokvarjene linke (Fails)
-    failed_links = c.execute("""
-        SELECT us.telegram_name, u.url_id FROM Urls u 
-        JOIN Tracking t ON u.url_id = t.url_id 
-        JOIN Users us ON t.telegram_id = us.telegram_id 
-        WHERE u.fail_count > 0
-    """).fetchall()
+    overview = await adb.get_admin_overview()
+    stats_pkg = overview['packages']
+    ghosts = overview['ghosts']
+    failed_links = overview['failed_links']
 
     msg = "📊 <b>SUPER ADMIN PREGLED</b>\n"
     msg += "━━━━━━━━━━━━━━━━━━\n\n"
@@ -713,11 +813,10 @@ def get_todays_requests_count(self):
     return count
 
 async def admin_stats_command(update: telegram.Update, context: telegram.ext.ContextTypes.DEFAULT_TYPE):
-    from main import ADMIN_ID, DB_PATH
+    from main import ADMIN_ID
     if str(update.effective_user.id) != str(ADMIN_ID): return
     
-    db = Database(DB_PATH)
-    stats = db.get_admin_stats()
+    stats = await adb.get_admin_stats()
 
     req_danes = stats.get('requesti_danes', 0)
     cost_danes = stats.get('cost_danes', 0)
@@ -763,11 +862,64 @@ async def admin_stats_command(update: telegram.Update, context: telegram.ext.Con
     await update.message.reply_text(msg, parse_mode="HTML")
 
 
+async def perf_command(update: telegram.Update, context: telegram.ext.ContextTypes.DEFAULT_TYPE):
+    """/perf [N] - najpočasnejše faze in p50/p95 zadnjih N ciklov (CycleTrace)."""
+    from config import ADMIN_ID
+    if str(update.effective_user.id) != str(ADMIN_ID): return
+
+    cycles = int(context.args[0]) if context.args and context.args[0].isdigit() else 20
+    scrape = await adb.run(db.get_cycle_traces, "scrape", cycles)
+    delivery = await adb.run(db.get_cycle_traces, "delivery", cycles)
+
+    msg = "⏱️ <b>PERFORMANSE CIKLOV</b>\n━━━━━━━━━━━━━━━━━━\n\n"
+    msg += tracing.format_perf(tracing.summarize(scrape, "scrape"), "Scrape cikel")
+    msg += "\n\n" + tracing.format_perf(tracing.summarize(delivery, "delivery"), "Pošiljanje")
+    await update.message.reply_text(msg, parse_mode="HTML")
+
+
+async def slow_command(update: telegram.Update, context: telegram.ext.ContextTypes.DEFAULT_TYPE):
+    """/slow [N] [total|max|slow] - najdražji SQL stavki (query_log.py); /slow reset počisti agregat."""
+    from config import ADMIN_ID
+    if str(update.effective_user.id) != str(ADMIN_ID): return
+
+    args = [a.lower() for a in (context.args or [])]
+    if "reset" in args:
+        count = await adb.reset_slow_queries()
+        await update.message.reply_text(f"🧹 Agregat SQL stavkov počiščen ({count} stavkov).")
+        return
+
+    limit = next((min(int(a), 20) for a in args if a.isdigit()), 8)
+    order = next((a for a in args if a in ("total", "max", "slow")), "total")
+    await adb.flush_slow_queries()
+    rows = await adb.get_slow_queries(limit, order)
+    if not rows:
+        await update.message.reply_text("✅ Ni zabeleženih SQL stavkov.")
+        return
+
+    msg = f"🐢 <b>NAJDRAŽJI SQL STAVKI</b> (po: {order})\n━━━━━━━━━━━━━━━━━━\n\n"
+    for row in rows:
+        avg = row['total_ms'] / row['calls'] if row['calls'] else 0
+        scan = " ⚠️ <b>FULL SCAN</b>" if row['full_scan'] else ""
+        block = (f"⏱️ skupaj <b>{row['total_ms'] / 1000:.1f}s</b> | {row['calls']}× | povp. {avg:.1f}ms "
+                 f"| max {row['max_ms']:.0f}ms | počasnih {row['slow_calls']}{scan}\n")
+        block += f"<code>{html.escape(row['statement'][:300])}</code>\n"
+        if row['params_shape']:
+            block += f"🔣 {html.escape(row['params_shape'][:100])}\n"
+        if row['plan']:
+            block += f"<pre>{html.escape(row['plan'][:300])}</pre>\n"
+        block += "──────────────────\n"
+        # Telegram omejitev 4096 znakov - raje manj stavkov kot odrezan HTML
+        if len(msg) + len(block) > 4000:
+            break
+        msg += block
+    await update.message.reply_text(msg, parse_mode="HTML")
+
+
 async def health_command(update: telegram.Update, context: telegram.ext.ContextTypes.DEFAULT_TYPE):
     from main import ADMIN_ID
     if str(update.effective_user.id) != str(ADMIN_ID): return
     
-    stats = db.get_admin_health_stats()
+    stats = await adb.get_admin_health_stats()
     if not stats or stats['total_scans'] == 0:
         await update.message.reply_text("Nekaj je narobe, v zadnjih 24h ni zapisov o skeniranju.")
         return
@@ -795,15 +947,15 @@ async def check_user_command(update: telegram.Update, context: telegram.ext.Cont
         return
         
     target_id = context.args[0]
-    user = db.get_user(target_id) # tvoja obstoječa funkcija
-    url_count = db.get_user_stats_24h(target_id) # tvoja obstoječa funkcija
+    user = await adb.get_user(target_id) # tvoja obstoječa funkcija
+    url_count = await adb.get_user_stats_24h(target_id) # tvoja obstoječa funkcija
     
     if not user:
         await update.message.reply_text("Uporabnika ni v bazi.")
         return
 
     # 1. Pridobimo seznam dejanskih URL-jev
-    tracked_urls = db.get_user_tracked_urls(target_id)
+    tracked_urls = await adb.get_user_tracked_urls(target_id)
     urls_list_text = ""
     for i, u in enumerate(tracked_urls, 1):
         # Skrajšamo prikaz linka, da sporočilo ni predolgo, a ostane klikljivo
@@ -814,7 +966,7 @@ async def check_user_command(update: telegram.Update, context: telegram.ext.Cont
 
     # 2. Pridobimo zadnjih 5 oglasov (iz SentAds)
     # Tukaj uporabi svojo obstoječo logiko ali klic baze
-    _, _, last_ads = db.get_user_diagnostic(target_id)
+    _, _, last_ads = await adb.get_user_diagnostic(target_id)
     ads_info = "\n".join([f"• {a['sent_at']}" for a in last_ads]) if last_ads else "Ni še prejel oglasov."
 
     status_icon = "🟢" if user['is_active'] else "🔴"
@@ -847,6 +999,8 @@ async def admin_help_command(update: telegram.Update, context: telegram.ext.Cont
         "• `/overview` - <b>Pregled 'duhov' in pokvarjenih linkov</b>\n"
         "• `/server` - Poraba virov (RAM/CPU)\n"
         "• `/health` - Status scraperja (24h)\n"
+        "• `/perf [N]` - Najpočasnejše faze zadnjih ciklov\n"
+        "• `/slow [N]` - Najdražji SQL stavki (EXPLAIN)\n"
         "• `/proxy_stats` - Stroški in napoved\n"
         "• `/logs` - Zadnjih 5 tehničnih zapisov\n\n"
         
@@ -858,6 +1012,8 @@ async def admin_help_command(update: telegram.Update, context: telegram.ext.Cont
         
         "📢 <b>Komunikacija</b>\n"
         "• `/broadcast TEXT` - Pošlji vsem obvestilo\n"
+        "• `/broadcast_status` - Napredek obvestil\n"
+        "• `/broadcast_cancel ID` - Prekliči obvestilo\n"
         "• `/admin_stats` - Hitra statistika baze"
     )
     await update.message.reply_text(msg, parse_mode="HTML")
@@ -877,7 +1033,7 @@ async def proxy_stats_command(update: telegram.Update, context: telegram.ext.Con
     # Nastavi svojo ceno na GB (npr. 5€)
 
     
-    stats = db.get_proxy_cost_analysis(PROXY_PRICE_GB)
+    stats = await adb.get_proxy_cost_analysis(PROXY_PRICE_GB)
     
     # Izračunamo še "Efficiency" (koliko KB na en najden oglas)
     # To ti pove, če preveč skeniraš prazne URL-je
@@ -904,7 +1060,7 @@ async def admin_logs_command(update: telegram.Update, context: telegram.ext.Cont
         return
 
     # 1. Sistemski logi (zdaj UserActivity)
-    activities = db.get_recent_system_logs(5)
+    activities = await adb.get_recent_system_logs(5)
     
     msg = "📜 **ZADNJE AKTIVNOSTI:**\n"
     for act in activities:
@@ -912,7 +1068,7 @@ async def admin_logs_command(update: telegram.Update, context: telegram.ext.Cont
         msg += f"`{act['timestamp']}` | `{act['command']}`: {act['details']}\n"
 
     # 2. Scraper logi (to že imaš in bi moralo delovati)
-    scrap_logs = db.get_scraper_health(5)
+    scrap_logs = await adb.get_scraper_health(5)
     msg += "\n**SKENIRANJA:**\n"
     for log in scrap_logs:
         kb = round(log['bytes_used'] / 1024, 1) if log['bytes_used'] else 0
@@ -992,7 +1148,7 @@ async def add_url_user_command(update: telegram.Update, context: telegram.ext.Co
             fixed_url = raw_url
 
         # 4. Dodajanje v bazo (uporabimo tvojo obstoječo metodo)
-        status, new_url_id = db.add_search_url(target_id, fixed_url)
+        status, new_url_id = await adb.add_search_url(target_id, fixed_url)
 
         if status == "exists":
             await update.message.reply_text("ℹ️ Uporabnik temu URL-ju že sledi.")
@@ -1017,7 +1173,7 @@ async def add_url_user_command(update: telegram.Update, context: telegram.ext.Co
                 )
             except: pass
             
-            db.log_user_activity(ADMIN_ID, "/add_url_user", f"Dodal URL ID {new_url_id} uporabniku {target_id}")
+            adb.fire("log_user_activity", ADMIN_ID, "/add_url_user", f"Dodal URL ID {new_url_id} uporabniku {target_id}")
 
     except Exception as e:
         await update.message.reply_text("❌ <b>Napaka!</b>\nUporaba: <code>/add_url_user ID URL</code>", parse_mode="HTML")
@@ -1035,22 +1191,8 @@ async def admin_errors_command(update: telegram.Update, context: telegram.ext.Co
         # Varnostna omejitev, da sporočilo ni predolgo za Telegram
         if limit > 50: limit = 50
 
-    conn = db.get_connection()
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    
     # 2. Pridobimo zadnjih N napak z imeni uporabnikov
-    query = """
-        SELECT u.telegram_name, sl.url_id, sl.status_code, sl.error_msg, sl.timestamp
-        FROM ScraperLogs sl
-        JOIN Tracking t ON sl.url_id = t.url_id
-        JOIN Users u ON t.telegram_id = u.telegram_id
-        WHERE sl.status_code != 200
-        ORDER BY sl.id DESC
-        LIMIT ?
-    """
-    errors = c.execute(query, (limit,)).fetchall()
-    conn.close()
+    errors = await adb.get_recent_errors(limit)
 
     if not errors:
         await update.message.reply_text(f"✅ V bazi ni zabeleženih napak (preverjeno zadnjih {limit}).")
@@ -1115,7 +1257,9 @@ async def post_init(application: telegram.ext.Application) -> None:
         BotCommand("remove_url", " Izbriši URL"),
         BotCommand("info", "ℹ Moj profil in status"),
         BotCommand("help", " Navodila za uporabo"),
-        BotCommand("packages", " Cenik paketov")
+        BotCommand("packages", " Cenik paketov"),
+        BotCommand("search", "🔎 Iskanje po arhivu oglasov"),
+        BotCommand("digest", "📦 Zbirna obvestila (on/off)")
     ]
     await application.bot.set_my_commands(user_commands, scope=BotCommandScopeDefault())
 
@@ -1127,6 +1271,8 @@ async def post_init(application: telegram.ext.Application) -> None:
         BotCommand("admin_stats", "📉 Globalna statistika"),
         BotCommand("proxy_stats", "💸 Stroški proxyjev"),
         BotCommand("health", "🏥 Zdravje sistema"),
+        BotCommand("perf", "⏱️ Časi faz zadnjih ciklov"),
+        BotCommand("slow", "🐢 Najdražji SQL stavki"),
         BotCommand("users", "👥 Seznam uporabnikov"),
         BotCommand("check_user", "🔍 Diagnoza uporabnika (ID)"),
         BotCommand("activate", "🚀 Aktiviraj (ID PAKET DNI)"),
@@ -1135,6 +1281,8 @@ async def post_init(application: telegram.ext.Application) -> None:
         BotCommand("send", "✉️ Pošlji direktno sporočilo (ID TEKST)"),
         BotCommand("logs", "📜 Zadnje aktivnosti"),
         BotCommand("broadcast", "📢 Pošlji vsem obvestilo"),
+        BotCommand("broadcast_status", "📊 Napredek obvestil"),
+        BotCommand("broadcast_cancel", "🛑 Prekliči obvestilo (ID)"),
         BotCommand("errors", "Pošlji zadnjih par errorjev")
     ]
     
@@ -1184,7 +1332,7 @@ async def send_dm_command(update: telegram.Update, context: telegram.ext.Context
         )
         
         await update.message.reply_text(f"✅ Sporočilo uspešno poslano uporabniku <code>{target_id}</code>.", parse_mode="HTML")
-        db.log_user_activity(update.effective_user.id, "/send", f"Poslal sporočilo ID-ju: {target_id}")
+        adb.fire("log_user_activity", update.effective_user.id, "/send", f"Poslal sporočilo ID-ju: {target_id}")
 
     except Exception as e:
         await update.message.reply_text("❌ <b>Napaka pri pošiljanju!</b>\nUporaba: <code>/send ID SPOROČILO</code>", parse_mode="HTML")
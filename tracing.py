@@ -0,0 +1,254 @@
+"""
+Sledenje ciklov po fazah (spani) s trajnim zapisom v CycleTrace.
+
+ScraperLogs ima samo `duration` na URL - ko cikel traja predolgo, ne vemo,
+ali je bil počasen fetch, BeautifulSoup, AI, SQLite ali pošiljanje v Telegram.
+
+- CycleTrace je en cikel (check_for_new_ads = "scrape", DeliveryWorker.drain
+  = "delivery"); aktiven je preko ContextVar, zato ga vidijo tudi klici v
+  asyncio.to_thread in v taskih iz asyncio.gather,
+- span("fetch") / @traced("db") izmerita klic; brez aktivnega cikla je to en
+  ContextVar.get() (brez režije za handlerje in master crawler),
+- spani se v pomnilniku seštejejo po fazah (klici, skupaj, lastni čas brez
+  gnezdenih spanov, max) in ob koncu cikla zapišejo z ENIM executemany -
+  nekaj vrstic na cikel, ne vrstica na klic; posamezni spani, daljši od
+  TRACE_SLOW_MS, se zapišejo posebej z opisom (npr. URL),
+- /perf: najpočasnejše faze in p50/p95 zadnjih ciklov (faze iz vzporednih
+  niti se seštevajo, zato je lahko vsota faz večja od trajanja cikla).
+
+V config.py (neobvezno):
+    TRACE_ENABLED = True
+    TRACE_SLOW_MS = 2000
+    TRACE_MAX_SLOW_SPANS = 20
+"""
+import asyncio
+import contextlib
+import contextvars
+import functools
+import threading
+import time
+from datetime import datetime
+
+import metrics
+from utils import config_value
+
+
+_trace = contextvars.ContextVar("cycle_trace", default=None)
+_span = contextvars.ContextVar("cycle_span", default=None)
+
+
+class CycleTrace:
+    def __init__(self, kind, slow_ms=None, max_slow=None):
+        self.kind = kind
+        self.cycle_id = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        self.slow_ms = float(slow_ms or config_value("TRACE_SLOW_MS", 2000))
+        self.max_slow = int(max_slow or config_value("TRACE_MAX_SLOW_SPANS", 20))
+        self.stages = {}   # faza -> [klici, skupaj_ms, lastni_ms, max_ms]
+        self.slow = []     # (ms, faza, opis)
+        self.discarded = False
+        self._lock = threading.Lock()
+        self._tokens = None
+
+    def record(self, stage, elapsed_ms, self_ms, detail=None):
+        with self._lock:
+            stats = self.stages.setdefault(stage, [0, 0.0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += elapsed_ms
+            stats[2] += max(0.0, self_ms)
+            stats[3] = max(stats[3], elapsed_ms)
+            if detail is not None and elapsed_ms >= self.slow_ms:
+                self.slow.append((elapsed_ms, stage, str(detail)[:200]))
+                if len(self.slow) > self.max_slow:
+                    self.slow.sort(reverse=True)
+                    self.slow.pop()
+
+    def __enter__(self):
+        # Korenski span = trajanje celega cikla (faza z imenom kind)
+        root = _Span(self, self.kind, None, None)
+        self._tokens = (_trace.set(self), _span.set(root), root)
+        return self
+
+    def __exit__(self, *exc):
+        trace_token, span_token, root = self._tokens
+        _span.reset(span_token)
+        _trace.reset(trace_token)
+        root.finish()
+        return False
+
+    def rows(self):
+        rows = [
+            (self.cycle_id, self.kind, stage, None, calls, round(total, 2), round(own, 2), round(peak, 2))
+            for stage, (calls, total, own, peak) in self.stages.items()
+        ]
+        rows += [
+            (self.cycle_id, self.kind, stage, detail, 1, round(ms, 2), None, round(ms, 2))
+            for ms, stage, detail in sorted(self.slow, reverse=True)
+        ]
+        return rows
+
+    def flush(self, db):
+        """En batch vpis v CycleTrace; napaka pri sledenju ne sme podreti cikla."""
+        if self.discarded or not self.stages or not config_value("TRACE_ENABLED", True):
+            return 0
+        if self.kind in self.stages:
+            metrics.CYCLE_SECONDS.observe(self.stages[self.kind][1] / 1000, kind=self.kind)
+        try:
+            return db.save_cycle_trace(self.rows())
+        except Exception as e:
+            print(f"⚠️ [TRACE] Zapis cikla {self.cycle_id} ni uspel: {e}")
+            return 0
+
+
+class _Span:
+    __slots__ = ("trace", "stage", "detail", "parent", "started", "children_ms")
+
+    def __init__(self, trace, stage, detail, parent):
+        self.trace = trace
+        self.stage = stage
+        self.detail = detail
+        self.parent = parent
+        self.started = time.perf_counter()
+        self.children_ms = 0.0
+
+    def finish(self):
+        elapsed = (time.perf_counter() - self.started) * 1000
+        if self.parent is not None:
+            # Vzporedni otroci (gather, to_thread) lahko presežejo starša - lastni čas je vsaj 0
+            with self.trace._lock:
+                self.parent.children_ms += elapsed
+        self.trace.record(self.stage, elapsed, elapsed - self.children_ms, self.detail)
+        if self.parent is not None:
+            metrics.STAGE_SECONDS.observe(max(0.0, elapsed - self.children_ms) / 1000, stage=self.stage)
+
+
+@contextlib.contextmanager
+def span(stage, detail=None):
+    trace = _trace.get()
+    if trace is None:
+        yield
+        return
+    current = _Span(trace, stage, detail, _span.get())
+    token = _span.set(current)
+    try:
+        yield
+    except Exception as e:
+        metrics.count_sqlite_error(e)
+        raise
+    finally:
+        _span.reset(token)
+        current.finish()
+
+
+def traced(stage, detail=None):
+    """Dekorator za sync in async funkcije; detail(*args, **kwargs) opiše počasen klic."""
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if _trace.get() is None:
+                    return await fn(*args, **kwargs)
+                with span(stage, detail(*args, **kwargs) if detail else None):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _trace.get() is None:
+                return fn(*args, **kwargs)
+            with span(stage, detail(*args, **kwargs) if detail else None):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def traced_cycle(kind, db_factory):
+    """Dekorator za async cikel (check_for_new_ads): CycleTrace okoli klica, zapis po koncu."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            if not config_value("TRACE_ENABLED", True):
+                return await fn(*args, **kwargs)
+            trace = CycleTrace(kind)
+            try:
+                with trace:
+                    return await fn(*args, **kwargs)
+            finally:
+                await asyncio.to_thread(trace.flush, db_factory())
+        return wrapper
+    return decorator
+
+
+def discard():
+    """Cikel brez dela (npr. noben URL ni na vrsti) - ne zapisujemo ga."""
+    trace = _trace.get()
+    if trace is not None:
+        trace.discarded = True
+
+
+# --- /perf ---
+
+def _pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+def summarize(rows, kind="scrape"):
+    """
+    Iz vrstic CycleTrace (get_cycle_traces): trajanje ciklov (p50/p95/max),
+    faze po p95 lastnega časa na cikel in najpočasnejši posamezni spani.
+    """
+    cycles, stages, slow = {}, {}, []
+    for row in rows:
+        if row['detail'] is not None:
+            slow.append(row)
+        elif row['stage'] == kind:
+            cycles[row['cycle_id']] = row['total_ms']
+        else:
+            stages.setdefault(row['stage'], []).append(row)
+
+    per_stage = []
+    for stage, stage_rows in stages.items():
+        own = [r['self_ms'] or 0 for r in stage_rows]
+        per_stage.append({
+            'stage': stage,
+            'p50_ms': _pct(own, 0.5),
+            'p95_ms': _pct(own, 0.95),
+            'calls': sum(r['calls'] for r in stage_rows) / len(stage_rows),
+            'max_ms': max(r['max_ms'] for r in stage_rows),
+        })
+    per_stage.sort(key=lambda s: s['p95_ms'], reverse=True)
+    slow.sort(key=lambda r: r['total_ms'], reverse=True)
+    durations = list(cycles.values())
+    return {
+        'cycles': len(durations),
+        'p50_ms': _pct(durations, 0.5),
+        'p95_ms': _pct(durations, 0.95),
+        'max_ms': max(durations) if durations else 0.0,
+        'stages': per_stage,
+        'slow': slow[:5],
+    }
+
+
+def _fmt_ms(ms):
+    return f"{ms / 1000:.1f}s" if ms >= 1000 else f"{ms:.0f}ms"
+
+
+def format_perf(summary, title):
+    import html
+    if not summary['cycles']:
+        return f"<b>{title}</b>: ni zapisanih ciklov."
+    lines = [
+        f"<b>{title}</b> (zadnjih {summary['cycles']})",
+        f"Cikel: p50 <b>{_fmt_ms(summary['p50_ms'])}</b> | p95 <b>{_fmt_ms(summary['p95_ms'])}</b> "
+        f"| max {_fmt_ms(summary['max_ms'])}",
+        "",
+        "<code>faza            p50     p95   klici</code>",
+    ]
+    for stage in summary['stages'][:8]:
+        lines.append(f"<code>{stage['stage'][:14]:<14}{_fmt_ms(stage['p50_ms']):>7} {_fmt_ms(stage['p95_ms']):>7}"
+                     f"{stage['calls']:>7.0f}</code>")
+    if summary['slow']:
+        lines.append("\n🐢 <b>Najpočasnejši klici</b>")
+        for row in summary['slow']:
+            lines.append(f"• {row['stage']} {_fmt_ms(row['total_ms'])} - <code>{html.escape(row['detail'][:80])}</code>")
+    return "\n".join(lines)
@@ -2,6 +2,16 @@ import re
 import json
 import urllib.parse
 
+
+def config_value(name, default):
+    """Vrednost iz config.py, če obstaja (moduli se uporabljajo tudi brez bota, npr. v benchmarkih)."""
+    try:
+        import config
+        return getattr(config, name, default)
+    except ImportError:
+        return default
+
+
 def pocisti_ceno_v_stevilko(raw_cena):
     """Pretvori string cene (npr. '21.980 €oz. 18.016 €') v čisto število (21980)."""
     if not raw_cena or "dogovoru" in raw_cena.lower():
@@ -0,0 +1,176 @@
+"""
+Webhook način bota (namesto long pollinga).
+
+Pri run_polling() bot sam sprašuje Telegram za nove posodobitve (getUpdates),
+odziv na ukaz je tako odvisen od cikla pollinga, polling zanka pa si event
+loop deli s scraperji. V webhook načinu Telegram vsako posodobitev takoj
+pošlje na naš HTTP endpoint:
+
+- lokalni ASGI strežnik (uvicorn) posluša na WEBHOOK_LISTEN:WEBHOOK_PORT,
+  pred njim je reverse proxy s TLS (nginx/caddy), javni naslov je WEBHOOK_URL,
+- endpoint je na WEBHOOK_PATH, Telegram pošilja glavo
+  X-Telegram-Bot-Api-Secret-Token = WEBHOOK_SECRET (drugače 403); brez
+  skrivnosti endpoint ne sprejme ničesar - če je WEBHOOK_SECRET prazen in
+  webhook registriramo sami (WEBHOOK_URL), se ob zagonu generira naključna,
+  brez WEBHOOK_URL pa se bot ne zažene,
+- endpoint posodobitev samo postavi v application.update_queue in takoj
+  vrne 200; obdelava teče vzporedno (CONCURRENT_UPDATES), zato počasen
+  handler ne zadrži ostalih uporabnikov,
+- GET /healthz za nadzor (proxy, systemd).
+
+V config.py:
+    WEBHOOK_ENABLED = True
+    WEBHOOK_URL = "https://bot.example.com"   # brez poti; prazno = webhook registriran drugje
+    WEBHOOK_PATH = "/telegram"
+    WEBHOOK_SECRET = "dolg-nakljucen-niz"     # A-Z, a-z, 0-9, _ in -; prazno + WEBHOOK_URL = generirana ob zagonu
+    WEBHOOK_LISTEN = "127.0.0.1"
+    WEBHOOK_PORT = 8443
+
+Brez WEBHOOK_ENABLED bot teče s pollingom kot prej (run_polling ob zagonu
+sam odjavi webhook).
+"""
+import hmac
+import json
+import secrets
+
+import telegram
+
+from utils import config_value
+
+
+class TelegramWebhookApp:
+    """Minimalna ASGI aplikacija: POST {path} -> application.update_queue."""
+
+    def __init__(self, application, path=None, secret=None, max_body=None):
+        self.application = application
+        self.path = "/" + (path or config_value("WEBHOOK_PATH", "/telegram")).lstrip("/")
+        secret = secret if secret is not None else config_value("WEBHOOK_SECRET", None)
+        if not secret:
+            # Brez skrivnosti bi endpoint sprejel posodobitev od kogarkoli
+            raise ValueError("TelegramWebhookApp potrebuje WEBHOOK_SECRET")
+        self.secret = secret.encode()
+        self.max_body = int(max_body or config_value("WEBHOOK_MAX_BODY", 1024 * 1024))
+        self.stats = {"updates": 0, "rejected": 0, "invalid": 0}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            # Življenjski cikel Application vodi run_webhook, ne strežnik
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+
+        if scope["path"] == "/healthz" and scope["method"] in ("GET", "HEAD"):
+            await self._respond(send, 200, b"ok")
+            return
+        if scope["path"] != self.path:
+            await self._respond(send, 404)
+            return
+        if scope["method"] != "POST":
+            await self._respond(send, 405)
+            return
+
+        headers = dict(scope["headers"])
+        token = headers.get(b"x-telegram-bot-api-secret-token", b"")
+        if not hmac.compare_digest(token, self.secret):
+            self.stats["rejected"] += 1
+            await self._respond(send, 403)
+            return
+
+        body = await self._read_body(receive)
+        if body is None:
+            await self._respond(send, 413)
+            return
+        try:
+            update = telegram.Update.de_json(json.loads(body), self.application.bot)
+        except Exception as e:
+            self.stats["invalid"] += 1
+            print(f"⚠️ [WEBHOOK] Neveljavna posodobitev: {e}")
+            await self._respond(send, 400)
+            return
+
+        # Obdelava teče v Application (vzporedno); Telegram dobi 200 takoj
+        await self.application.update_queue.put(update)
+        self.stats["updates"] += 1
+        await self._respond(send, 200)
+
+    async def _read_body(self, receive):
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_body:
+                return None
+            chunks.append(chunk)
+            if not message.get("more_body"):
+                return b"".join(chunks)
+
+    @staticmethod
+    async def _respond(send, status, body=b""):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"text/plain"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+async def run_webhook(application):
+    """
+    Zažene Application + ASGI strežnik in teče do SIGINT/SIGTERM (nadomesti run_polling).
+    post_init/post_stop/post_shutdown se kličejo enako kot pri run_polling.
+    """
+    import uvicorn
+
+    listen = config_value("WEBHOOK_LISTEN", "127.0.0.1")
+    port = int(config_value("WEBHOOK_PORT", 8443))
+    public_url = config_value("WEBHOOK_URL", None)
+    secret = config_value("WEBHOOK_SECRET", None)
+    if not secret:
+        if not public_url:
+            raise RuntimeError("WEBHOOK_ENABLED brez WEBHOOK_SECRET: nastavi WEBHOOK_SECRET "
+                               "(ali WEBHOOK_URL, da se skrivnost generira in registrira ob zagonu)")
+        # Registriramo sami, zato je lahko skrivnost nova ob vsakem zagonu
+        secret = secrets.token_urlsafe(32)
+        print("🔐 [WEBHOOK] WEBHOOK_SECRET ni nastavljen - generirana naključna skrivnost.")
+    app = TelegramWebhookApp(application, secret=secret)
+
+    server = uvicorn.Server(uvicorn.Config(
+        app, host=listen, port=port, log_level="warning", access_log=False, lifespan="off"
+    ))
+
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+
+        if public_url:
+            await application.bot.set_webhook(
+                url=public_url.rstrip("/") + app.path,
+                secret_token=secret,
+                allowed_updates=telegram.Update.ALL_TYPES,
+                max_connections=int(config_value("WEBHOOK_MAX_CONNECTIONS", 40)),
+            )
+            print(f"🌐 [WEBHOOK] Registriran: {public_url.rstrip('/')}{app.path}")
+        else:
+            print("⚠️ [WEBHOOK] WEBHOOK_URL ni nastavljen - webhook mora biti registriran drugje.")
+
+        await application.start()
+        print(f"🌐 [WEBHOOK] Poslušam na http://{listen}:{port}{app.path}")
+        try:
+            await server.serve()
+        finally:
+            # Webhook ostane registriran: med restartom Telegram posodobitve hrani sam
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+            print(f"🌐 [WEBHOOK] Ustavljen ({app.stats['updates']} posodobitev, "
+                  f"{app.stats['rejected']} zavrnjenih)")
+
+    if application.post_shutdown:
+        await application.post_shutdown(application)